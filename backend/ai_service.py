@@ -6,6 +6,9 @@ from openai import AsyncOpenAI
 from PIL import Image
 import io
 
+from extraction_cleaning import clean_extraction
+from registration import registration_key, registration_format
+
 logger = logging.getLogger(__name__)
 
 class AIService:
@@ -333,192 +336,19 @@ class AIService:
     def validate_and_clean_data(self, data):
         """Validate and clean the structured data from AI"""
         print(f"🔄 Validating and cleaning data")
-        
-        # Check if this is the new format with log_entries
-        if 'log_entries' in data and isinstance(data.get('log_entries'), list):
-            print(f"✅ Detected new format with log_entries array")
-            return self.validate_new_format(data)
-        else:
+        if not isinstance(data.get('log_entries'), list):
             print(f"⚠️ Detected old single-entry format, converting to new format")
-            return self.convert_old_to_new_format(data)
-    
-    def validate_new_format(self, data):
-        """Validate and clean data in the new format with log_entries array"""
-        print(f"🔍 DEBUG: Raw AI response data keys: {list(data.keys())}")
-        print(f"🔍 DEBUG: Summary field in raw data: {data.get('summary')}")
-        print(f"🔍 DEBUG: Is_mult field in raw data: {data.get('is_mult')}")
-        
-        cleaned_data = {
-            'aircraft_registration': self.clean_string(data.get('aircraft_registration')),
-            'aircraft_make_model': self.clean_string(data.get('aircraft_make_model')),
-            'summary': self.clean_string(data.get('summary')),
-            'is_mult': self.clean_boolean(data.get('is_mult', False)),
-            'log_entries': []
-        }
-        
-        print(f"🔍 DEBUG: Cleaned summary: {cleaned_data['summary']}")
-        print(f"🔍 DEBUG: Cleaned is_mult: {cleaned_data['is_mult']}")
-        
-        # Clean each log entry
-        for entry in data.get('log_entries', []):
-            cleaned_entry = self.clean_log_entry(entry)
-            cleaned_data['log_entries'].append(cleaned_entry)
-        
-        print(f"✅ New format validation completed with {len(cleaned_data['log_entries'])} entries")
-        return cleaned_data
-    
-    def convert_old_to_new_format(self, data):
-        """Convert old single-entry format to new format with log_entries array"""
-        print(f"🔍 DEBUG: Converting old format data keys: {list(data.keys())}")
-        print(f"🔍 DEBUG: Summary field in old data: {data.get('summary')}")
-        
-        # Extract aircraft info from the old structure
-        aircraft_registration = self.clean_string(data.get('aircraft_registration'))
-        aircraft_make_model = self.clean_string(data.get('aircraft_make_model'))
-        
-        # Create a single log entry from the old data
-        log_entry = self.clean_log_entry(data)
-        
-        # Create new format with default values for new fields
-        cleaned_data = {
-            'aircraft_registration': aircraft_registration,
-            'aircraft_make_model': aircraft_make_model,
-            'summary': self.clean_string(data.get('summary')),
-            'is_mult': False,  # Old format is always single entry
-            'log_entries': [log_entry]
-        }
-        
-        print(f"🔍 DEBUG: Converted summary: {cleaned_data['summary']}")
-        print(f"🔍 DEBUG: Converted is_mult: {cleaned_data['is_mult']}")
-        print(f"✅ Converted old format to new format")
+        cleaned_data = clean_extraction(data)
+        print(f"✅ Validation completed with {len(cleaned_data['log_entries'])} entries")
         return cleaned_data
-    
-    def clean_log_entry(self, entry):
-        """Clean a single log entry"""
-        cleaned_entry = {
-            'description_of_work_performed': self.clean_string(entry.get('description_of_work_performed')),
-            'tach_time': self.clean_string(entry.get('tach_time')),
-            'hobbs_time': self.clean_string(entry.get('hobbs_time')),
-            'part_number_replaced': self.clean_part_numbers(entry.get('part_number_replaced')),
-            'manual_reference': self.clean_string(entry.get('manual_reference')),
-            'reason_for_maintenance': self.clean_string(entry.get('reason_for_maintenance')),
-            'ad_compliance': self.clean_string(entry.get('ad_compliance')),
-            'next_due_compliance': self.clean_string(entry.get('next_due_compliance')),
-            'service_bulletin_reference': self.clean_string(entry.get('service_bulletin_reference')),
-            'certification_statement': self.clean_string(entry.get('certification_statement')),
-            'performed_by': self.clean_string(entry.get('performed_by')),
-            'license_number': self.clean_string(entry.get('license_number')),
-            'date': self.clean_string(entry.get('date')),
-            'risk_level': self.clean_string(entry.get('risk_level')),
-            'urgency': self.clean_string(entry.get('urgency')),
-            'is_airworthy': self.clean_boolean(entry.get('is_airworthy'))
-        }
-        return cleaned_entry
-    
-    def clean_string(self, value):
-        """Clean a string value"""
-        if value is None:
-            return None
-        if isinstance(value, str):
-            value = value.strip()
-            if value.lower() in ['unknown', 'n/a', 'none', '']:
-                print(f"🔍 DEBUG: String cleaned to None: '{value}'")
-                return None
-        cleaned = str(value) if value is not None else None
-        if value != cleaned:
-            print(f"🔍 DEBUG: String cleaned: '{value}' -> '{cleaned}'")
-        return cleaned
-    
-    def clean_part_numbers(self, value):
-        """Clean part numbers array"""
-        if value is None:
-            return []
-        if isinstance(value, str):
-            return [value.strip()] if value.strip() else []
-        if isinstance(value, list):
-            return [str(item).strip() for item in value if item and str(item).strip()]
-        return []
-    
-    def clean_boolean(self, value):
-        """Clean boolean value"""
-        if isinstance(value, bool):
-            return value
-        if isinstance(value, str):
-            result = value.lower() in ['true', 'yes', 'airworthy', '1']
-            print(f"🔍 DEBUG: Boolean cleaned: '{value}' -> {result}")
-            return result
-        print(f"🔍 DEBUG: Boolean default value: {value} -> True")
-        return True  # Default to True for airworthiness
 
     def validate_aircraft_registration(self, registration):
         """Validate aircraft registration format"""
         if not registration:
             return False
         
-        # Basic validation for common formats
-        registration = registration.upper().strip()
-        
-        # US format: N followed by 1-5 alphanumeric characters
-        if registration.startswith('N') and len(registration) <= 6:
-            return True
-        
-        # International format: 2-3 letters followed by 1-4 alphanumeric characters
-        import re
-        if re.match(r'^[A-Z]{2,3}[A-Z0-9]{1,4}$', registration):
-            return True
-        
-        return False
-
-    def assess_risk_level(self, data):
-        """Assess risk level based on maintenance data"""
-        risk_factors = []
-        
-        # Check for critical maintenance items
-        critical_keywords = ['engine', 'propeller', 'landing gear', 'flight control', 'fuel system']
-        work_description = data.get('description_of_work_performed', '').lower()
-        
-        for keyword in critical_keywords:
-            if keyword in work_description:
-                risk_factors.append(f"Critical {keyword} maintenance")
-        
-        # Check for AD compliance issues
-        ad_compliance = data.get('ad_compliance', '').lower()
-        if 'non-compliant' in ad_compliance or 'overdue' in ad_compliance:
-            risk_factors.append("AD compliance issues")
-        
-        # Determine risk level
-        if len(risk_factors) >= 2:
-            return "High"
-        elif len(risk_factors) == 1:
-            return "Medium"
-        else:
-            return "Low"
-
-    def determine_urgency(self, data):
-        """Determine urgency based on maintenance data"""
-        urgency_factors = []
-        
-        # Check for time-sensitive items
-        time_keywords = ['overdue', 'expired', 'due', 'required']
-        work_description = data.get('description_of_work_performed', '').lower()
-        
-        for keyword in time_keywords:
-            if keyword in work_description:
-                urgency_factors.append(f"Time-sensitive: {keyword}")
-        
-        # Check for safety-related items
-        safety_keywords = ['safety', 'critical', 'emergency', 'grounded']
-        for keyword in safety_keywords:
-            if keyword in work_description:
-                urgency_factors.append(f"Safety-related: {keyword}")
-        
-        # Determine urgency
-        if len(urgency_factors) >= 2:
-            return "High"
-        elif len(urgency_factors) == 1:
-            return "Medium"
-        else:
-            return "Normal" 
+        # Normalize case and separators first so "n-123ab" validates like "N123AB"
+        return registration_format(registration_key(registration)) is not None
 
     def extract_partial_json(self, json_str):
         """Extract partial data from truncated JSON"""
@@ -0,0 +1,371 @@
+"""
+Materialized per-aircraft state, kept next to the maintenance log collection.
+
+Each log contributes one source document (`<logs>_aircraft_sources`: its
+registration key, upload time, aircraft name and entry counts) and one
+timeline document per entry (`<logs>_aircraft_timeline`: parsed tach/hobbs
+readings and date, next-due point, airworthiness). The aircraft document
+(`<logs>_aircraft`) holds only the summary - latest totals, last annual,
+outstanding next-due items and an airworthiness rollup - so a dashboard is a
+single read by `_id`.
+
+A log write swaps that log's source and timeline documents, then refreshes
+the summary of each aircraft it touches with one targeted update: counts move
+by the log's difference and everything else is read back through indexed
+`find_one`s on the timeline, so a write costs the same however long the
+aircraft's history is. `python manage.py rebuild-aircraft` recomputes every
+document from the logs if they ever drift apart.
+"""
+
+import re
+from datetime import date, datetime, timedelta
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from field_parsing import CONFIDENCE_EXACT, parse_entry_date, parse_hours_with_confidence
+from next_due import parse_next_due
+from registration import parse_registration
+
+# Bump when the shape of the state documents changes, then rebuild
+AIRCRAFT_STATE_VERSION = 5
+
+# Optimistic concurrency retries when two writes touch the same aircraft at once
+_MAX_ATTEMPTS = 5
+
+_ANNUAL_PATTERN = re.compile(r'\bannual\b', re.IGNORECASE)
+
+# Timeline order: by day (undated entries fall on the day their log was uploaded), then tach time.
+# Missing tach times and upload times sort first, as None does in MongoDB.
+TIMELINE_SORT = [("day", 1), ("tach_time", 1), ("log_timestamp", 1), ("log_id", 1), ("entry_index", 1)]
+_NEWEST_FIRST = [(field, -1) for field, _ in TIMELINE_SORT]
+
+_SOURCE_NEWEST_FIRST = [("timestamp", -1), ("_id", -1)]
+
+
+def timeline_items(doc):
+    """Timeline documents for every entry of one log document"""
+    structured_data = doc.get("structured_data") or {}
+    log_id = str(doc["_id"])
+    log_timestamp = doc.get("timestamp")
+    items = []
+    for entry_index, entry in enumerate(structured_data.get("log_entries") or []):
+        entry_date = parse_entry_date(entry.get("date"))
+        tach_time, tach_confidence = parse_hours_with_confidence(entry.get("tach_time"))
+        hobbs_time, hobbs_confidence = parse_hours_with_confidence(entry.get("hobbs_time"))
+        description = entry.get("description_of_work_performed")
+        text = entry.get("next_due_compliance")
+        subject, due = None, {}
+        if text and text.strip():
+            due = parse_next_due(text, tach_time, entry_date, description) or {}
+            # A statement that names nothing it is about only supersedes the same statement
+            subject = due.get("subject") or " ".join(text.lower().split())
+        items.append({
+            "_id": f"{log_id}:{entry_index}",
+            "registration_key": doc.get("registration_key"),
+            "log_id": log_id,
+            "entry_index": entry_index,
+            "log_timestamp": log_timestamp,
+            "day": entry_date.isoformat() if entry_date else (log_timestamp.date().isoformat() if log_timestamp else ""),
+            "date": entry_date.isoformat() if entry_date else None,
+            "date_text": entry.get("date"),
+            "tach_time": tach_time,
+            "tach_time_confidence": tach_confidence,
+            "hobbs_time": hobbs_time,
+            "hobbs_time_confidence": hobbs_confidence,
+            "description": description,
+            "annual": bool(_ANNUAL_PATTERN.search(description or "")),
+            "next_due_compliance": text,
+            "subject": subject,
+            "due_tach": due.get("due_tach"),
+            "due_date": due.get("due_date"),
+            "risk_level": entry.get("risk_level"),
+            "urgency": entry.get("urgency"),
+            "is_airworthy": entry.get("is_airworthy"),
+        })
+    return items
+
+
+def log_source(doc):
+    """Source document of one log: its aircraft fields, so the newest log can name the aircraft, and entry counts"""
+    structured_data = doc.get("structured_data") or {}
+    entries = structured_data.get("log_entries") or []
+    return {
+        "_id": str(doc["_id"]),
+        "registration_key": doc.get("registration_key"),
+        "timestamp": doc.get("timestamp"),
+        "aircraft_registration": structured_data.get("aircraft_registration"),
+        "aircraft_make_model": structured_data.get("aircraft_make_model"),
+        "entry_count": len(entries),
+        "non_airworthy_entries": sum(1 for entry in entries if entry.get("is_airworthy") is False),
+    }
+
+
+def _timeline_order(item):
+    tach = item.get("tach_time")
+    return (item["day"], tach if tach is not None else -1.0, item.get("log_timestamp") or datetime.min,
+            item["log_id"], item["entry_index"])
+
+
+def _source_order(source):
+    return (source.get("timestamp") or datetime.min, source["_id"])
+
+
+def _entry_ref(item):
+    return {
+        "log_id": item["log_id"],
+        "entry_index": item["entry_index"],
+        "date": item.get("date"),
+        "tach_time": item.get("tach_time"),
+    }
+
+
+def _outstanding_item(item, current_tach):
+    """Outstanding item from a timeline item (or a stored outstanding item, to recompute its hours remaining)"""
+    due_tach = item.get("due_tach")
+    return {
+        **_entry_ref(item),
+        # Kept for ordering the list when one subject is replaced
+        "day": item["day"],
+        "log_timestamp": item.get("log_timestamp"),
+        "next_due_compliance": item["next_due_compliance"].strip(),
+        "subject": item["subject"],
+        "due_tach": due_tach,
+        "due_date": item.get("due_date"),
+        # Stored so the fleet due list can range-query it; changes only with this aircraft's tach
+        "hours_remaining": round(due_tach - current_tach, 1) if due_tach is not None and current_tach is not None else None,
+    }
+
+
+def _summary(key, newest, latest, last_annual, current_tach, current_hobbs, last_entry_date, outstanding):
+    """
+    Summary fields of an aircraft state as `$set` paths. `outstanding` holds
+    the newest statement per subject; it is listed newest first.
+    """
+    registration = parse_registration(key)
+    outstanding = sorted(outstanding, key=_timeline_order, reverse=True)
+    return {
+        "state_version": AIRCRAFT_STATE_VERSION,
+        "aircraft_registration": newest.get("aircraft_registration"),
+        # Canonical spelling ("G-ABCD") and country of the key, when its nationality mark is known
+        "registration": registration["registration"] if registration else None,
+        "registration_country": registration["country"] if registration else None,
+        "aircraft_make_model": newest.get("aircraft_make_model"),
+        "current_tach_time": current_tach,
+        "current_hobbs_time": current_hobbs,
+        "last_entry_date": last_entry_date,
+        "last_annual": _entry_ref(last_annual) if last_annual else None,
+        "outstanding_items": [_outstanding_item(item, current_tach) for item in outstanding],
+        "airworthiness.is_airworthy": latest.get("is_airworthy") if latest else None,
+        "airworthiness.as_of": _entry_ref(latest) if latest else None,
+    }
+
+
+def _exact_max(timeline, field):
+    # Only exact readings: one misread tach would otherwise move every "due in N hours" item
+    values = [item[field] for item in timeline
+              if item.get(field) is not None and item.get(f"{field}_confidence") == CONFIDENCE_EXACT]
+    # Tach and hobbs only ever increase, so the highest reading is the current one
+    return max(values) if values else None
+
+
+def build_aircraft_state(key, sources, timeline):
+    """
+    Complete state document for one aircraft from all of its log sources and
+    timeline items, as `rebuild-aircraft` writes it; log writes keep the same
+    document current without reading the whole timeline
+    """
+    timeline = sorted(timeline, key=_timeline_order)
+    newest = max(sources, key=_source_order) if sources else {}
+    current_tach = _exact_max(timeline, "tach_time")
+    dates = [item["date"] for item in timeline if item.get("date")]
+    annuals = [item for item in timeline if item.get("annual")]
+
+    # A later statement about the same subject ("next annual due ...") supersedes earlier ones
+    outstanding = {}
+    for item in reversed(timeline):
+        if item.get("subject") is not None and item["subject"] not in outstanding:
+            outstanding[item["subject"]] = item
+
+    state = {
+        "_id": key,
+        "log_count": len(sources),
+        "entry_count": sum(source["entry_count"] for source in sources),
+        "airworthiness": {"non_airworthy_entries": sum(source["non_airworthy_entries"] for source in sources)},
+    }
+    summary = _summary(key, newest, timeline[-1] if timeline else None, annuals[-1] if annuals else None, current_tach,
+                       _exact_max(timeline, "hobbs_time"), max(dates) if dates else None, outstanding.values())
+    for path, value in summary.items():
+        if path.startswith("airworthiness."):
+            state["airworthiness"][path.split(".", 1)[1]] = value
+        else:
+            state[path] = value
+    return state
+
+
+DUE_PROJECTION = {
+    "aircraft_registration": 1,
+    "aircraft_make_model": 1,
+    "current_tach_time": 1,
+    "outstanding_items": 1,
+}
+
+
+def due_query(within_hours=None, within_days=None, today=None):
+    """Aircraft state query for aircraft with some item due within the windows, through the multikey indexes"""
+    today = today or date.today()
+    clauses = []
+    if within_hours is not None:
+        clauses.append({"outstanding_items.hours_remaining": {"$lte": within_hours}})
+    if within_days is not None:
+        clauses.append({"outstanding_items.due_date": {"$lte": (today + timedelta(days=within_days)).isoformat()}})
+    return {"$or": clauses}
+
+
+def due_items(state, within_hours=None, within_days=None, today=None):
+    """
+    Outstanding items of one aircraft state that fall due within the hour or
+    day window (overdue items included). Urgency is the smallest fraction of a
+    window left, so 5 of 25 hours (0.2) ranks with 6 of 30 days (0.2) and
+    anything overdue is negative.
+    """
+    today = today or date.today()
+    due = []
+    for item in state.get("outstanding_items") or []:
+        hours_remaining = item.get("hours_remaining")
+        days_remaining = None
+        if item.get("due_date"):
+            days_remaining = (date.fromisoformat(item["due_date"]) - today).days
+
+        fractions = []
+        if within_hours is not None and hours_remaining is not None and hours_remaining <= within_hours:
+            fractions.append(hours_remaining / within_hours if within_hours else hours_remaining)
+        if within_days is not None and days_remaining is not None and days_remaining <= within_days:
+            fractions.append(days_remaining / within_days if within_days else days_remaining)
+        if not fractions:
+            continue
+
+        due.append({
+            "registration_key": state["_id"],
+            "aircraft_registration": state.get("aircraft_registration"),
+            "aircraft_make_model": state.get("aircraft_make_model"),
+            "current_tach_time": state.get("current_tach_time"),
+            **item,
+            "days_remaining": days_remaining,
+            "overdue": (hours_remaining is not None and hours_remaining < 0) or (days_remaining is not None and days_remaining < 0),
+            "urgency": round(min(fractions), 4),
+        })
+    return due
+
+
+async def _swap_contribution(timeline_collection, source_collection, log_id, source, items):
+    """
+    Replace one log's source and timeline documents (or drop them when `source`
+    is None). Returns the previous source document and the subjects of the
+    previous timeline items.
+    """
+    if source:
+        previous = await source_collection.find_one_and_replace({"_id": log_id}, source, upsert=True)
+    else:
+        previous = await source_collection.find_one_and_delete({"_id": log_id})
+
+    subjects = set()
+    async for item in timeline_collection.find({"log_id": log_id, "subject": {"$ne": None}}, {"subject": 1}):
+        subjects.add(item["subject"])
+    for _ in range(_MAX_ATTEMPTS):
+        await timeline_collection.delete_many({"log_id": log_id})
+        if not items:
+            break
+        try:
+            await timeline_collection.insert_many(items)
+            break
+        except (BulkWriteError, DuplicateKeyError):
+            # Another write of the same log got its items in between; replace them again
+            continue
+    return previous, subjects
+
+
+async def _refresh(state_collection, timeline_collection, source_collection, key, counts, subjects):
+    """
+    Bring one aircraft's summary up to date after a log write: move its counts
+    by `counts` and recompute the outstanding items of `subjects`, retrying on
+    concurrent writes to the same aircraft
+    """
+    in_key = {"registration_key": key}
+    for _ in range(_MAX_ATTEMPTS):
+        # Read the revision first, so a write landing after it is either seen below or fails the guard
+        current = await state_collection.find_one({"_id": key}, {"revision": 1, "outstanding_items": 1})
+        revision = (current or {}).get("revision", 0)
+
+        newest = await source_collection.find_one(in_key, sort=_SOURCE_NEWEST_FIRST)
+        if newest is None:
+            if current is None:
+                return
+            result = await state_collection.delete_one({"_id": key, "revision": revision})
+            if result.deleted_count:
+                return
+            continue
+
+        latest = await timeline_collection.find_one(in_key, sort=_NEWEST_FIRST)
+        last_annual = await timeline_collection.find_one({**in_key, "annual": True}, sort=_NEWEST_FIRST)
+        tach = await timeline_collection.find_one({**in_key, "tach_time_confidence": CONFIDENCE_EXACT}, sort=[("tach_time", -1)])
+        hobbs = await timeline_collection.find_one({**in_key, "hobbs_time_confidence": CONFIDENCE_EXACT}, sort=[("hobbs_time", -1)])
+        dated = await timeline_collection.find_one({**in_key, "date": {"$type": "string"}}, sort=[("date", -1)])
+
+        outstanding = [item for item in (current or {}).get("outstanding_items", []) if item["subject"] not in subjects]
+        for subject in subjects:
+            item = await timeline_collection.find_one({**in_key, "subject": subject}, sort=_NEWEST_FIRST)
+            if item:
+                outstanding.append(item)
+
+        summary = _summary(key, newest, latest, last_annual, tach["tach_time"] if tach else None,
+                           hobbs["hobbs_time"] if hobbs else None, dated["date"] if dated else None, outstanding)
+        log_delta, entry_delta, non_airworthy_delta = counts
+        update = {
+            "$set": summary,
+            "$inc": {
+                "revision": 1,
+                "log_count": log_delta,
+                "entry_count": entry_delta,
+                "airworthiness.non_airworthy_entries": non_airworthy_delta,
+            },
+        }
+        try:
+            result = await state_collection.update_one({"_id": key, "revision": revision}, update, upsert=current is None)
+        except DuplicateKeyError:
+            continue
+        if result.matched_count or result.upserted_id is not None:
+            return
+    raise RuntimeError(f"Aircraft state for {key} kept changing; run `python manage.py rebuild-aircraft`")
+
+
+async def _apply(state_collection, timeline_collection, source_collection, log_id, doc):
+    key = doc.get("registration_key") if doc is not None else None
+    source = log_source(doc) if key else None
+    items = timeline_items(doc) if key else []
+    previous, previous_subjects = await _swap_contribution(timeline_collection, source_collection, log_id, source, items)
+
+    # Counts (logs, entries, non-airworthy entries) and subjects that change per aircraft;
+    # the log may have been filed under a different registration before this write
+    changes = {}
+    if previous:
+        changes[previous["registration_key"]] = (
+            [-1, -previous["entry_count"], -previous["non_airworthy_entries"]], previous_subjects
+        )
+    if source:
+        counts, subjects = changes.setdefault(key, ([0, 0, 0], set()))
+        for index, value in enumerate((1, source["entry_count"], source["non_airworthy_entries"])):
+            counts[index] += value
+        subjects.update(item["subject"] for item in items if item["subject"] is not None)
+
+    for changed_key, (counts, subjects) in changes.items():
+        await _refresh(state_collection, timeline_collection, source_collection, changed_key, counts, subjects)
+
+
+async def apply_log(state_collection, timeline_collection, source_collection, doc):
+    """Fold an inserted or updated log document into its aircraft's state"""
+    await _apply(state_collection, timeline_collection, source_collection, str(doc["_id"]), doc)
+
+
+async def remove_log(state_collection, timeline_collection, source_collection, log_id):
+    """Drop a deleted log from whichever aircraft state holds it"""
+    await _apply(state_collection, timeline_collection, source_collection, log_id, None)
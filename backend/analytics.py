@@ -0,0 +1,108 @@
+"""
+Fleet analytics over maintenance log entries, computed by MongoDB.
+
+Everything is one aggregation: the document-level filter runs first (through
+the registration/timestamp and per-entry multikey indexes), entries are
+unwound and filtered exactly, and a single $facet returns every breakdown in
+one round trip. Only the bucket counts leave the database.
+"""
+
+# Entry-level filters with a multikey index each, so the pre-unwind $match
+# skips documents that contain no matching entry
+ENTRY_FILTER_FIELDS = ["risk_level", "urgency", "is_airworthy"]
+
+# Breakdown facets of one field each: facet name -> grouped expression
+_COUNT_FACETS = {
+    "by_risk_level": "$entry.risk_level",
+    "by_urgency": "$entry.urgency",
+    "by_airworthy": "$entry.is_airworthy",
+    "by_make_model": "$aircraft_make_model",
+    "by_country": "$registration_country",
+    # The month the work was done, from the entry's parsed date; the upload month when it has none
+    "by_month": {"$substr": [
+        {"$ifNull": ["$entry_date", {"$dateToString": {"format": "%Y-%m", "date": "$timestamp"}}]}, 0, 7
+    ]},
+}
+
+
+def _count_facet(key_expression, sort):
+    return [
+        {"$group": {"_id": key_expression, "count": {"$sum": 1}}},
+        {"$sort": sort},
+        {"$project": {"_id": 0, "key": "$_id", "count": 1}},
+    ]
+
+
+def entry_conditions(filters):
+    """Exact match conditions on the unwound `entry` for the requested entry filters"""
+    return {f"entry.{field}": filters[field] for field in ENTRY_FILTER_FIELDS if filters.get(field) is not None}
+
+
+def build_analytics_pipeline(document_query, filters, top_aircraft=50):
+    """
+    Aggregation pipeline counting log entries by risk level, urgency,
+    airworthiness, aircraft, make/model, registration country and month of
+    the work in one $facet.
+    """
+    document_match = dict(document_query)
+    for field in ENTRY_FILTER_FIELDS:
+        if filters.get(field) is not None:
+            document_match[f"structured_data.log_entries.{field}"] = filters[field]
+
+    pipeline = [
+        {"$match": document_match},
+        {"$project": {
+            "_id": 0,
+            "timestamp": 1,
+            "registration_key": 1,
+            "registration_country": 1,
+            "aircraft_registration": "$structured_data.aircraft_registration",
+            "aircraft_make_model": "$structured_data.aircraft_make_model",
+            "entry": "$structured_data.log_entries",
+            "entry_dates": "$entry_values.date",
+        }},
+        {"$unwind": {"path": "$entry", "includeArrayIndex": "entry_index"}},
+        # Parsed ISO date of the same entry; entry_values line up with log_entries
+        {"$addFields": {"entry_date": {"$arrayElemAt": ["$entry_dates", "$entry_index"]}}},
+    ]
+    conditions = entry_conditions(filters)
+    if conditions:
+        pipeline.append({"$match": conditions})
+
+    facets = {
+        "totals": [
+            {"$group": {"_id": None, "entries": {"$sum": 1}, "aircraft": {"$addToSet": "$registration_key"}}},
+            {"$project": {"_id": 0, "entries": 1, "aircraft": {"$size": "$aircraft"}}},
+        ],
+        "by_aircraft": [
+            {"$group": {
+                "_id": {"aircraft": "$registration_key", "risk_level": "$entry.risk_level"},
+                "aircraft_registration": {"$first": "$aircraft_registration"},
+                "aircraft_make_model": {"$first": "$aircraft_make_model"},
+                "count": {"$sum": 1},
+            }},
+            {"$group": {
+                "_id": "$_id.aircraft",
+                "aircraft_registration": {"$first": "$aircraft_registration"},
+                "aircraft_make_model": {"$first": "$aircraft_make_model"},
+                "count": {"$sum": "$count"},
+                "by_risk_level": {"$push": {"key": "$_id.risk_level", "count": "$count"}},
+            }},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": top_aircraft},
+            {"$project": {
+                "_id": 0,
+                "registration_key": "$_id",
+                "aircraft_registration": 1,
+                "aircraft_make_model": 1,
+                "count": 1,
+                "by_risk_level": 1,
+            }},
+        ],
+    }
+    for name, key_expression in _COUNT_FACETS.items():
+        sort = {"_id": 1} if name == "by_month" else {"count": -1, "_id": 1}
+        facets[name] = _count_facet(key_expression, sort)
+
+    pipeline.append({"$facet": facets})
+    return pipeline
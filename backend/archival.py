@@ -0,0 +1,351 @@
+"""
+At-rest transcoding of stored log images to a compact archival format.
+
+Every upload is kept for audit, but phone JPEGs and PNG screenshots of logbook
+pages are far larger than they need to be. Each original is re-encoded as WebP
+at the lowest quality whose structural similarity (SSIM) to the original still
+meets `ARCHIVE_SSIM_TARGET`; screenshots and other lossless sources also get a
+lossless WebP candidate, and the smaller passing candidate wins. Images that
+would not shrink by at least `ARCHIVE_MIN_SAVING` keep their original.
+
+The archived image is stored under a new content-addressed name and the log
+document is pointed at it. Its `image_revision` is bumped rather than its
+revision, so cached copies of the log are refreshed while an edit made against
+the pre-archival ETag still passes its If-Match check. The original is deleted straight away, or after a grace period
+of `ARCHIVE_GRACE_DAYS` by the purge step. Transcoding runs in a process pool,
+either in the background right after an upload (`ARCHIVE_ON_UPLOAD`) or in
+bulk with `python manage.py archive-images`, which also reports bytes saved.
+"""
+
+import asyncio
+import os
+import re
+from array import array
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from bson import ObjectId
+from PIL import Image, ImageMath, UnidentifiedImageError
+
+from blob_storage import CONTENT_HASH_LENGTH, BlobNotFound, content_addressed_name, iter_bytes
+from etags import bump_collection_revision
+from image_derivatives import delete_derivatives
+from text_search import local_index
+from worker_pools import BoundedProcessPool
+
+ARCHIVE_FORMAT = "webp"
+ARCHIVE_CONTENT_TYPE = "image/webp"
+
+# WebP quality search range; the lowest passing quality is kept (the floor keeps handwriting legible)
+_MIN_QUALITY = 50
+_MAX_QUALITY = 95
+# WebP cannot encode larger images
+_MAX_DIMENSION = 16383
+# SSIM is computed on luminance in 8x8 blocks, on images scaled to at most this long edge
+_SSIM_MAX_EDGE = 4096
+_SSIM_BLOCK = 8
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+
+_LOSSY_SOURCE_FORMATS = {"JPEG", "MPO", "WEBP", "HEIF", "AVIF"}
+_HASH_SUFFIX_PATTERN = re.compile(rf'_[0-9a-f]{{{CONTENT_HASH_LENGTH}}}$')
+
+archive_pool = BoundedProcessPool("archival", "ARCHIVE_WORKERS", 1)
+# Background archive tasks started by uploads, referenced until they finish
+_background_tasks = set()
+
+
+def ssim_target():
+    return float(os.getenv("ARCHIVE_SSIM_TARGET", "0.98"))
+
+
+def min_saving():
+    return float(os.getenv("ARCHIVE_MIN_SAVING", "0.1"))
+
+
+def grace_days():
+    return int(os.getenv("ARCHIVE_GRACE_DAYS", "7"))
+
+
+def archive_on_upload():
+    return os.getenv("ARCHIVE_ON_UPLOAD", "true").lower() in ("1", "true", "yes")
+
+
+def _luma(image):
+    gray = image.convert("L")
+    if max(gray.size) > _SSIM_MAX_EDGE:
+        scale = _SSIM_MAX_EDGE / max(gray.size)
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))), Image.Resampling.BOX)
+    return gray.convert("F")
+
+
+def similarity(reference, candidate):
+    """Mean SSIM of two equally sized images over 8x8 luminance blocks (1.0 = identical)"""
+    x, y = _luma(reference), _luma(candidate)
+    # Block means of x, y and their products, all computed in C by the box reduction
+    means = [image.reduce(_SSIM_BLOCK) for image in (
+        x,
+        y,
+        ImageMath.lambda_eval(lambda args: args["x"] * args["x"], x=x),
+        ImageMath.lambda_eval(lambda args: args["y"] * args["y"], y=y),
+        ImageMath.lambda_eval(lambda args: args["x"] * args["y"], x=x, y=y),
+    )]
+    total = 0.0
+    count = 0
+    for mu_x, mu_y, mean_xx, mean_yy, mean_xy in zip(*(array("f", image.tobytes()) for image in means)):
+        var_x = mean_xx - mu_x * mu_x
+        var_y = mean_yy - mu_y * mu_y
+        covariance = mean_xy - mu_x * mu_y
+        total += ((2 * mu_x * mu_y + _SSIM_C1) * (2 * covariance + _SSIM_C2)) / (
+            (mu_x * mu_x + mu_y * mu_y + _SSIM_C1) * (var_x + var_y + _SSIM_C2))
+        count += 1
+    return total / count if count else 1.0
+
+
+def _encode(image, metadata, **options):
+    output = BytesIO()
+    image.save(output, "WEBP", method=4, **metadata, **options)
+    return output.getvalue()
+
+
+def _decode(data):
+    with Image.open(BytesIO(data)) as image:
+        image.load()
+        return image
+
+
+def transcode_image(data, target=None, saving=None):
+    """
+    Archival WebP encoding of an image (runs in a worker process). Returns a
+    dict with the encoded `data` and how it was chosen, or a dict with a
+    `reason` when the original should be kept.
+    """
+    target = ssim_target() if target is None else target
+    saving = min_saving() if saving is None else saving
+    try:
+        with Image.open(BytesIO(data)) as source:
+            if getattr(source, "n_frames", 1) > 1:
+                return {"reason": "multi-frame image"}
+            if max(source.size) > _MAX_DIMENSION:
+                return {"reason": "too large for WebP"}
+            source_format = source.format
+            # EXIF (capture date, orientation) and colour profile are kept for audit
+            metadata = {key: source.info[key] for key in ("exif", "icc_profile") if source.info.get(key)}
+            has_alpha = "A" in source.getbands() or "transparency" in source.info
+            image = source.convert("RGBA" if has_alpha else "RGB")
+    except (UnidentifiedImageError, OSError) as e:
+        return {"reason": f"cannot decode image: {e}"}
+
+    candidates = []
+
+    # Binary search for the lowest lossy quality that still meets the similarity target
+    low, high = _MIN_QUALITY, _MAX_QUALITY
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        encoded = _encode(image, metadata, quality=quality)
+        score = similarity(image, _decode(encoded))
+        if score >= target:
+            best = {"data": encoded, "quality": quality, "lossless": False, "ssim": round(score, 5)}
+            high = quality - 1
+        else:
+            low = quality + 1
+    if best:
+        candidates.append(best)
+
+    # Screenshots and scans saved losslessly often compress better without loss
+    if source_format not in _LOSSY_SOURCE_FORMATS:
+        encoded = _encode(image, metadata, lossless=True, quality=80)
+        candidates.append({"data": encoded, "quality": None, "lossless": True, "ssim": 1.0})
+
+    if not candidates:
+        return {"reason": f"no quality up to {_MAX_QUALITY} reaches SSIM {target}"}
+    chosen = min(candidates, key=lambda candidate: len(candidate["data"]))
+    if len(chosen["data"]) > len(data) * (1 - saving):
+        return {"reason": f"saves less than {saving:.0%} ({len(data)} -> {len(chosen['data'])} bytes)"}
+    return chosen
+
+
+def _archive_prefix(image_filename):
+    """Name stem shared by an original and its archived copy, without extension and content hash"""
+    stem = image_filename.split(".", 1)[0]
+    return _HASH_SUFFIX_PATTERN.sub("", stem) or stem
+
+
+def retained_original(doc):
+    """Original image an archived log still keeps during its grace period, if any"""
+    archive = doc.get("image_archive") or {}
+    if archive.get("status") == "archived" and not archive.get("original_deleted_at"):
+        return archive.get("original_filename")
+    return None
+
+
+async def _delete_original(store, image_filename):
+    await store.delete(image_filename)
+    await delete_derivatives(store, image_filename)
+
+
+async def archive_log_image(store, collection, meta_collection, doc, grace=None):
+    """
+    Transcode the image of one log document and repoint the log at the archived
+    copy. Returns a result dict with `status` archived, skipped or missing.
+    """
+    grace = grace_days() if grace is None else grace
+    image_filename = doc["image_filename"]
+    now = datetime.utcnow()
+    try:
+        blob = await store.open(image_filename)
+    except (BlobNotFound, ValueError):
+        return {"log_id": str(doc["_id"]), "status": "missing", "image_filename": image_filename}
+    data = b"".join([chunk async for chunk in blob.iter_chunks()])
+
+    result = await archive_pool.run(transcode_image, data)
+
+    if "reason" in result:
+        await collection.update_one(
+            {"_id": doc["_id"], "image_filename": image_filename, "image_archive": {"$exists": False}},
+            {"$set": {"image_archive": {
+                "status": "skipped",
+                "reason": result["reason"],
+                "original_bytes": len(data),
+                "archived_at": now,
+            }}}
+        )
+        return {"log_id": str(doc["_id"]), "status": "skipped", "reason": result["reason"], "original_bytes": len(data)}
+
+    archived_filename = content_addressed_name(_archive_prefix(image_filename), result["data"], f".{ARCHIVE_FORMAT}")
+    await store.save(archived_filename, iter_bytes(result["data"]), content_type=ARCHIVE_CONTENT_TYPE)
+    archive = {
+        "status": "archived",
+        "format": ARCHIVE_FORMAT,
+        "quality": result["quality"],
+        "lossless": result["lossless"],
+        "ssim": result["ssim"],
+        "original_filename": image_filename,
+        "original_bytes": len(data),
+        "archived_bytes": len(result["data"]),
+        "archived_at": now,
+        "original_expires_at": now + timedelta(days=grace),
+        "original_deleted_at": None,
+    }
+    updated = await collection.update_one(
+        {"_id": doc["_id"], "image_filename": image_filename, "image_archive": {"$exists": False}},
+        {"$set": {"image_filename": archived_filename, "image_archive": archive}, "$inc": {"image_revision": 1}}
+    )
+    if not updated.modified_count:
+        # The log was deleted or archived concurrently; this copy is unreferenced
+        if archived_filename != image_filename:
+            await store.delete(archived_filename)
+        return {"log_id": str(doc["_id"]), "status": "missing", "image_filename": image_filename}
+    # The archived name is no search field; the in-process search index only needs the revision
+    local_index.on_revision(await bump_collection_revision(meta_collection))
+
+    if grace <= 0:
+        await _delete_original(store, image_filename)
+        await collection.update_one({"_id": doc["_id"]}, {"$set": {"image_archive.original_deleted_at": now}})
+
+    print(f"✅ Archived {image_filename} -> {archived_filename}: {len(data)} -> {len(result['data'])} bytes (SSIM {result['ssim']})")
+    return {
+        "log_id": str(doc["_id"]),
+        "status": "archived",
+        "image_filename": archived_filename,
+        "original_bytes": len(data),
+        "archived_bytes": len(result["data"]),
+    }
+
+
+async def archive_pending(store, collection, meta_collection, limit=None, grace=None):
+    """Archive every log image not archived yet, as many at once as there are workers"""
+    query = {"image_filename": {"$type": "string"}, "image_archive": {"$exists": False}}
+    cursor = collection.find(query, {"image_filename": 1}).sort("timestamp", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    workers = archive_pool.workers
+    pending = set()
+    results = []
+    async for doc in cursor:
+        pending.add(asyncio.ensure_future(archive_log_image(store, collection, meta_collection, doc, grace)))
+        if len(pending) >= workers:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            results.extend(task.result() for task in done)
+    if pending:
+        results.extend(await asyncio.gather(*pending))
+    return results
+
+
+async def purge_expired_originals(store, collection, now=None):
+    """Delete originals whose grace period is over; returns how many were deleted"""
+    now = now or datetime.utcnow()
+    purged = 0
+    cursor = collection.find(
+        {"image_archive.original_expires_at": {"$lte": now}, "image_archive.original_deleted_at": None},
+        {"image_archive.original_filename": 1}
+    )
+    async for doc in cursor:
+        await _delete_original(store, doc["image_archive"]["original_filename"])
+        await collection.update_one({"_id": doc["_id"]}, {"$set": {"image_archive.original_deleted_at": now}})
+        purged += 1
+    return purged
+
+
+async def archive_report(collection):
+    """Image counts and byte totals of the archival pipeline, in one aggregation"""
+    pipeline = [
+        {"$match": {"image_filename": {"$type": "string"}}},
+        {"$group": {
+            "_id": None,
+            "images": {"$sum": 1},
+            "archived_images": {"$sum": {"$cond": [{"$eq": ["$image_archive.status", "archived"]}, 1, 0]}},
+            "skipped_images": {"$sum": {"$cond": [{"$eq": ["$image_archive.status", "skipped"]}, 1, 0]}},
+            "original_bytes": {"$sum": {"$cond": [{"$eq": ["$image_archive.status", "archived"]}, "$image_archive.original_bytes", 0]}},
+            "archived_bytes": {"$sum": {"$cond": [{"$eq": ["$image_archive.status", "archived"]}, "$image_archive.archived_bytes", 0]}},
+            "retained_originals": {"$sum": {"$cond": [
+                {"$and": [{"$eq": ["$image_archive.status", "archived"]}, {"$eq": [{"$ifNull": ["$image_archive.original_deleted_at", None]}, None]}]},
+                1, 0
+            ]}},
+            "retained_original_bytes": {"$sum": {"$cond": [
+                {"$and": [{"$eq": ["$image_archive.status", "archived"]}, {"$eq": [{"$ifNull": ["$image_archive.original_deleted_at", None]}, None]}]},
+                "$image_archive.original_bytes", 0
+            ]}},
+        }},
+    ]
+    totals = {}
+    async for row in collection.aggregate(pipeline):
+        totals = row
+    images = totals.get("images", 0)
+    archived = totals.get("archived_images", 0)
+    skipped = totals.get("skipped_images", 0)
+    original_bytes = totals.get("original_bytes", 0)
+    archived_bytes = totals.get("archived_bytes", 0)
+    return {
+        "images": images,
+        "archived_images": archived,
+        "skipped_images": skipped,
+        "pending_images": images - archived - skipped,
+        "original_bytes": original_bytes,
+        "archived_bytes": archived_bytes,
+        "bytes_saved": original_bytes - archived_bytes,
+        "retained_originals": totals.get("retained_originals", 0),
+        "retained_original_bytes": totals.get("retained_original_bytes", 0),
+    }
+
+
+def schedule_archive(store, collection, meta_collection, log_id):
+    """Archive a freshly uploaded log's image in the background, if enabled"""
+    if not archive_on_upload():
+        return None
+
+    async def run():
+        try:
+            doc = await collection.find_one({"_id": ObjectId(log_id)}, {"image_filename": 1, "image_archive": 1})
+            if doc and doc.get("image_filename") and "image_archive" not in doc:
+                await archive_log_image(store, collection, meta_collection, doc)
+        except Exception as e:
+            # The bulk job picks up anything left unarchived
+            print(f"⚠️ WARNING: archiving image of log {log_id} failed: {e}")
+
+    task = asyncio.ensure_future(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
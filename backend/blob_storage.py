@@ -0,0 +1,277 @@
+"""
+Blob storage for uploaded maintenance log images.
+
+Images used to live in a relative `uploads/` directory on whichever API node
+received them, so every other node answered 404. All reads, writes and
+deletes now go through a `BlobStore`, chosen with `BLOB_STORAGE`:
+
+- `local` (default): files under `UPLOADS_DIR` (default `uploads`), which
+  must be a shared volume when more than one node runs.
+- `gridfs`: a GridFS bucket (`GRIDFS_BUCKET`, default `images`) in the same
+  MongoDB database as the logs, so every node sees every image.
+
+Both backends stream: writes consume an async iterator of chunks and reads
+yield chunks, so an image is never held in memory whole by the store.
+
+Uploads are stored under content-addressed names (a prefix of the SHA-256 of
+the bytes before the extension), so the bytes behind such a name never change
+and may be cached forever.
+"""
+
+import asyncio
+import hashlib
+import mimetypes
+import os
+import re
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from database import Database
+
+CHUNK_SIZE = 256 * 1024
+
+CONTENT_HASH_LENGTH = 16
+
+# "<anything>_<hash>.<ext>[.<ext>...]": originals and the derivatives named after them
+_CONTENT_ADDRESSED_PATTERN = re.compile(rf'_[0-9a-f]{{{CONTENT_HASH_LENGTH}}}(?:\.[A-Za-z0-9]+)+$')
+_EXTENSION_PATTERN = re.compile(r'^\.[A-Za-z0-9]{1,10}$')
+
+
+class BlobNotFound(Exception):
+    """Raised when a blob does not exist in the store"""
+
+
+def check_blob_name(name):
+    """Blob names are plain file names; anything that could escape the store is rejected"""
+    if not name or name.startswith(".") or "/" in name or "\\" in name or "\x00" in name:
+        raise ValueError(f"Invalid blob name: {name!r}")
+    return name
+
+
+def content_addressed_name(prefix, data, extension):
+    """Blob name for `data` that changes whenever the bytes do"""
+    extension = extension.lower() if extension and _EXTENSION_PATTERN.match(extension) else ".bin"
+    return f"{prefix}_{hashlib.sha256(data).hexdigest()[:CONTENT_HASH_LENGTH]}{extension}"
+
+
+def is_content_addressed(name):
+    """Whether a blob name embeds a hash of its content, i.e. is immutable"""
+    return bool(_CONTENT_ADDRESSED_PATTERN.search(name))
+
+
+async def iter_bytes(data, chunk_size=CHUNK_SIZE):
+    """Chunks of an in-memory bytes object"""
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+async def iter_file(fileobj, chunk_size=CHUNK_SIZE):
+    """Chunks of an object with an async `read(size)`, such as an UploadFile"""
+    while True:
+        chunk = await fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class Blob:
+    """A stored blob: its size, content type, last write time and ETag, and a way to read it"""
+
+    def __init__(self, name, size, content_type, updated_at, etag, reader):
+        self.name = name
+        self.size = size
+        self.content_type = content_type
+        self.updated_at = updated_at
+        self.etag = etag
+        self._reader = reader
+
+    def iter_chunks(self, start=0, end=None):
+        """Async iterator over bytes [start, end) of the blob"""
+        end = self.size if end is None else min(end, self.size)
+        return self._reader(start, end)
+
+
+class BlobStore:
+    """Interface of a blob backend"""
+
+    async def save(self, name, chunks, content_type=None):
+        """Store the async iterator of `chunks` under `name`, replacing any existing blob. Returns the size."""
+        raise NotImplementedError
+
+    async def open(self, name):
+        """The stored `Blob`; raises BlobNotFound"""
+        raise NotImplementedError
+
+    async def delete(self, name):
+        """Remove a blob; returns whether it existed"""
+        raise NotImplementedError
+
+    async def exists(self, name):
+        try:
+            await self.open(name)
+            return True
+        except BlobNotFound:
+            return False
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files in one directory; file I/O runs in worker threads"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, name):
+        return self.root / check_blob_name(name)
+
+    async def save(self, name, chunks, content_type=None):
+        path = self._path(name)
+        # Written next to the target and renamed, so readers never see a partial file
+        partial = self.root / f".{name}.{uuid.uuid4().hex}.partial"
+        handle = await asyncio.to_thread(open, partial, "wb")
+        size = 0
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(handle.write, chunk)
+                size += len(chunk)
+            await asyncio.to_thread(handle.close)
+            await asyncio.to_thread(os.replace, partial, path)
+        except BaseException:
+            handle.close()
+            partial.unlink(missing_ok=True)
+            raise
+        return size
+
+    async def open(self, name):
+        path = self._path(name)
+        try:
+            stat = await asyncio.to_thread(path.stat)
+        except FileNotFoundError:
+            raise BlobNotFound(name)
+
+        async def reader(start, end):
+            handle = await asyncio.to_thread(open, path, "rb")
+            try:
+                await asyncio.to_thread(handle.seek, start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = await asyncio.to_thread(handle.read, min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+            finally:
+                await asyncio.to_thread(handle.close)
+
+        return Blob(
+            name=name,
+            size=stat.st_size,
+            content_type=mimetypes.guess_type(name)[0] or "application/octet-stream",
+            updated_at=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            # Changes with every write: files are replaced by rename, never rewritten in place
+            etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            reader=reader,
+        )
+
+    async def delete(self, name):
+        path = self._path(name)
+        try:
+            await asyncio.to_thread(path.unlink)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class GridFSBlobStore(BlobStore):
+    """Blobs in a GridFS bucket of the application database"""
+
+    def __init__(self, database, bucket_name="images"):
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name, chunk_size_bytes=CHUNK_SIZE)
+        self.files = database[f"{bucket_name}.files"]
+
+    async def save(self, name, chunks, content_type=None):
+        check_blob_name(name)
+        content_type = content_type or mimetypes.guess_type(name)[0] or "application/octet-stream"
+        previous = [doc["_id"] async for doc in self.files.find({"filename": name}, {"_id": 1})]
+        grid_in = self.bucket.open_upload_stream(name, metadata={"contentType": content_type})
+        try:
+            async for chunk in chunks:
+                await grid_in.write(chunk)
+        except BaseException:
+            await grid_in.abort()
+            raise
+        await grid_in.close()
+        # Only drop the old revisions once the new one is complete
+        for file_id in previous:
+            await self._delete_id(file_id)
+        return grid_in.length
+
+    async def open(self, name):
+        check_blob_name(name)
+        try:
+            grid_out = await self.bucket.open_download_stream_by_name(name)
+        except NoFile:
+            raise BlobNotFound(name)
+
+        async def reader(start, end):
+            grid_out.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = await grid_out.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+        upload_date = grid_out.upload_date
+        if upload_date is not None and upload_date.tzinfo is None:
+            upload_date = upload_date.replace(tzinfo=timezone.utc)
+        return Blob(
+            name=name,
+            size=grid_out.length,
+            content_type=(grid_out.metadata or {}).get("contentType") or mimetypes.guess_type(name)[0] or "application/octet-stream",
+            updated_at=upload_date,
+            # Every save is a new GridFS file with a new id
+            etag=f'"{grid_out._id}"',
+            reader=reader,
+        )
+
+    async def _delete_id(self, file_id):
+        try:
+            await self.bucket.delete(file_id)
+        except NoFile:
+            pass
+
+    async def delete(self, name):
+        check_blob_name(name)
+        deleted = False
+        async for doc in self.files.find({"filename": name}, {"_id": 1}):
+            await self._delete_id(doc["_id"])
+            deleted = True
+        return deleted
+
+
+_blob_store = None
+
+
+def get_blob_store():
+    """Get or create the configured blob store"""
+    global _blob_store
+    if _blob_store is None:
+        backend = os.getenv("BLOB_STORAGE", "local").lower()
+        print(f"🔄 Initializing {backend} blob store...")
+        if backend == "gridfs":
+            if not Database.client:
+                raise RuntimeError("Database not connected")
+            database = Database.client[Database.database_name]
+            _blob_store = GridFSBlobStore(database, os.getenv("GRIDFS_BUCKET", "images"))
+        elif backend == "local":
+            _blob_store = LocalBlobStore(os.getenv("UPLOADS_DIR", "uploads"))
+        else:
+            raise ValueError(f"Unknown BLOB_STORAGE backend: {backend}")
+        print(f"✅ Blob store initialized")
+    return _blob_store
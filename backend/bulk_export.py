@@ -0,0 +1,175 @@
+"""
+Streaming bulk export of maintenance logs, one row per log entry.
+
+Rows are produced straight from an async Mongo cursor and encoded one at a
+time, so memory use does not depend on how many logs are exported. Documents
+are read in (timestamp, _id) descending order and every row carries a resume
+token naming its position; passing the token of the last row received as
+`cursor` continues the export with the next row.
+"""
+
+import base64
+import csv
+import json
+from datetime import datetime
+from io import StringIO
+
+from bson import ObjectId
+
+from serialization import dumps_line
+
+# Fields of the parent log repeated on every entry row
+LOG_COLUMNS = [
+    "log_id",
+    "timestamp",
+    "uploaded_by",
+    "image_filename",
+    "aircraft_registration",
+    "aircraft_make_model",
+    "summary",
+]
+
+ENTRY_COLUMNS = [
+    "entry_index",
+    "date",
+    "description_of_work_performed",
+    "tach_time",
+    "hobbs_time",
+    "part_number_replaced",
+    "manual_reference",
+    "reason_for_maintenance",
+    "ad_compliance",
+    "next_due_compliance",
+    "service_bulletin_reference",
+    "certification_statement",
+    "performed_by",
+    "license_number",
+    "risk_level",
+    "urgency",
+    "is_airworthy",
+]
+
+EXPORT_COLUMNS = LOG_COLUMNS + ENTRY_COLUMNS + ["cursor"]
+
+# Only what the rows need; derived index fields stay in the database
+EXPORT_PROJECTION = {
+    "timestamp": 1,
+    "uploaded_by": 1,
+    "image_filename": 1,
+    "structured_data": 1,
+}
+
+EXPORT_SORT = [("timestamp", -1), ("_id", -1)]
+
+EXPORT_BATCH_SIZE = 500
+
+# CSV has no list type; part numbers are joined into a single cell
+CSV_LIST_SEPARATOR = "; "
+
+
+def encode_cursor(timestamp, log_id, entry_index):
+    """Opaque resume token for the row after entry `entry_index` of a log"""
+    payload = json.dumps([timestamp.isoformat(), str(log_id), entry_index], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    (timestamp, ObjectId, entry_index) from a resume token.
+    Raises ValueError for a token this module did not produce.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        timestamp, log_id, entry_index = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(timestamp), ObjectId(log_id), int(entry_index)
+    except Exception as e:
+        raise ValueError(f"Invalid export cursor: {e}")
+
+
+def resume_filter(timestamp, log_id):
+    """
+    Documents at or after a resume position in export order. The document the
+    token points into is included so its remaining entries can be exported.
+    """
+    return {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lte": log_id}},
+    ]}
+
+
+def export_rows(doc, after_entry=-1):
+    """
+    One flat dict per log entry of a document, parent fields repeated.
+    Entries up to and including `after_entry` are skipped (used on resume).
+    """
+    structured_data = doc.get("structured_data") or {}
+    timestamp = doc.get("timestamp")
+    parent = {
+        "log_id": str(doc["_id"]),
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "uploaded_by": doc.get("uploaded_by"),
+        "image_filename": doc.get("image_filename"),
+        "aircraft_registration": structured_data.get("aircraft_registration"),
+        "aircraft_make_model": structured_data.get("aircraft_make_model"),
+        "summary": structured_data.get("summary"),
+    }
+
+    for entry_index, entry in enumerate(structured_data.get("log_entries") or []):
+        if entry_index <= after_entry:
+            continue
+        row = dict(parent)
+        row["entry_index"] = entry_index
+        for column in ENTRY_COLUMNS[1:]:
+            row[column] = entry.get(column)
+        row["cursor"] = encode_cursor(timestamp, doc["_id"], entry_index) if timestamp else None
+        yield row
+
+
+def ndjson_line(row):
+    """One NDJSON line for an export row"""
+    return dumps_line(row)
+
+
+class CsvRowWriter:
+    """Encodes export rows as CSV lines one at a time through a reused buffer"""
+
+    def __init__(self):
+        self.buffer = StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def line(self, values):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.writer.writerow(values)
+        return self.buffer.getvalue()
+
+    def header(self):
+        return self.line(EXPORT_COLUMNS)
+
+    def row(self, row):
+        values = []
+        for column in EXPORT_COLUMNS:
+            value = row.get(column)
+            if isinstance(value, list):
+                value = CSV_LIST_SEPARATOR.join(str(item) for item in value)
+            values.append("" if value is None else value)
+        return self.line(values)
+
+
+async def stream_export(cursor, export_format, after=None):
+    """
+    Async generator of encoded export chunks for a cursor already filtered and
+    sorted in export order. `after` is the decoded resume token, if any.
+    """
+    resume_id = after[1] if after else None
+    resume_entry = after[2] if after else -1
+
+    csv_writer = None
+    if export_format == "csv":
+        csv_writer = CsvRowWriter()
+        yield csv_writer.header()
+
+    async for doc in cursor:
+        after_entry = resume_entry if doc["_id"] == resume_id else -1
+        for row in export_rows(doc, after_entry):
+            yield csv_writer.row(row) if csv_writer else ndjson_line(row)
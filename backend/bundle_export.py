@@ -0,0 +1,170 @@
+"""
+Records bundle: every log of an aircraft as one ZIP of JSON, PDF and the scanned image.
+
+When an aircraft changes hands its records go with it. `stream_bundle` writes
+the ZIP while it is being sent: logs come from a MongoDB cursor, each log's
+files are written as ZIP members and the compressed bytes are yielded as soon
+as `zipfile` produces them. Nothing ever needs the archive to be seekable
+(sizes and CRCs go into data descriptors after each member), so the first
+bytes leave immediately and memory does not depend on the number of logs.
+
+PDFs come from the PDF cache or are rendered in the PDF worker pool a couple
+of logs ahead of the writer, so rendering overlaps with sending. Bundle
+renders are background jobs of the pool: they only start on an idle worker,
+leaving the queue to interactive exports, and a bundle that cannot get a
+worker for `PDF_WAIT_SECONDS` is aborted rather than waiting forever.
+"""
+
+import asyncio
+import time
+import zipfile
+from collections import deque
+from datetime import datetime
+
+from archival import retained_original
+from blob_storage import BlobNotFound, iter_bytes
+from models import MaintenanceLog
+from pdf_cache import pdf_cache_key, read_cached_pdf, store_pdf
+from pdf_render import pdf_document, pdf_pool, render_pdf
+from serialization import StoredDocumentSerializer
+from worker_pools import PoolSaturated
+
+# Oldest first, like the report PDF
+BUNDLE_SORT = [("timestamp", 1), ("_id", 1)]
+
+BUNDLE_BATCH_SIZE = 100
+
+# PDFs rendered ahead of the log being written
+PDF_LOOKAHEAD = 2
+
+# A bundle already streaming cannot answer 429, so it waits for a free PDF worker instead,
+# up to PDF_WAIT_SECONDS for each PDF
+SATURATED_RETRY_SECONDS = 0.5
+PDF_WAIT_SECONDS = 120
+
+# Scans are already compressed; deflating them again only costs CPU
+STORED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".avif", ".gif", ".pdf")
+
+
+class ZipSink:
+    """Write-only file object for `zipfile`: collects what it writes until drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def member_info(name, when):
+    info = zipfile.ZipInfo(name, date_time=when.timetuple()[:6])
+    info.compress_type = zipfile.ZIP_STORED if name.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    return info
+
+
+class BundleAborted(Exception):
+    """Raised when a bundle cannot be completed, e.g. no PDF worker came free in time"""
+
+
+# Stored logs were validated when written
+_stored_logs = StoredDocumentSerializer(MaintenanceLog)
+
+
+def log_json(doc):
+    """The log as the API returns it from GET /logs/{log_id}"""
+    return _stored_logs.dump(doc, indent=2)
+
+
+def log_folder(root, doc):
+    timestamp = doc.get("timestamp")
+    stamp = timestamp.strftime("%Y%m%d_%H%M%S") if isinstance(timestamp, datetime) else "undated"
+    return f"{root}/{stamp}_{doc['_id']}"
+
+
+def scan_filename(doc):
+    """The scan to hand over: the original while an archived log still keeps it, else the stored image"""
+    return retained_original(doc) or doc.get("image_filename")
+
+
+async def _render_when_free(document, log_id):
+    deadline = time.monotonic() + PDF_WAIT_SECONDS
+    while True:
+        try:
+            return await pdf_pool.run(render_pdf, document, background=True)
+        except PoolSaturated:
+            if time.monotonic() >= deadline:
+                raise BundleAborted(f"No PDF worker came free within {PDF_WAIT_SECONDS}s for log {log_id}")
+            await asyncio.sleep(SATURATED_RETRY_SECONDS)
+
+
+async def log_pdf(store, cache_collection, doc):
+    """The log's PDF as an async iterator of chunks: a cached blob, or rendered and cached now"""
+    log_id = str(doc["_id"])
+    key = pdf_cache_key(doc.get("structured_data"))
+    cached = await read_cached_pdf(store, cache_collection, key, log_id)
+    if cached is not None:
+        return iter_bytes(cached)
+    pdf_bytes = await _render_when_free(pdf_document(doc), log_id)
+    await store_pdf(store, cache_collection, key, log_id, pdf_bytes)
+    return iter_bytes(pdf_bytes)
+
+
+async def stream_bundle(cursor, store, cache_collection, root):
+    """ZIP bytes for every log from `cursor`: `<root>/<upload time>_<log id>/` with log.json, log.pdf and the scan"""
+    sink = ZipSink()
+    archive = zipfile.ZipFile(sink, mode="w")
+    pending = deque()
+
+    async def write_member(name, when, chunks):
+        with archive.open(member_info(name, when), mode="w") as member:
+            async for chunk in chunks:
+                member.write(chunk)
+                data = sink.drain()
+                if data:
+                    yield data
+        # Closing the member writes its data descriptor
+        data = sink.drain()
+        if data:
+            yield data
+
+    async def write_log(doc, pdf_task):
+        folder = log_folder(root, doc)
+        when = doc.get("timestamp") if isinstance(doc.get("timestamp"), datetime) else datetime.utcnow()
+        async for data in write_member(f"{folder}/log.json", when, iter_bytes(log_json(doc))):
+            yield data
+        async for data in write_member(f"{folder}/log.pdf", when, await pdf_task):
+            yield data
+        image_filename = scan_filename(doc)
+        if image_filename:
+            try:
+                blob = await store.open(image_filename)
+            except (BlobNotFound, ValueError):
+                print(f"⚠️ Image {image_filename} of log {doc['_id']} is missing from storage; left out of the bundle")
+            else:
+                async for data in write_member(f"{folder}/{image_filename}", when, blob.iter_chunks()):
+                    yield data
+
+    try:
+        async for doc in cursor:
+            pending.append((doc, asyncio.ensure_future(log_pdf(store, cache_collection, doc))))
+            if len(pending) > PDF_LOOKAHEAD:
+                async for data in write_log(*pending.popleft()):
+                    yield data
+        while pending:
+            async for data in write_log(*pending.popleft()):
+                yield data
+        archive.close()
+        yield sink.drain()
+    finally:
+        for _, task in pending:
+            task.cancel()
@@ -0,0 +1,212 @@
+"""
+Columnar (Parquet / Arrow IPC) export of maintenance log entries for analytics.
+
+Log entries are flattened into one typed table: tach and hobbs readings as
+floats, entry dates as dates, risk level and urgency as dictionary-encoded
+(categorical) columns and replaced parts as a list column. The original
+strings are kept next to the parsed values so unparseable readings can be
+found. Rows are accumulated column-wise from a cursor and written one record
+batch (one Parquet row group) at a time.
+"""
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from field_parsing import parse_entry_date, parse_hours
+
+COLUMNAR_BATCH_SIZE = 10000
+
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+COLUMNAR_SCHEMA = pa.schema([
+    ("log_id", pa.string()),
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("aircraft_registration", pa.string()),
+    ("registration_key", pa.string()),
+    ("aircraft_make_model", pa.string()),
+    ("entry_index", pa.int32()),
+    ("date", pa.date32()),
+    ("date_raw", pa.string()),
+    ("tach_time", pa.float64()),
+    ("tach_time_raw", pa.string()),
+    ("hobbs_time", pa.float64()),
+    ("hobbs_time_raw", pa.string()),
+    ("description_of_work_performed", pa.string()),
+    ("part_number_replaced", pa.list_(pa.string())),
+    ("manual_reference", pa.string()),
+    ("reason_for_maintenance", pa.string()),
+    ("ad_compliance", pa.string()),
+    ("next_due_compliance", pa.string()),
+    ("service_bulletin_reference", pa.string()),
+    ("performed_by", pa.string()),
+    ("license_number", pa.string()),
+    ("risk_level", CATEGORY),
+    ("urgency", CATEGORY),
+    ("is_airworthy", pa.bool_()),
+])
+
+COLUMNAR_PROJECTION = {
+    "timestamp": 1,
+    "registration_key": 1,
+    "structured_data": 1,
+}
+
+# Entry fields copied through as plain strings
+_TEXT_FIELDS = [
+    "description_of_work_performed",
+    "manual_reference",
+    "reason_for_maintenance",
+    "ad_compliance",
+    "next_due_compliance",
+    "service_bulletin_reference",
+    "performed_by",
+    "license_number",
+]
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+class ColumnBatchBuilder:
+    """Accumulates flattened log entries column by column and emits record batches"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.columns = {name: [] for name in COLUMNAR_SCHEMA.names}
+        self.rows = 0
+
+    def add(self, doc):
+        """Append one row per log entry of a document"""
+        structured_data = doc.get("structured_data") or {}
+        columns = self.columns
+        for entry_index, entry in enumerate(structured_data.get("log_entries") or []):
+            columns["log_id"].append(str(doc["_id"]))
+            columns["timestamp"].append(doc.get("timestamp"))
+            columns["aircraft_registration"].append(_text(structured_data.get("aircraft_registration")))
+            columns["registration_key"].append(doc.get("registration_key"))
+            columns["aircraft_make_model"].append(_text(structured_data.get("aircraft_make_model")))
+            columns["entry_index"].append(entry_index)
+            columns["date"].append(parse_entry_date(entry.get("date")))
+            columns["date_raw"].append(_text(entry.get("date")))
+            columns["tach_time"].append(parse_hours(entry.get("tach_time")))
+            columns["tach_time_raw"].append(_text(entry.get("tach_time")))
+            columns["hobbs_time"].append(parse_hours(entry.get("hobbs_time")))
+            columns["hobbs_time_raw"].append(_text(entry.get("hobbs_time")))
+            columns["part_number_replaced"].append([str(part) for part in entry.get("part_number_replaced") or []])
+            for field in _TEXT_FIELDS:
+                columns[field].append(_text(entry.get(field)))
+            columns["risk_level"].append(_text(entry.get("risk_level")))
+            columns["urgency"].append(_text(entry.get("urgency")))
+            is_airworthy = entry.get("is_airworthy")
+            columns["is_airworthy"].append(None if is_airworthy is None else bool(is_airworthy))
+            self.rows += 1
+
+    def flush(self):
+        """Record batch of everything added since the last flush"""
+        arrays = []
+        for field in COLUMNAR_SCHEMA:
+            values = self.columns[field.name]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        batch = pa.RecordBatch.from_arrays(arrays, schema=COLUMNAR_SCHEMA)
+        self.reset()
+        return batch
+
+
+class ChunkSink:
+    """Write-only file object whose written bytes are drained after each batch"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ColumnarWriter:
+    """Parquet or Arrow IPC stream writer over any binary file object"""
+
+    def __init__(self, sink, export_format):
+        if export_format == "parquet":
+            self.writer = pq.ParquetWriter(sink, COLUMNAR_SCHEMA, compression="zstd")
+        elif export_format == "arrow":
+            self.writer = pa.ipc.new_stream(sink, COLUMNAR_SCHEMA)
+        else:
+            raise ValueError(f"Unsupported columnar format: {export_format}")
+
+    def write(self, builder):
+        """Encode and write everything accumulated in a batch builder"""
+        self.writer.write_batch(builder.flush())
+
+    def close(self):
+        self.writer.close()
+
+
+def write_columnar(docs, sink, export_format, batch_size=COLUMNAR_BATCH_SIZE):
+    """
+    Write documents from a synchronous iterable (e.g. a pymongo cursor) to a
+    binary file object. Returns the number of entry rows written.
+    """
+    builder = ColumnBatchBuilder()
+    writer = ColumnarWriter(sink, export_format)
+    total = 0
+    try:
+        for doc in docs:
+            builder.add(doc)
+            if builder.rows >= batch_size:
+                total += builder.rows
+                writer.write(builder)
+        if builder.rows:
+            total += builder.rows
+            writer.write(builder)
+    finally:
+        writer.close()
+    return total
+
+
+async def stream_columnar(cursor, export_format, batch_size=COLUMNAR_BATCH_SIZE, run_sync=None):
+    """
+    Async generator of encoded chunks for an async cursor, one chunk per record
+    batch. `run_sync` runs the CPU-bound encoding off the event loop.
+    """
+    async def call(fn, *args):
+        return await run_sync(fn, *args) if run_sync else fn(*args)
+
+    builder = ColumnBatchBuilder()
+    sink = ChunkSink()
+    writer = await call(ColumnarWriter, sink, export_format)
+    try:
+        async for doc in cursor:
+            builder.add(doc)
+            if builder.rows >= batch_size:
+                await call(writer.write, builder)
+                yield sink.drain()
+        if builder.rows:
+            await call(writer.write, builder)
+    finally:
+        await call(writer.close)
+    yield sink.drain()
@@ -4,6 +4,9 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient, DESCENDING
 from bson import ObjectId
 
+from aircraft_state import TIMELINE_SORT
+from text_search import TEXT_INDEX_KEYS, TEXT_INDEX_NAME, TEXT_INDEX_WEIGHTS
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,6 +15,7 @@ class Database:
     client: AsyncIOMotorClient = None
     database_name: str = None
     collection_name: str = None
+    text_search_available: bool = False
 
     @classmethod
     def connect_db(cls):
@@ -72,6 +76,51 @@ class Database:
         print(f"✅ Collection obtained: {collection.name}")
         return collection
 
+    @classmethod
+    def get_meta_collection(cls):
+        """Small collection holding bookkeeping documents such as the log list revision"""
+        if not cls.client:
+            print(f"❌ Database client not initialized")
+            raise RuntimeError("Database not connected")
+
+        return cls.client[cls.database_name][f"{cls.collection_name}_meta"]
+
+    @classmethod
+    def get_aircraft_collection(cls):
+        """Materialized per-aircraft state documents, keyed by registration key"""
+        if not cls.client:
+            print(f"❌ Database client not initialized")
+            raise RuntimeError("Database not connected")
+
+        return cls.client[cls.database_name][f"{cls.collection_name}_aircraft"]
+
+    @classmethod
+    def get_aircraft_timeline_collection(cls):
+        """One timeline document per log entry, behind the aircraft state summaries"""
+        if not cls.client:
+            print(f"❌ Database client not initialized")
+            raise RuntimeError("Database not connected")
+
+        return cls.client[cls.database_name][f"{cls.collection_name}_aircraft_timeline"]
+
+    @classmethod
+    def get_aircraft_sources_collection(cls):
+        """One source document per log (aircraft name and entry counts), behind the aircraft state summaries"""
+        if not cls.client:
+            print(f"❌ Database client not initialized")
+            raise RuntimeError("Database not connected")
+
+        return cls.client[cls.database_name][f"{cls.collection_name}_aircraft_sources"]
+
+    @classmethod
+    def get_pdf_cache_collection(cls):
+        """Index of rendered PDF exports cached in the blob store"""
+        if not cls.client:
+            print(f"❌ Database client not initialized")
+            raise RuntimeError("Database not connected")
+
+        return cls.client[cls.database_name][f"{cls.collection_name}_pdf_cache"]
+
     @classmethod
     def create_indexes(cls):
         print(f"=== CREATE INDEXES START ===")
@@ -85,21 +134,49 @@ class Database:
             print(f"✅ Sync client created for index creation")
             
             # Create indexes using proper PyMongo methods
+            # Each entry is (keys, options); sparse=True for better handling of missing fields
             indexes_to_create = [
-                ("timestamp", DESCENDING),
-                ("aircraft_registration", 1),
-                ("uploaded_by", 1)
+                ([("timestamp", DESCENDING)], {"sparse": True}),
+                ([("aircraft_registration", 1)], {"sparse": True}),
+                ([("uploaded_by", 1)], {"sparse": True}),
+                # Exact and anchored-prefix registration search, newest first
+                ([("registration_key", 1), ("timestamp", DESCENDING)], {"sparse": True}),
+                # Bulk export walks logs in (timestamp, _id) order, optionally per aircraft
+                ([("timestamp", DESCENDING), ("_id", DESCENDING)], {}),
+                ([("registration_key", 1), ("timestamp", DESCENDING), ("_id", DESCENDING)], {"sparse": True}),
+                # Fleet analytics per registration country
+                ([("registration_country", 1), ("timestamp", DESCENDING)], {"sparse": True}),
+                # Entry-level analytics filters (multikey over log entries), newest first
+                ([("structured_data.log_entries.risk_level", 1), ("timestamp", DESCENDING)], {"sparse": True}),
+                ([("structured_data.log_entries.urgency", 1), ("timestamp", DESCENDING)], {"sparse": True}),
+                ([("structured_data.log_entries.is_airworthy", 1), ("timestamp", DESCENDING)], {"sparse": True}),
+                # Range filters on the typed entry values (multikey over entry_values)
+                ([("entry_values.tach_time", 1)], {"sparse": True}),
+                ([("entry_values.hobbs_time", 1)], {"sparse": True}),
+                ([("entry_values.date", 1)], {"sparse": True}),
+                # Parsed next-due points (multikey over due_items)
+                ([("due_items.due_date", 1)], {"sparse": True}),
+                ([("due_items.due_tach", 1)], {"sparse": True}),
+                # AD / SB compliance cross-reference (multikey over references)
+                ([("references.type", 1), ("references.id", 1)], {"sparse": True}),
+                # Originals of archived images waiting out their grace period
+                ([("image_archive.original_expires_at", 1)], {"sparse": True}),
+                # Part-number lookups (multikey over the derived parts array)
+                ([("parts.key", 1), ("timestamp", DESCENDING)], {"sparse": True}),
+                # Full-text search over work descriptions, AD/SB references and summaries
+                (TEXT_INDEX_KEYS, {"name": TEXT_INDEX_NAME, "weights": TEXT_INDEX_WEIGHTS}),
             ]
-            
-            for field, direction in indexes_to_create:
+
+            for keys, options in indexes_to_create:
+                field = ", ".join(name for name, _ in keys)
                 try:
-                    print(f"🔄 Creating index on {field} with direction {direction}")
-                    
-                    # Use create_index with background=True and sparse=True for better handling
+                    print(f"🔄 Creating index on {field} with directions {[direction for _, direction in keys]}")
+
+                    # Use create_index with background=True for better handling
                     collection.create_index(
-                        [(field, direction)], 
+                        keys,
                         background=True,
-                        sparse=True
+                        **options
                     )
                     print(f"✅ Index created on {field}")
                         
@@ -117,6 +194,50 @@ class Database:
                     # Don't fail startup for index creation issues
                     pass
             
+            # The fleet-wide due list by hours remaining or due date
+            aircraft_collection = database[f"{cls.collection_name}_aircraft"]
+            for keys in ([("outstanding_items.hours_remaining", 1)],
+                         [("outstanding_items.due_date", 1)]):
+                try:
+                    aircraft_collection.create_index(keys, background=True)
+                    print(f"✅ Index created on aircraft state {keys[0][0]}")
+                except Exception as e:
+                    print(f"⚠️ Warning: Failed to create aircraft state index on {keys[0][0]}: {e}")
+
+            # Each summary field of an aircraft state is one indexed find_one on its timeline:
+            # timeline order (latest entry, last annual, newest statement per subject) and highest readings.
+            # A log's items are replaced by log_id; its source names the aircraft, newest first.
+            aircraft_indexes = [
+                (f"{cls.collection_name}_aircraft_timeline", [("registration_key", 1)] + TIMELINE_SORT),
+                (f"{cls.collection_name}_aircraft_timeline", [("registration_key", 1), ("annual", 1)] + TIMELINE_SORT),
+                (f"{cls.collection_name}_aircraft_timeline", [("registration_key", 1), ("subject", 1)] + TIMELINE_SORT),
+                (f"{cls.collection_name}_aircraft_timeline", [("registration_key", 1), ("tach_time_confidence", 1), ("tach_time", 1)]),
+                (f"{cls.collection_name}_aircraft_timeline", [("registration_key", 1), ("hobbs_time_confidence", 1), ("hobbs_time", 1)]),
+                (f"{cls.collection_name}_aircraft_timeline", [("registration_key", 1), ("date", 1)]),
+                (f"{cls.collection_name}_aircraft_timeline", [("log_id", 1)]),
+                (f"{cls.collection_name}_aircraft_sources", [("registration_key", 1), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+            ]
+            for name, keys in aircraft_indexes:
+                field = ", ".join(key for key, _ in keys)
+                try:
+                    database[name].create_index(keys, background=True)
+                    print(f"✅ Index created on {name} {field}")
+                except Exception as e:
+                    print(f"⚠️ Warning: Failed to create index on {name} {field}: {e}")
+
+            # Invalidating a log's cached PDFs, and evicting the least recently used ones
+            pdf_cache_collection = database[f"{cls.collection_name}_pdf_cache"]
+            for keys in ([("log_ids", 1)], [("last_used", 1)]):
+                try:
+                    pdf_cache_collection.create_index(keys, background=True)
+                    print(f"✅ Index created on PDF cache {keys[0][0]}")
+                except Exception as e:
+                    print(f"⚠️ Warning: Failed to create PDF cache index on {keys[0][0]}: {e}")
+
+            # Full-text search falls back to an in-process index without a text index
+            cls.text_search_available = TEXT_INDEX_NAME in collection.index_information()
+            print(f"📝 Text search index available: {cls.text_search_available}")
+
             sync_client.close()
             print(f"✅ Index creation completed")
             
@@ -0,0 +1,134 @@
+"""
+Entity tags for conditional requests on maintenance logs.
+
+Every log document carries a `revision` counter that is incremented by each
+write, so a log's ETag is derived from its id and revision without hashing the
+body. Repointing a log at its archived image bumps a separate `image_revision`
+instead, which changes the ETag but not the revision an If-Match write expects. The log list uses a collection-wide revision kept in a small metadata
+collection, bumped by every insert, update and delete, plus a digest of the
+list's query so one filter's ETag never validates another's. Stored images are
+validated with their blob's ETag and modification time, and can be fetched in
+byte ranges.
+"""
+
+import hashlib
+import json
+import re
+from email.utils import parsedate_to_datetime
+
+from pymongo import ReturnDocument
+
+COLLECTION_REVISION_ID = "maintenance_logs"
+
+
+def log_etag(log_id, revision, image_revision=None):
+    """Strong ETag for one log document at a given revision and image revision"""
+    if not image_revision:
+        return f'"{log_id}-{revision or 0}"'
+    return f'"{log_id}-{revision or 0}.{image_revision}"'
+
+
+def collection_etag(revision, query=None):
+    """
+    Strong ETag for the log list at a given collection revision. `query` is
+    the list's normalized query (filters, paging); each one gets its own tag.
+    """
+    if not query:
+        return f'"logs-{revision or 0}"'
+    digest = hashlib.sha256(json.dumps(query, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f'"logs-{revision or 0}-{digest}"'
+
+
+def etag_matches(header_value, etag):
+    """Whether an If-None-Match / If-Match header value matches an ETag"""
+    if not header_value:
+        return False
+    candidates = [value.strip() for value in header_value.split(",")]
+    # Weak comparison for If-None-Match: a W/ prefix added by a proxy still matches
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def not_modified_since(header_value, last_modified):
+    """Whether an If-Modified-Since header covers a modification time (HTTP dates have whole seconds)"""
+    if not header_value or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_byte_range(header_value, size):
+    """
+    (start, end) half-open byte range requested by a Range header, or None to
+    send the whole body (no header, a malformed one, or several ranges).
+    Raises ValueError when the range lies entirely past the end (416).
+    """
+    if not header_value:
+        return None
+    match = _RANGE_PATTERN.match(header_value.strip().replace(" ", ""))
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    first, last = match.group(1), match.group(2)
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size
+    start = int(first)
+    end = int(last) + 1 if last else size
+    if last and end <= start:
+        return None
+    if start >= size:
+        raise ValueError("Range starts past the end")
+    return start, min(end, size)
+
+
+def revision_from_etag(header_value, log_id):
+    """
+    Revision a client expects from an If-Match header, or None when the header
+    doesn't name this log (a "*" or missing header imposes no revision). The
+    image revision is ignored: a tag from before the image was archived still
+    names the current content. Raises ValueError for an If-Match that can never match.
+    """
+    if not header_value or header_value.strip() == "*":
+        return None
+    prefix = f'"{log_id}-'
+    for value in header_value.split(","):
+        value = value.strip()
+        if value.startswith(prefix) and value.endswith('"'):
+            revision = value[len(prefix):-1].split(".", 1)[0]
+            if revision.isdigit():
+                return int(revision)
+    raise ValueError("If-Match does not match this log")
+
+
+def revision_filter(revision):
+    """Query condition on `revision` for an expected revision (documents from before revisions count as 0)"""
+    if revision == 0:
+        return {"$in": [0, None]}
+    return revision
+
+
+async def get_collection_revision(meta_collection):
+    """Current collection-wide revision of the log list"""
+    doc = await meta_collection.find_one({"_id": COLLECTION_REVISION_ID})
+    return doc.get("revision", 0) if doc else 0
+
+
+async def bump_collection_revision(meta_collection):
+    """Increment and return the collection-wide revision after a write"""
+    doc = await meta_collection.find_one_and_update(
+        {"_id": COLLECTION_REVISION_ID},
+        {"$inc": {"revision": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["revision"]
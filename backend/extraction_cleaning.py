@@ -0,0 +1,116 @@
+"""
+Cleaning of the structured data the AI extracts from a maintenance log image.
+
+The model answers with loosely typed JSON: "N/A" or "unknown" for missing
+text, part numbers as one string or a list, booleans as "yes"/"airworthy".
+`clean_extraction` turns one answer into `MaintenanceLogData` fields of the
+right types; the upload route then validates them once into the model.
+
+The per-field cleaners are picked once from the models' field types
+(`compile_cleaner`), not written out field by field, so a field added to
+`LogEntry` or `MaintenanceLogData` is cleaned without touching this module.
+`clean_extractions` cleans a batch of answers and validates them into models
+in a single call, e.g. when extractions are re-cleaned in a backfill.
+"""
+
+from functools import lru_cache
+from typing import List, Union, get_args, get_origin
+
+from pydantic import BaseModel, TypeAdapter
+
+from models import MaintenanceLogData
+
+# Text the model writes when a field is not on the page
+_MISSING_TEXT = frozenset(['unknown', 'n/a', 'none', ''])
+
+_LONGEST_MISSING_TEXT = max(len(text) for text in _MISSING_TEXT)
+
+_TRUE_TEXT = frozenset(['true', 'yes', 'airworthy', '1'])
+
+
+def clean_string(value):
+    """Stripped text, None for missing or placeholder text; other values as their string"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        # Only short text can be a placeholder; skip lowercasing the descriptions
+        if len(value) <= _LONGEST_MISSING_TEXT and value.lower() in _MISSING_TEXT:
+            return None
+        return value
+    return str(value)
+
+
+def clean_string_list(value):
+    """A list of stripped, non-empty strings from a list or a single string"""
+    if isinstance(value, str):
+        value = value.strip()
+        return [value] if value else []
+    if isinstance(value, list):
+        return [text for text in (str(item).strip() for item in value if item) if text]
+    return []
+
+
+def clean_boolean(value, default):
+    """A bool, a string meaning true, or else `default`"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.lower() in _TRUE_TEXT
+    return default
+
+
+def _without_optional(annotation):
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _field_cleaner(annotation, default):
+    annotation = _without_optional(annotation)
+    if annotation is str:
+        return clean_string
+    if annotation is bool:
+        return lambda value: clean_boolean(value, default)
+    if get_origin(annotation) is list:
+        item = get_args(annotation)[0]
+        if item is str:
+            return clean_string_list
+        if isinstance(item, type) and issubclass(item, BaseModel):
+            clean_item = compile_cleaner(item)
+            return lambda value: [clean_item(entry) for entry in value if isinstance(entry, dict)] if isinstance(value, list) else []
+    raise TypeError(f"No cleaner for fields of type {annotation!r}")
+
+
+@lru_cache(maxsize=None)
+def compile_cleaner(model):
+    """A function turning a raw dict into a dict valid for `model`, one cleaner per field"""
+    fields = tuple((name, _field_cleaner(field.annotation, field.default)) for name, field in model.model_fields.items())
+
+    def clean(data):
+        get = data.get
+        return {name: cleaner(get(name)) for name, cleaner in fields}
+
+    return clean
+
+
+def clean_extraction(data):
+    """
+    Clean one AI answer into `MaintenanceLogData` fields. An answer in the old
+    single-entry format (entry fields at the top level) becomes one log entry.
+    """
+    if isinstance(data.get('log_entries'), list):
+        return compile_cleaner(MaintenanceLogData)(data)
+    cleaned = compile_cleaner(MaintenanceLogData)({**data, 'log_entries': [data]})
+    cleaned['is_mult'] = False
+    return cleaned
+
+
+_log_data_list = TypeAdapter(List[MaintenanceLogData])
+
+
+def clean_extractions(extractions):
+    """`MaintenanceLogData` for many answers: each cleaned, then all validated in one call"""
+    return _log_data_list.validate_python([clean_extraction(data) for data in extractions])
@@ -0,0 +1,105 @@
+"""
+Parsing of the free-form tach/hobbs readings and dates found in log entries.
+
+Readings come from OCR and hand-written logbooks ("1,250.5 hrs", "01/15/24"),
+so every parser also reports how confidently the value was read.
+"""
+
+import re
+from datetime import datetime
+
+# Every number-like run in a tach/hobbs reading: "1,250.5 hrs" -> "1,250.5"
+_HOURS_PATTERN = re.compile(r'\.?\d[\d.,]*')
+
+# Readings in US notation: "1250.5", "1,250.5", ".5". Anything else ("1.250,5", "1,5") depends on the locale
+_US_NUMBER_PATTERN = re.compile(r'^(?:(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|\.\d+)$')
+
+# Dates written into a reading field ("01/15/24", "2024-01-15", "Jan 15") would otherwise read as hours
+_DATE_SHAPED_PATTERN = re.compile(
+    r'\d{1,4}[/-]\d{1,2}[/-]\d{1,4}|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s*\d',
+    re.IGNORECASE
+)
+
+_PLAIN_NUMBER_PATTERN = re.compile(r'^\d+(?:\.\d+)?$')
+
+# Purely numeric month/day dates, where the day could also be read as the month
+_NUMERIC_DATE_PATTERN = re.compile(r'^(\d{1,2})[/-](\d{1,2})[/-]\d{2,4}$')
+
+# How a typed shadow value was obtained from its text:
+#   exact     - the text was already a plain number / ISO date
+#   inferred  - one value extracted from text with units, separators or another date spelling
+#   ambiguous - a value was chosen, but the text allows another reading
+#   unparsed  - there is text, but no value could be read from it
+CONFIDENCE_EXACT = "exact"
+CONFIDENCE_INFERRED = "inferred"
+CONFIDENCE_AMBIGUOUS = "ambiguous"
+CONFIDENCE_UNPARSED = "unparsed"
+
+# Date spellings seen in logbooks, most common first
+_DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%m/%d/%Y",
+    "%m/%d/%y",
+    "%m-%d-%Y",
+    "%m-%d-%y",
+    "%Y/%m/%d",
+    "%b %d, %Y",
+    "%B %d, %Y",
+    "%d %b %Y",
+    "%d %B %Y",
+]
+
+
+def parse_hours_with_confidence(value):
+    """
+    (hours, confidence) for a tach or hobbs reading; (None, None) when there is
+    no text. Date-shaped and locale-ambiguous readings are left unparsed.
+    """
+    if value is None:
+        return None, None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value), CONFIDENCE_EXACT
+    text = str(value).strip()
+    if not text:
+        return None, None
+    if _PLAIN_NUMBER_PATTERN.match(text):
+        return float(text), CONFIDENCE_EXACT
+    if _DATE_SHAPED_PATTERN.search(text):
+        return None, CONFIDENCE_UNPARSED
+    numbers = [number.rstrip(".,") for number in _HOURS_PATTERN.findall(text)]
+    if not numbers or not all(_US_NUMBER_PATTERN.match(number) for number in numbers):
+        return None, CONFIDENCE_UNPARSED
+    hours = float(numbers[0].replace(",", ""))
+    return hours, CONFIDENCE_INFERRED if len(numbers) == 1 else CONFIDENCE_AMBIGUOUS
+
+
+def parse_hours(value):
+    """Tach or hobbs reading as a float ("1,250.5 hrs" -> 1250.5), or None when there is no number"""
+    return parse_hours_with_confidence(value)[0]
+
+
+def parse_entry_date_with_confidence(value):
+    """(datetime.date, confidence) for an entry date; (None, None) when there is no text"""
+    if not value:
+        return None, None
+    text = " ".join(str(value).split())
+    if not text:
+        return None, None
+    for date_format in _DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+        if date_format == "%Y-%m-%d":
+            return parsed, CONFIDENCE_EXACT
+        # Month-first is assumed; "03/04/24" could just as well be 3 April
+        numeric = _NUMERIC_DATE_PATTERN.match(text)
+        if numeric and numeric.group(1) != numeric.group(2) and int(numeric.group(2)) <= 12:
+            return parsed, CONFIDENCE_AMBIGUOUS
+        return parsed, CONFIDENCE_INFERRED
+    return None, CONFIDENCE_UNPARSED
+
+
+def parse_entry_date(value):
+    """Entry date as a datetime.date from the common logbook spellings, or None"""
+    return parse_entry_date_with_confidence(value)[0]
@@ -0,0 +1,232 @@
+"""
+Multi-log PDF report: an aircraft's (or the whole fleet's) maintenance history
+in one document with a table of contents.
+
+A report can span hundreds of logs, so nothing here holds them all at once:
+
+- `spool_logs` drains the MongoDB cursor batch by batch into a JSON-lines
+  spool file in a temporary directory.
+- `render_report` runs in the PDF worker pool. It reads the spool line by line
+  and hands ReportLab a story that builds each log's flowables only when the
+  layout reaches them, writing the PDF to a file in the same directory.
+- `stream_report` sends that file back in chunks and removes the directory.
+
+The table of contents comes first, before the page numbers are known. Each TOC
+row draws a named PDF form for its page number. The form is defined when the
+log's first page is laid out, so a single layout pass is enough.
+"""
+
+import asyncio
+import shutil
+import zlib
+from datetime import datetime
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFDictionary, PDFName, PDFStream
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Flowable, PageBreak, Paragraph, SimpleDocTemplate, Spacer
+
+from blob_storage import CHUNK_SIZE
+from pdf_render import NORMAL_STYLE, SECONDARY_COLOR, SECTION_STYLE, TITLE_STYLE, log_flowables, safe_str
+from serialization import dumps_line, loads
+
+REPORT_PROJECTION = {"structured_data": 1, "timestamp": 1}
+
+# Oldest first: a report reads as the aircraft's history
+REPORT_SORT = [("timestamp", 1), ("_id", 1)]
+
+REPORT_BATCH_SIZE = 200
+
+TOC_ROW_HEIGHT = 14
+TOC_FONT = "Helvetica"
+TOC_FONT_SIZE = 9
+
+LOG_TITLE_STYLE = ParagraphStyle(
+    'LogTitle',
+    parent=SECTION_STYLE,
+    fontSize=16,
+    spaceBefore=0,
+    spaceAfter=10
+)
+
+
+async def spool_logs(cursor, path):
+    """Write every log from `cursor` to `path` as one JSON line each; returns how many"""
+    count = 0
+    handle = await asyncio.to_thread(open, path, "wb")
+    try:
+        batch = []
+        async for doc in cursor:
+            batch.append(dumps_line({
+                "structured_data": doc.get("structured_data") or {},
+                "timestamp": doc.get("timestamp"),
+            }))
+            count += 1
+            if len(batch) >= REPORT_BATCH_SIZE:
+                await asyncio.to_thread(handle.write, b"".join(batch))
+                batch = []
+        if batch:
+            await asyncio.to_thread(handle.write, b"".join(batch))
+    finally:
+        await asyncio.to_thread(handle.close)
+    return count
+
+
+def _read_spool(path):
+    with open(path, "rb") as handle:
+        for line in handle:
+            yield loads(line)
+
+
+def log_title(index, log):
+    """One line naming a log: number, aircraft, upload date and entry count"""
+    structured_data = log.get("structured_data") or {}
+    uploaded = (log.get("timestamp") or "")[:10] or "unknown date"
+    entries = len(structured_data.get("log_entries") or [])
+    return (f"Log {index} · {safe_str(structured_data.get('aircraft_registration'), 'Unknown aircraft')}"
+            f" · {safe_str(structured_data.get('aircraft_make_model'), 'Unknown model')}"
+            f" · uploaded {uploaded} · {entries} {'entry' if entries == 1 else 'entries'}")
+
+
+def _page_form(index):
+    return f"toc_page_{index}"
+
+
+def _bookmark(index):
+    return f"log_{index}"
+
+
+class TocRow(Flowable):
+    """A table of contents line whose page number is a form defined later, when the log is laid out"""
+
+    def __init__(self, index, title):
+        super().__init__()
+        self.index = index
+        self.title = title
+
+    def wrap(self, available_width, available_height):
+        self.width = available_width
+        return available_width, TOC_ROW_HEIGHT
+
+    def draw(self):
+        canv = self.canv
+        title = self.title
+        room = self.width - 0.6 * inch
+        while title and stringWidth(title, TOC_FONT, TOC_FONT_SIZE) > room:
+            title = title[:-2] + "…"
+        canv.setFont(TOC_FONT, TOC_FONT_SIZE)
+        canv.drawString(0, 3, title)
+        canv.doForm(_page_form(self.index))
+        canv.linkRect("", _bookmark(self.index), (0, 0, self.width, TOC_ROW_HEIGHT), relative=1)
+
+
+class LogAnchor(Flowable):
+    """Zero-size marker at the start of a log: bookmark, outline entry and its TOC page number"""
+
+    def __init__(self, index, title, right_edge):
+        super().__init__()
+        self.index = index
+        self.title = title
+        self.right_edge = right_edge
+
+    def wrap(self, available_width, available_height):
+        return 0, 0
+
+    def draw(self):
+        canv = self.canv
+        canv.bookmarkPage(_bookmark(self.index))
+        canv.addOutlineEntry(self.title, _bookmark(self.index), level=0)
+        canv.beginForm(_page_form(self.index))
+        canv.setFont(TOC_FONT, TOC_FONT_SIZE)
+        canv.drawRightString(self.right_edge, 3, str(canv.getPageNumber()))
+        canv.endForm()
+
+
+class CompactingCanvas(Canvas):
+    """
+    A canvas that compresses each page's content stream as soon as the page is finished;
+    ReportLab otherwise keeps every page's drawing operators as text until the file is written
+    """
+
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if page.stream and not page.Contents:
+            # A stream whose dictionary already names its filter is written as is
+            page.Contents = PDFStream(
+                PDFDictionary({"Filter": PDFArray([PDFName("FlateDecode")])}),
+                zlib.compress(page.stream.encode("latin-1"))
+            )
+            page.stream = None
+
+
+class StreamingStory(list):
+    """
+    A story that refills from an iterator of flowable lists as the layout consumes it,
+    so only the flowables of the logs around the current page exist at any time
+    """
+
+    def __init__(self, parts, low_water=16):
+        super().__init__()
+        self._parts = iter(parts)
+        self._low_water = low_water
+
+    def __len__(self):
+        while self._parts is not None and list.__len__(self) < self._low_water:
+            part = next(self._parts, None)
+            if part is None:
+                self._parts = None
+            else:
+                self.extend(part)
+        return list.__len__(self)
+
+
+def _report_parts(spool_path, title, log_count, frame_width):
+    yield [
+        Paragraph(f"✈️ {title.upper()}", TITLE_STYLE),
+        Paragraph(f"Maintenance history · {log_count} {'log' if log_count == 1 else 'logs'}", NORMAL_STYLE),
+        Spacer(1, 15),
+        Paragraph("Contents", SECTION_STYLE),
+    ]
+    for index, log in enumerate(_read_spool(spool_path), 1):
+        yield [TocRow(index, log_title(index, log))]
+    for index, log in enumerate(_read_spool(spool_path), 1):
+        heading = log_title(index, log)
+        yield [PageBreak(), LogAnchor(index, heading, frame_width), Paragraph(heading, LOG_TITLE_STYLE)] + log_flowables(log)
+
+
+def render_report(spool_path, pdf_path, title, log_count):
+    """Lay out the spooled logs into `pdf_path`; returns the page count (runs in a worker process)"""
+    generated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    doc = SimpleDocTemplate(pdf_path, pagesize=A4, leftMargin=0.5*inch, rightMargin=0.5*inch, topMargin=0.5*inch,
+                            bottomMargin=0.6*inch, title=title, pageCompression=1)
+
+    def footer(canv, doc):
+        canv.saveState()
+        canv.setFont("Helvetica", 8)
+        canv.setFillColor(SECONDARY_COLOR)
+        canv.drawCentredString(A4[0] / 2, 0.35*inch, f"{title} · Page {doc.page} · Generated on {generated} | Aircraft Maintenance Log System")
+        canv.restoreState()
+
+    doc.build(StreamingStory(_report_parts(spool_path, title, log_count, doc.width)), onFirstPage=footer, onLaterPages=footer,
+              canvasmaker=CompactingCanvas)
+    return doc.page
+
+
+async def stream_report(directory, path):
+    """Chunks of the rendered report; the temporary directory is removed afterwards"""
+    try:
+        handle = await asyncio.to_thread(open, path, "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(handle.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await asyncio.to_thread(handle.close)
+    finally:
+        await asyncio.to_thread(shutil.rmtree, directory, True)
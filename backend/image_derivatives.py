@@ -0,0 +1,101 @@
+"""
+Resized derivatives of uploaded maintenance log images for the viewer.
+
+Originals are often 12-megapixel phone photos while the viewer shows them in
+a small panel, so `GET /images/{filename}?size=...` serves a re-encoded JPEG
+bounded to the size's long edge instead. A derivative is generated the first
+time it is requested, in a process pool (decoding and resampling are CPU
+bound), and cached in the blob store next to the original under a derived
+name, so every later request on any node is a plain blob read.
+"""
+
+import asyncio
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from blob_storage import BlobNotFound, iter_bytes
+from worker_pools import BoundedProcessPool
+
+# size name -> (longest edge in pixels, JPEG quality)
+DERIVATIVE_SIZES = {
+    "thumbnail": (320, 75),
+    "medium": (1280, 80),
+    "full": (2560, 85),
+}
+
+DERIVATIVE_CONTENT_TYPE = "image/jpeg"
+
+image_pool = BoundedProcessPool("image", "IMAGE_WORKERS", min(4, os.cpu_count() or 1))
+# Derivatives being generated by this process, so concurrent first requests share the work
+_in_flight = {}
+
+
+def derivative_name(image_filename, size):
+    """Blob name of one derivative of an original image"""
+    return f"{image_filename}.{size}.jpg"
+
+
+def derivative_names(image_filename):
+    return [derivative_name(image_filename, size) for size in DERIVATIVE_SIZES]
+
+
+def render_derivative(data, size):
+    """JPEG bytes of an image bounded to a derivative size (runs in a worker process)"""
+    max_edge, quality = DERIVATIVE_SIZES[size]
+    with Image.open(BytesIO(data)) as image:
+        # JPEG decoding at a reduced scale is much cheaper than decoding and then shrinking
+        image.draft("RGB", (max_edge, max_edge))
+        # Phone photos are stored sideways with an EXIF orientation tag
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        output = BytesIO()
+        image.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+async def _read_blob(blob):
+    return b"".join([chunk async for chunk in blob.iter_chunks()])
+
+
+async def _generate(store, image_filename, size):
+    original = await store.open(image_filename)
+    data = await _read_blob(original)
+    rendered = await image_pool.run(render_derivative, data, size)
+    name = derivative_name(image_filename, size)
+    await store.save(name, iter_bytes(rendered), content_type=DERIVATIVE_CONTENT_TYPE)
+    print(f"✅ Generated {size} derivative of {image_filename}: {len(data)} -> {len(rendered)} bytes")
+    return await store.open(name)
+
+
+async def open_derivative(store, image_filename, size):
+    """
+    The cached derivative blob of an image, generated on first request.
+    Raises BlobNotFound when the original does not exist.
+    """
+    name = derivative_name(image_filename, size)
+    try:
+        return await store.open(name)
+    except BlobNotFound:
+        pass
+
+    task = _in_flight.get(name)
+    if task is None:
+        task = asyncio.ensure_future(_generate(store, image_filename, size))
+        _in_flight[name] = task
+        task.add_done_callback(lambda _: _in_flight.pop(name, None))
+    return await asyncio.shield(task)
+
+
+async def delete_derivatives(store, image_filename):
+    """Remove every cached derivative of an image"""
+    for name in derivative_names(image_filename):
+        await store.delete(name)
@@ -0,0 +1,162 @@
+"""
+Derived, query-friendly fields stored alongside each maintenance log document.
+
+`structured_data` keeps exactly what the AI extracted (or what the user edited),
+as free-form strings. Everything the database needs to index or range-query is
+computed here from that data and written as top-level fields of the same
+document, so it is recomputed whenever `structured_data` changes.
+"""
+
+import re
+
+from field_parsing import CONFIDENCE_EXACT, parse_entry_date_with_confidence, parse_hours_with_confidence
+from keyword_scoring import build_entry_scores
+from next_due import parse_next_due
+from references import build_references
+from registration import registration_country, registration_key
+
+# Bump whenever a derived field is added or its computation changes, so
+# `python manage.py reindex` knows which stored documents are stale
+DERIVED_FIELDS_VERSION = 11
+
+# "P/N 12345-6", "PN: 12345-6", "Part No. 12345-6" -> "12345-6"
+_PART_LABEL_PATTERN = re.compile(r'^\s*(?:P/N|PN|PART\s*(?:NO\.?|NUMBER|#))[\s.:#-]+', re.IGNORECASE)
+
+_PART_SEPARATOR_PATTERN = re.compile(r'[^A-Z0-9]+')
+
+
+def part_number_key(part_number):
+    """
+    Canonical lookup key for a part number: label stripped, uppercased and
+    with spaces, dashes, dots and slashes removed, so "12345-6", "12345 6"
+    and "p/n 123456" all share the key "123456". Returns None when empty.
+    """
+    if not part_number:
+        return None
+    text = _PART_LABEL_PATTERN.sub('', str(part_number))
+    key = _PART_SEPARATOR_PATTERN.sub('', text.upper())
+    return key or None
+
+
+def build_entry_values(structured_data):
+    """
+    Typed shadow values for every log entry: tach/hobbs hours as floats and the
+    date as an ISO "YYYY-MM-DD" string (which sorts and range-compares as a date),
+    each with the confidence of its parse. The original text stays in `structured_data`.
+    """
+    values = []
+    for entry_index, entry in enumerate(structured_data.get("log_entries") or []):
+        tach_time, tach_confidence = parse_hours_with_confidence(entry.get("tach_time"))
+        hobbs_time, hobbs_confidence = parse_hours_with_confidence(entry.get("hobbs_time"))
+        entry_date, date_confidence = parse_entry_date_with_confidence(entry.get("date"))
+        values.append({
+            "entry_index": entry_index,
+            "tach_time": tach_time,
+            "tach_time_confidence": tach_confidence,
+            "hobbs_time": hobbs_time,
+            "hobbs_time_confidence": hobbs_confidence,
+            "date": entry_date.isoformat() if entry_date else None,
+            "date_confidence": date_confidence,
+        })
+    return values
+
+
+def build_due_items(structured_data, entry_values):
+    """
+    Structured due point of every entry whose next-due statement names a tach
+    time or a date; relative limits are anchored at that entry's own tach/date
+    """
+    due_items = []
+    for entry_index, entry in enumerate(structured_data.get("log_entries") or []):
+        values = entry_values[entry_index]
+        due = parse_next_due(entry.get("next_due_compliance"), values["tach_time"], values["date"],
+                             entry.get("description_of_work_performed"))
+        if due:
+            due_items.append({"entry_index": entry_index, **due})
+    return due_items
+
+
+def entry_range_conditions(tach_min=None, tach_max=None, hobbs_min=None, hobbs_max=None, date_from=None, date_to=None,
+                           include_uncertain=False):
+    """
+    Conditions on one `entry_values` item for inclusive tach/hobbs/date ranges,
+    e.g. {"tach_time": {"$gte": 1200.0, "$lte": 1300.0}, "tach_time_confidence": "exact"}.
+    Only exactly parsed values match unless `include_uncertain`. Empty when no bound is given.
+    """
+    conditions = {}
+    for field, low, high in [
+        ("tach_time", tach_min, tach_max),
+        ("hobbs_time", hobbs_min, hobbs_max),
+        ("date", date_from.isoformat() if date_from else None, date_to.isoformat() if date_to else None),
+    ]:
+        bounds = {}
+        if low is not None:
+            bounds["$gte"] = low
+        if high is not None:
+            bounds["$lte"] = high
+        if bounds:
+            conditions[field] = bounds
+            if not include_uncertain:
+                conditions[f"{field}_confidence"] = CONFIDENCE_EXACT
+    return conditions
+
+
+def entry_range_query(conditions):
+    """Document query matching logs with at least one entry inside every range"""
+    return {"entry_values": {"$elemMatch": conditions}} if conditions else {}
+
+
+def entry_in_range(values, conditions):
+    """Whether one `entry_values` item satisfies range conditions (the $elemMatch, in Python)"""
+    for field, bounds in conditions.items():
+        value = values.get(field)
+        if value is None:
+            return False
+        if not isinstance(bounds, dict):
+            if value != bounds:
+                return False
+            continue
+        if "$gte" in bounds and value < bounds["$gte"]:
+            return False
+        if "$lte" in bounds and value > bounds["$lte"]:
+            return False
+    return True
+
+
+def build_part_index(structured_data):
+    """
+    One item per replaced part, carrying enough of its entry to answer
+    "which aircraft got this part and when" from the multikey index alone
+    """
+    parts = []
+    for entry_index, entry in enumerate(structured_data.get("log_entries") or []):
+        seen = set()
+        for part_number in entry.get("part_number_replaced") or []:
+            key = part_number_key(part_number)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            parts.append({
+                "key": key,
+                "part_number": str(part_number).strip(),
+                "entry_index": entry_index,
+                "date": entry.get("date"),
+                "tach_time": entry.get("tach_time"),
+            })
+    return parts
+
+
+def build_derived_fields(structured_data):
+    """Compute the derived top-level fields for a log document's structured data"""
+    structured_data = structured_data or {}
+    entry_values = build_entry_values(structured_data)
+    return {
+        "derived_version": DERIVED_FIELDS_VERSION,
+        "registration_key": registration_key(structured_data.get("aircraft_registration")),
+        "registration_country": registration_country(structured_data.get("aircraft_registration")),
+        "parts": build_part_index(structured_data),
+        "entry_values": entry_values,
+        "due_items": build_due_items(structured_data, entry_values),
+        "references": build_references(structured_data, entry_values),
+        "entry_scores": build_entry_scores(structured_data),
+    }
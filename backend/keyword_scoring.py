@@ -0,0 +1,171 @@
+"""
+Local risk and urgency scoring of log entries from aviation keywords.
+
+The AI assigns every entry a `risk_level` and an `urgency`. Each entry is also
+scored here from keywords in its own text, and the two are compared, so an
+entry whose model rating disagrees with its wording can be found without
+another model call.
+
+Keywords come in groups (critical systems, AD compliance problems,
+time-sensitive and safety wording). Each group names the score it feeds and
+the entry fields it reads. All keywords of all groups are compiled into one
+pattern, factored by their common prefixes like a trie, so each field is
+scanned once, in C, however many keywords there are. Keywords match whole
+words only, and where keywords overlap the longest one wins.
+
+The groups can be replaced with a JSON file of the same shape as
+`DEFAULT_KEYWORD_GROUPS`, named by `SCORING_KEYWORDS_FILE`.
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+
+SCORE_RISK = "risk_level"
+SCORE_URGENCY = "urgency"
+
+# Levels by number of distinct keywords found: none, one, two or more
+SCORE_LEVELS = {
+    SCORE_RISK: ("Low", "Medium", "High"),
+    SCORE_URGENCY: ("Normal", "Medium", "High"),
+}
+
+# How the model's free-text ratings compare with the local levels
+_LEVEL_RANKS = {
+    "low": 0, "normal": 0, "routine": 0, "none": 0,
+    "medium": 1, "moderate": 1, "elevated": 1, "urgent": 1,
+    "high": 2, "critical": 2, "immediate": 2, "severe": 2, "aog": 2,
+}
+
+DEFAULT_KEYWORD_GROUPS = {
+    "critical_system": {
+        "score": SCORE_RISK,
+        "fields": ["description_of_work_performed"],
+        "keywords": [
+            "engine", "propeller", "landing gear", "flight control", "flight controls", "fuel system",
+            "crankshaft", "camshaft", "cylinder", "magneto", "carburetor", "turbocharger",
+            "aileron", "elevator", "rudder", "trim tab", "control cable", "wing spar", "spar",
+            "firewall", "engine mount", "nose gear", "brake", "brakes",
+        ],
+    },
+    "ad_issue": {
+        "score": SCORE_RISK,
+        "fields": ["ad_compliance"],
+        "keywords": ["non-compliant", "noncompliant", "not complied", "overdue", "deferred"],
+    },
+    "time_sensitive": {
+        "score": SCORE_URGENCY,
+        "fields": ["description_of_work_performed"],
+        "keywords": ["overdue", "expired", "due", "required"],
+    },
+    "safety": {
+        "score": SCORE_URGENCY,
+        "fields": ["description_of_work_performed"],
+        "keywords": ["safety", "critical", "emergency", "grounded", "unairworthy", "not airworthy"],
+    },
+}
+
+
+def _trie_pattern(keywords):
+    """
+    Regex alternation of `keywords` factored by common prefixes, longest match first;
+    the spaces of multi-word keywords match any run of whitespace
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def alternation(node):
+        branches = [(r"\s+" if char == " " else re.escape(char)) + alternation(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        ends_here = "" in node
+        body = branches[0] if len(branches) == 1 and not ends_here else f"(?:{'|'.join(branches)})"
+        return f"{body}?" if ends_here else body
+
+    return alternation(trie)
+
+
+class KeywordScorer:
+    """Scores log entries against keyword groups with one compiled pattern"""
+
+    def __init__(self, groups):
+        # field -> keyword -> scores it feeds
+        self._groups_by_field = {}
+        keywords = set()
+        for name, group in groups.items():
+            if group["score"] not in SCORE_LEVELS:
+                raise ValueError(f"Keyword group {name} feeds unknown score {group['score']!r}")
+            for keyword in group["keywords"]:
+                keyword = " ".join(keyword.lower().split())
+                if not re.fullmatch(r"\w(?:.*\w)?", keyword):
+                    raise ValueError(f"Keyword {keyword!r} of group {name} must start and end with a letter or digit")
+                keywords.add(keyword)
+                for field in group["fields"]:
+                    self._groups_by_field.setdefault(field, {}).setdefault(keyword, []).append(group["score"])
+        self.keywords = frozenset(keywords)
+        self._pattern = re.compile(rf"\b{_trie_pattern(keywords)}\b")
+        self._fields = tuple(self._groups_by_field.items())
+        # score, its levels, the highest rank and the keys it is reported under
+        self._scores = tuple((score, levels, len(levels) - 1, f"{score}_factors", f"{score}_agrees")
+                             for score, levels in SCORE_LEVELS.items())
+
+    def entry_factors(self, entry):
+        """Distinct keywords found in the entry, per score"""
+        factors = {score: [] for score in SCORE_LEVELS}
+        findall = self._pattern.findall
+        for field, keyword_scores in self._fields:
+            text = entry.get(field)
+            if not text or not isinstance(text, str):
+                continue
+            for match in findall(text.lower()):
+                scores = keyword_scores.get(match)
+                if scores is None:
+                    # "landing  gear" across a line break is the keyword "landing gear"
+                    match = " ".join(match.split())
+                    scores = keyword_scores.get(match, ())
+                for score in scores:
+                    if match not in factors[score]:
+                        factors[score].append(match)
+        return factors
+
+    def score_entry(self, entry):
+        """Local levels, the keywords behind them and whether the model's ratings agree"""
+        factors = self.entry_factors(entry)
+        scored = {}
+        for score, levels, top_rank, factors_key, agrees_key in self._scores:
+            rank = min(len(factors[score]), top_rank)
+            rating = entry.get(score)
+            model_rank = _LEVEL_RANKS.get(rating.strip().lower()) if isinstance(rating, str) else None
+            scored[score] = levels[rank]
+            scored[factors_key] = factors[score]
+            # None when the model gave no rating this scale understands
+            scored[agrees_key] = None if model_rank is None else model_rank == rank
+        return scored
+
+
+def _load_keyword_groups():
+    path = os.getenv("SCORING_KEYWORDS_FILE")
+    if not path:
+        return DEFAULT_KEYWORD_GROUPS
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+@lru_cache(maxsize=1)
+def get_keyword_scorer():
+    """The scorer for the configured keyword groups, compiled on first use"""
+    return KeywordScorer(_load_keyword_groups())
+
+
+def build_entry_scores(structured_data):
+    """Local risk/urgency score of every log entry, compared with the model's ratings"""
+    scorer = get_keyword_scorer()
+    return [
+        {"entry_index": entry_index, **scorer.score_entry(entry)}
+        for entry_index, entry in enumerate(structured_data.get("log_entries") or [])
+    ]
@@ -9,7 +9,9 @@ import logging
 
 # Import our modules
 from routes import router
-from database import connect_to_mongo, close_mongo_connection
+from database import Database, connect_to_mongo, close_mongo_connection
+from text_search import local_index
+from worker_pools import shutdown_pools
 
 # Load environment variables
 load_dotenv()
@@ -45,11 +47,17 @@ async def lifespan(app: FastAPI):
     print(f"🔄 Connecting to MongoDB...")
     await connect_to_mongo()
     print(f"✅ MongoDB connected successfully")
+    if not Database.text_search_available:
+        print(f"🔄 Building in-process search index (no text index)...")
+        await local_index.build(Database.get_collection(), Database.get_meta_collection())
+        print(f"✅ In-process search index built: {len(local_index)} documents")
     yield
     print(f"=== FASTAPI SHUTDOWN ===")
     print(f"🔄 Closing MongoDB connection...")
     await close_mongo_connection()
     print(f"✅ MongoDB connection closed")
+    shutdown_pools()
+    print(f"✅ Worker pools stopped")
 
 # Create FastAPI app
 app = FastAPI(
@@ -66,6 +74,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the frontend read log ETags to send them back in If-Match
+    expose_headers=["ETag"],
 )
 
 # Include routes
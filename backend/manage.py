@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the maintenance log database.
+
+    python manage.py reindex      Recompute derived index fields on every log document
+    python manage.py export       Dump log entries to a Parquet or Arrow file for analytics
+    python manage.py rebuild-aircraft
+                                  Recompute every materialized aircraft state document from the logs
+    python manage.py archive-images
+                                  Transcode stored images to the archival format and report bytes saved
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteMany, MongoClient, ReplaceOne, UpdateOne
+
+from aircraft_state import build_aircraft_state, log_source, timeline_items
+from archival import archive_pending, archive_report, purge_expired_originals
+from blob_storage import get_blob_store
+from bulk_export import EXPORT_SORT
+from columnar_export import COLUMNAR_PROJECTION, write_columnar
+from database import Database
+from indexing import build_derived_fields, DERIVED_FIELDS_VERSION
+from registration import registration_key
+from worker_pools import shutdown_pools
+
+BATCH_SIZE = 500
+
+
+def get_sync_collection():
+    """Open the maintenance log collection with a synchronous client"""
+    mongodb_url = os.getenv("MONGODB_URL")
+    database_name = os.getenv("MONGODB_DATABASE_NAME")
+    collection_name = os.getenv("MONGODB_COLLECTION_NAME")
+    if not mongodb_url or not database_name or not collection_name:
+        raise ValueError("Missing required environment variables: MONGODB_URL, MONGODB_DATABASE_NAME, MONGODB_COLLECTION_NAME")
+
+    client = MongoClient(mongodb_url)
+    return client, client[database_name][collection_name]
+
+
+def get_sync_aircraft_collection(collection, suffix=""):
+    """Materialized aircraft state collection (or its `_timeline` / `_sources` collection) next to the log collection"""
+    return collection.database[f"{collection.name}_aircraft{suffix}"]
+
+
+def reindex(args):
+    """Recompute derived fields for documents indexed by an older version (or all with --all)"""
+    client, collection = get_sync_collection()
+    try:
+        query = {} if args.all else {"derived_version": {"$ne": DERIVED_FIELDS_VERSION}}
+        cursor = collection.find(query, {"structured_data": 1}, batch_size=BATCH_SIZE)
+
+        operations = []
+        updated = 0
+        for doc in cursor:
+            derived = build_derived_fields(doc.get("structured_data"))
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": derived}))
+            if len(operations) >= BATCH_SIZE:
+                updated += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+
+        print(f"✅ Reindexed {updated} maintenance log documents")
+    finally:
+        client.close()
+
+
+def export(args):
+    """Write every log entry (optionally for one aircraft or upload window) to a columnar file"""
+    client, collection = get_sync_collection()
+    try:
+        query = {}
+        if args.registration:
+            key = registration_key(args.registration)
+            if not key:
+                raise ValueError(f"Invalid aircraft registration: {args.registration}")
+            query["registration_key"] = key
+        if args.since or args.until:
+            query["timestamp"] = {}
+            if args.since:
+                query["timestamp"]["$gte"] = args.since
+            if args.until:
+                query["timestamp"]["$lt"] = args.until
+
+        cursor = collection.find(query, COLUMNAR_PROJECTION, batch_size=BATCH_SIZE).sort(EXPORT_SORT)
+
+        # Write next to the target and rename, so a nightly job never leaves a half-written dump behind
+        partial_path = f"{args.output}.partial"
+        with open(partial_path, "wb") as sink:
+            rows = write_columnar(cursor, sink, args.format)
+        os.replace(partial_path, args.output)
+
+        print(f"✅ Exported {rows} log entries to {args.output}")
+    finally:
+        client.close()
+
+
+def rebuild_aircraft(args):
+    """
+    Recompute every aircraft state document with its timeline and source
+    documents, holding one aircraft's logs in memory at a time; writes go out
+    in batches of BATCH_SIZE operations
+    """
+    client, collection = get_sync_collection()
+    try:
+        state_collection = get_sync_aircraft_collection(collection)
+        timeline_collection = get_sync_aircraft_collection(collection, "_timeline")
+        source_collection = get_sync_aircraft_collection(collection, "_sources")
+        # Logs arrive grouped by aircraft through the registration_key index
+        cursor = collection.find(
+            {"registration_key": {"$type": "string"}},
+            {"timestamp": 1, "registration_key": 1, "structured_data": 1},
+            batch_size=BATCH_SIZE
+        ).sort([("registration_key", 1), ("timestamp", 1)])
+
+        writes = {state_collection: [], timeline_collection: [], source_collection: []}
+        rebuilt = set()
+        current_key, sources, timeline = None, [], []
+
+        def write(target, operation):
+            writes[target].append(operation)
+            if len(writes[target]) >= BATCH_SIZE:
+                target.bulk_write(writes[target], ordered=True)
+                writes[target] = []
+
+        def flush():
+            # The aircraft's old timeline and sources go first, so deleted logs drop out;
+            # a log moved from another aircraft is replaced by _id
+            for target, documents in ((timeline_collection, timeline), (source_collection, sources)):
+                write(target, DeleteMany({"registration_key": current_key}))
+                for document in documents:
+                    write(target, ReplaceOne({"_id": document["_id"]}, document, upsert=True))
+            state = build_aircraft_state(current_key, sources, timeline)
+            state["revision"] = 1
+            write(state_collection, ReplaceOne({"_id": current_key}, state, upsert=True))
+            rebuilt.add(current_key)
+
+        for doc in cursor:
+            if doc["registration_key"] != current_key:
+                if current_key is not None:
+                    flush()
+                current_key, sources, timeline = doc["registration_key"], [], []
+            sources.append(log_source(doc))
+            timeline.extend(timeline_items(doc))
+        if current_key is not None:
+            flush()
+        for target, operations in writes.items():
+            if operations:
+                target.bulk_write(operations, ordered=True)
+
+        # Aircraft whose logs are all gone (or re-registered) no longer have a state
+        removed = state_collection.delete_many({"_id": {"$nin": list(rebuilt)}}).deleted_count
+        for target in (timeline_collection, source_collection):
+            target.delete_many({"registration_key": {"$nin": list(rebuilt)}})
+
+        print(f"✅ Rebuilt state for {len(rebuilt)} aircraft, removed {removed} stale aircraft documents")
+    finally:
+        client.close()
+
+
+def _format_bytes(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(count) < 1024 or unit == "GB":
+            return f"{count:.1f} {unit}" if unit != "B" else f"{count} B"
+        count /= 1024
+
+
+async def _archive_images(args):
+    # The archival pipeline and blob store are async, so this command uses the API's async client
+    mongodb_url = os.getenv("MONGODB_URL")
+    Database.database_name = os.getenv("MONGODB_DATABASE_NAME")
+    Database.collection_name = os.getenv("MONGODB_COLLECTION_NAME")
+    if not mongodb_url or not Database.database_name or not Database.collection_name:
+        raise ValueError("Missing required environment variables: MONGODB_URL, MONGODB_DATABASE_NAME, MONGODB_COLLECTION_NAME")
+    Database.client = AsyncIOMotorClient(mongodb_url)
+    try:
+        store = get_blob_store()
+        collection = Database.get_collection()
+        if not args.purge_only:
+            results = await archive_pending(store, collection, Database.get_meta_collection(), limit=args.limit, grace=args.grace_days)
+            for status in ("archived", "skipped", "missing"):
+                print(f"📝 {status}: {sum(1 for result in results if result['status'] == status)}")
+        purged = await purge_expired_originals(store, collection)
+        print(f"📝 Originals past their grace period deleted: {purged}")
+
+        report = await archive_report(collection)
+        print(f"✅ Archived {report['archived_images']} of {report['images']} images "
+              f"({report['skipped_images']} kept as uploaded, {report['pending_images']} pending)")
+        print(f"✅ {_format_bytes(report['original_bytes'])} -> {_format_bytes(report['archived_bytes'])}, "
+              f"saved {_format_bytes(report['bytes_saved'])}; "
+              f"{report['retained_originals']} originals ({_format_bytes(report['retained_original_bytes'])}) still in their grace period")
+    finally:
+        shutdown_pools()
+        Database.client.close()
+
+
+def archive_images(args):
+    """Transcode unarchived images, purge originals past their grace period and report bytes saved"""
+    asyncio.run(_archive_images(args))
+
+
+def main(argv=None):
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Maintenance log database commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reindex_parser = subparsers.add_parser("reindex", help="Recompute derived index fields")
+    reindex_parser.add_argument("--all", action="store_true", help="Recompute every document, not only stale ones")
+    reindex_parser.set_defaults(func=reindex)
+
+    export_parser = subparsers.add_parser("export", help="Dump log entries to a columnar file")
+    export_parser.add_argument("output", help="File to write, e.g. maintenance_log_entries.parquet")
+    export_parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    export_parser.add_argument("--registration", help="Only logs for this aircraft registration")
+    export_parser.add_argument("--since", type=datetime.fromisoformat, help="Only logs uploaded at or after this ISO time")
+    export_parser.add_argument("--until", type=datetime.fromisoformat, help="Only logs uploaded before this ISO time")
+    export_parser.set_defaults(func=export)
+
+    rebuild_parser = subparsers.add_parser("rebuild-aircraft", help="Recompute materialized aircraft state documents")
+    rebuild_parser.set_defaults(func=rebuild_aircraft)
+
+    archive_parser = subparsers.add_parser("archive-images", help="Transcode stored images to the archival format")
+    archive_parser.add_argument("--limit", type=int, help="Archive at most this many images")
+    archive_parser.add_argument("--grace-days", type=int, help="Keep originals this many days (default: ARCHIVE_GRACE_DAYS)")
+    archive_parser.add_argument("--purge-only", action="store_true", help="Only delete originals past their grace period and report")
+    archive_parser.set_defaults(func=archive_images)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
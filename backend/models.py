@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Any
+from typing import Dict, List, Optional, Any
 from datetime import datetime
 from bson import ObjectId
 
@@ -46,6 +46,51 @@ class LogEntry(BaseModel):
         }
     )
 
+class LogEntryUpdate(BaseModel):
+    """Partial update of a single log entry; only the fields sent are written"""
+    description_of_work_performed: Optional[str] = None
+    tach_time: Optional[str] = None
+    hobbs_time: Optional[str] = None
+    part_number_replaced: Optional[List[str]] = None
+    manual_reference: Optional[str] = None
+    reason_for_maintenance: Optional[str] = None
+    ad_compliance: Optional[str] = None
+    next_due_compliance: Optional[str] = None
+    service_bulletin_reference: Optional[str] = None
+    certification_statement: Optional[str] = None
+    performed_by: Optional[str] = None
+    license_number: Optional[str] = None
+    date: Optional[str] = None
+    risk_level: Optional[str] = None
+    urgency: Optional[str] = None
+    is_airworthy: Optional[bool] = None
+
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={
+            "example": {
+                "tach_time": "1251.0",
+                "is_airworthy": True
+            }
+        }
+    )
+
+class LogEntriesUpdate(BaseModel):
+    """Partial update of several log entries at once, keyed by entry index"""
+    entries: Dict[int, LogEntryUpdate]
+
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={
+            "example": {
+                "entries": {
+                    "0": {"tach_time": "1251.0"},
+                    "2": {"is_airworthy": True}
+                }
+            }
+        }
+    )
+
 class MaintenanceLogData(BaseModel):
     """Structured data extracted from maintenance log image with multiple entries"""
     aircraft_registration: Optional[str] = None
@@ -146,6 +191,171 @@ class LogSummary(BaseModel):
         json_encoders={ObjectId: str}
     )
 
+class SearchHit(BaseModel):
+    """One matching log entry in a full-text search"""
+    log_id: str
+    entry_index: int
+    aircraft_registration: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    date: Optional[str] = None
+    score: float
+    highlights: Dict[str, str] = {}
+
+class SearchResponse(BaseModel):
+    """Response model for full-text search, paginated by log document"""
+    query: str
+    backend: str
+    skip: int
+    limit: int
+    hits: List[SearchHit] = []
+
+class PartInstallation(BaseModel):
+    """One log entry in which a part number was replaced or installed"""
+    log_id: str
+    entry_index: int
+    aircraft_registration: Optional[str] = None
+    aircraft_make_model: Optional[str] = None
+    part_number: str
+    date: Optional[str] = None
+    tach_time: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+class AnalyticsBucket(BaseModel):
+    """Number of log entries sharing one value of a field"""
+    key: Any = None
+    count: int
+
+class AircraftAnalytics(BaseModel):
+    """Log entry counts for one aircraft, broken down by risk level"""
+    registration_key: Optional[str] = None
+    aircraft_registration: Optional[str] = None
+    aircraft_make_model: Optional[str] = None
+    count: int
+    by_risk_level: List[AnalyticsBucket] = []
+
+class AnalyticsResponse(BaseModel):
+    """Fleet-wide log entry counts, computed in one aggregation"""
+    total_entries: int = 0
+    total_aircraft: int = 0
+    by_risk_level: List[AnalyticsBucket] = []
+    by_urgency: List[AnalyticsBucket] = []
+    by_airworthy: List[AnalyticsBucket] = []
+    by_make_model: List[AnalyticsBucket] = []
+    by_country: List[AnalyticsBucket] = []
+    by_month: List[AnalyticsBucket] = []
+    by_aircraft: List[AircraftAnalytics] = []
+
+class AircraftEntryRef(BaseModel):
+    """Pointer to one log entry in an aircraft's timeline"""
+    log_id: str
+    entry_index: int
+    date: Optional[str] = None
+    tach_time: Optional[float] = None
+
+class OutstandingItem(AircraftEntryRef):
+    """A next-due statement not superseded by a later one about the same subject"""
+    next_due_compliance: str
+    subject: Optional[str] = None
+    due_tach: Optional[float] = None
+    due_date: Optional[str] = None
+    hours_remaining: Optional[float] = None
+
+class DueItem(BaseModel):
+    """One outstanding item coming due (or overdue) somewhere in the fleet"""
+    registration_key: str
+    aircraft_registration: Optional[str] = None
+    aircraft_make_model: Optional[str] = None
+    log_id: str
+    entry_index: int
+    next_due_compliance: str
+    subject: Optional[str] = None
+    due_tach: Optional[float] = None
+    due_date: Optional[str] = None
+    current_tach_time: Optional[float] = None
+    hours_remaining: Optional[float] = None
+    days_remaining: Optional[int] = None
+    overdue: bool = False
+    urgency: float
+
+class AircraftTimelineEntry(BaseModel):
+    """One log entry with its date and tach/hobbs readings parsed"""
+    log_id: str
+    entry_index: int
+    log_timestamp: Optional[datetime] = None
+    date: Optional[str] = None
+    date_text: Optional[str] = None
+    tach_time: Optional[float] = None
+    tach_time_confidence: Optional[str] = None
+    hobbs_time: Optional[float] = None
+    hobbs_time_confidence: Optional[str] = None
+    description: Optional[str] = None
+    next_due_compliance: Optional[str] = None
+    risk_level: Optional[str] = None
+    urgency: Optional[str] = None
+    is_airworthy: Optional[bool] = None
+
+class AirworthinessRollup(BaseModel):
+    """Airworthiness as of the latest entry, plus how many entries were not airworthy"""
+    is_airworthy: Optional[bool] = None
+    as_of: Optional[AircraftEntryRef] = None
+    non_airworthy_entries: int = 0
+
+class AircraftState(BaseModel):
+    """Materialized current state of one aircraft, maintained on every log write"""
+    registration_key: str = Field(alias="_id")
+    aircraft_registration: Optional[str] = None
+    registration: Optional[str] = None
+    registration_country: Optional[str] = None
+    aircraft_make_model: Optional[str] = None
+    log_count: int = 0
+    entry_count: int = 0
+    current_tach_time: Optional[float] = None
+    current_hobbs_time: Optional[float] = None
+    last_entry_date: Optional[str] = None
+    last_annual: Optional[AircraftEntryRef] = None
+    outstanding_items: List[OutstandingItem] = []
+    airworthiness: AirworthinessRollup = AirworthinessRollup()
+    timeline: List[AircraftTimelineEntry] = []
+
+    model_config = ConfigDict(populate_by_name=True)
+
+class AircraftCompliance(BaseModel):
+    """An aircraft with log entries recording compliance with an AD or SB"""
+    registration_key: str
+    aircraft_registration: Optional[str] = None
+    aircraft_make_model: Optional[str] = None
+    latest_compliance_date: Optional[str] = None
+    log_id: str
+    entry_index: int
+    entries: int
+
+class ComplianceGap(BaseModel):
+    """An aircraft with no log entry recording compliance with an AD or SB"""
+    registration_key: str
+    aircraft_registration: Optional[str] = None
+    aircraft_make_model: Optional[str] = None
+    reason: str
+
+class ComplianceResponse(BaseModel):
+    """Fleet cross-reference for one AD or SB number"""
+    type: str
+    reference: str
+    complied: List[AircraftCompliance] = []
+    gaps: List[ComplianceGap] = []
+
+class ArchiveReport(BaseModel):
+    """Progress of the image archival pipeline and the storage it saved"""
+    images: int = 0
+    archived_images: int = 0
+    skipped_images: int = 0
+    pending_images: int = 0
+    original_bytes: int = 0
+    archived_bytes: int = 0
+    bytes_saved: int = 0
+    # Originals still kept during their grace period
+    retained_originals: int = 0
+    retained_original_bytes: int = 0
+
 class UploadResponse(BaseModel):
     """Response model for upload endpoint"""
     success: bool
@@ -0,0 +1,171 @@
+"""
+Parsing of `next_due_compliance` statements into structured due points.
+
+"Next inspection due in 50 hours" is relative to the tach time of the entry it
+was written in, "next oil change at 1300 tach" is an absolute tach time, and
+"due 2025-03-01", "due 01/2025" or "due in 12 months" are calendar limits. A
+statement may carry both ("50 hours or 12 months, whichever comes first"), so
+a due point has an optional `due_tach` and an optional `due_date` (ISO string).
+AD and SB numbers ("AD 2020-12-05") are blanked out first, so they are never
+read as dates.
+"""
+
+import calendar
+import re
+from datetime import date, timedelta
+
+from field_parsing import parse_entry_date
+from references import mask_references
+
+_NUMBER = r'(\d[\d,]*(?:\.\d+)?)'
+_HOURS_UNIT = r'(?:hours?|hrs?|h)\b'
+
+# "in 50 hours", "within 100 hrs", "after 25 more hours", "50 hours or 12 months"
+_RELATIVE_HOURS_PATTERN = re.compile(
+    rf'(?:\b(?:in|within|after|every)\s+(?:another\s+)?)?\b{_NUMBER}\s*(?:more\s+)?(?:flight\s+|tach\s+)?{_HOURS_UNIT}',
+    re.IGNORECASE
+)
+
+# "at 1300 tach", "@ 1,300.0 hrs", "by 1350 hours", "at tach 1300"
+_ABSOLUTE_HOURS_PATTERN = re.compile(
+    rf'(?:\b(?:at|by)|@)\s*(?:tach\s*(?:time\s*)?)?{_NUMBER}\s*(?:{_HOURS_UNIT}|tach\b|(?=\s*$|\s*[,;)]))',
+    re.IGNORECASE
+)
+
+# "in 12 months", "within 30 days", "after 1 year", "24 calendar months"
+_RELATIVE_DATE_PATTERN = re.compile(
+    r'(?:\b(?:in|within|after|every)\s+)?\b(\d+)\s*(?:calendar\s+)?(days?|weeks?|months?|mos?|years?|yrs?)\b',
+    re.IGNORECASE
+)
+
+# Intervals led by one of these words are the limit itself, not part of the item's name ("100 hr inspection")
+_INTERVAL_LEAD_PATTERN = re.compile(r'(?:in|within|after|every)\b', re.IGNORECASE)
+
+_ISO_DATE_PATTERN = re.compile(r'\b\d{4}-\d{1,2}-\d{1,2}\b')
+_NUMERIC_DATE_PATTERN = re.compile(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b')
+_MONTH_NAME = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?'
+_NAMED_DATE_PATTERN = re.compile(rf'\b(?:{_MONTH_NAME}\s+\d{{1,2}},?\s+\d{{4}}|\d{{1,2}}\s+{_MONTH_NAME}\s+\d{{4}})\b', re.IGNORECASE)
+# Month-only limits run to the end of that month: "01/2025", "March 2025"
+_NUMERIC_MONTH_PATTERN = re.compile(r'\b(\d{1,2})/(\d{4})\b')
+_NAMED_MONTH_PATTERN = re.compile(rf'\b({_MONTH_NAME})\s+(\d{{4}})\b', re.IGNORECASE)
+
+# Words dropped when deriving what a statement is about ("next annual due ..." -> "annual")
+_SUBJECT_PATTERN = re.compile(r'^(.*?)(?:\b(?:is\s+)?(?:due|required|expires?|at|by|in|within|every)\b|@)', re.IGNORECASE)
+_SUBJECT_STOP_WORDS = {"next", "the", "a", "an", "is", "will", "be", "item"}
+_SUBJECT_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+_MONTH_NUMBERS = {name.lower(): number for number, name in enumerate(calendar.month_abbr) if name}
+
+
+def _hours(text):
+    return float(text.replace(",", ""))
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return parse_entry_date(value)
+
+
+def _add_months(start, months):
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def _end_of_month(year, month):
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _subject_words(text):
+    words = _SUBJECT_WORD_PATTERN.findall((text or "").lower())
+    return " ".join(word for word in words if word not in _SUBJECT_STOP_WORDS)
+
+
+def due_subject(text, description=None):
+    """
+    What a due statement is about, for telling a renewed item from a different
+    one: the item it names ("next annual due ..." -> "annual"), else the entry's
+    normalized work description; None when there is neither
+    """
+    match = _SUBJECT_PATTERN.match(text or "")
+    subject = _subject_words(match.group(1)) if match else _subject_words(text)
+    return subject or _subject_words(description) or None
+
+
+def _interval(pattern, text):
+    """The interval a statement sets: the first one led by "in"/"within"/..., else the first bare count"""
+    matches = list(pattern.finditer(text))
+    for match in matches:
+        if _INTERVAL_LEAD_PATTERN.match(match.group()):
+            return match
+    return matches[0] if matches else None
+
+
+def _due_tach(text, entry_tach):
+    # "at 1350" names the tach time itself; "in 50 hours" is an interval from the entry's tach
+    match = _ABSOLUTE_HOURS_PATTERN.search(text)
+    if match:
+        return _hours(match.group(1))
+    match = _interval(_RELATIVE_HOURS_PATTERN, text)
+    if not match or entry_tach is None:
+        return None
+    hours = _hours(match.group(1))
+    # A bare count past the entry's own tach ("1/15/2025 or 1350 hours") is a reading, not an interval
+    if not _INTERVAL_LEAD_PATTERN.match(match.group()) and hours > entry_tach:
+        return hours
+    return entry_tach + hours
+
+
+def _due_date(text, entry_date):
+    match = _interval(_RELATIVE_DATE_PATTERN, text)
+    if match:
+        if entry_date is None:
+            return None
+        amount, unit = int(match.group(1)), match.group(2).lower()
+        if unit.startswith("d"):
+            return entry_date + timedelta(days=amount)
+        if unit.startswith("w"):
+            return entry_date + timedelta(weeks=amount)
+        if unit.startswith("mo"):
+            return _add_months(entry_date, amount)
+        return _add_months(entry_date, 12 * amount)
+
+    for pattern in (_ISO_DATE_PATTERN, _NUMERIC_DATE_PATTERN, _NAMED_DATE_PATTERN):
+        match = pattern.search(text)
+        if match:
+            parsed = parse_entry_date(match.group().replace(".", ""))
+            if parsed:
+                return parsed
+
+    match = _NUMERIC_MONTH_PATTERN.search(text)
+    if match and 1 <= int(match.group(1)) <= 12:
+        return _end_of_month(int(match.group(2)), int(match.group(1)))
+    match = _NAMED_MONTH_PATTERN.search(text)
+    if match:
+        month = _MONTH_NUMBERS.get(match.group(1).lower()[:3])
+        if month:
+            return _end_of_month(int(match.group(2)), month)
+    return None
+
+
+def parse_next_due(text, entry_tach=None, entry_date=None, description=None):
+    """
+    Structured due point for a next-due statement, or None when it names
+    neither a tach time nor a date. `entry_tach` (hours) and `entry_date`
+    (date or date text) anchor relative limits such as "in 50 hours";
+    `description` (the entry's work) is the subject when the statement names none.
+    """
+    if not text or not str(text).strip():
+        return None
+    text = " ".join(str(text).split())
+    limits = mask_references(text)
+    due_tach = _due_tach(limits, entry_tach)
+    due_date = _due_date(limits, _as_date(entry_date))
+    if due_tach is None and due_date is None:
+        return None
+    return {
+        "subject": due_subject(text, description),
+        "due_tach": due_tach,
+        "due_date": due_date.isoformat() if due_date else None,
+    }
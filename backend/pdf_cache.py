@@ -0,0 +1,118 @@
+"""
+Cache of rendered PDF exports.
+
+Audits export the same unchanged logs again and again, and every export ran a
+full ReportLab layout. A rendered PDF is now stored in the blob store under a
+key hashing the log's `structured_data` together with `PDF_TEMPLATE_VERSION`,
+so an edit to the log or a change to the template renders afresh while a
+repeat export is a plain blob stream. Entries are tracked in a small
+`<collection>_pdf_cache` collection (size, logs using them, last use);
+`update_log`, `update_log_entry` and `delete_log` drop a log's entries, and
+the least recently used entries are evicted once the cache grows beyond
+`PDF_CACHE_MAX_BYTES`. A cache hit reads the whole PDF (one log's PDF is
+small) before it is sent, so an entry evicted or invalidated by another
+request meanwhile cannot cut a response short.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from gridfs.errors import CorruptGridFile
+from pymongo.errors import DuplicateKeyError
+
+from blob_storage import BlobNotFound, iter_bytes
+
+# Bump whenever the template in pdf_render.py changes what it renders
+PDF_TEMPLATE_VERSION = 2
+
+PDF_CONTENT_TYPE = "application/pdf"
+
+
+def max_cache_bytes():
+    return int(os.getenv("PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def pdf_cache_key(structured_data):
+    """Hash of the rendered content: the structured data (key order ignored) and the template version"""
+    canonical = json.dumps(structured_data or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{PDF_TEMPLATE_VERSION}:{canonical}".encode("utf-8")).hexdigest()
+
+
+def cache_blob_name(key):
+    return f"pdf_cache_{key}.pdf"
+
+
+async def read_cached_pdf(store, cache_collection, key, log_id):
+    """The cached PDF bytes for a key, or None on a miss. Records the use for LRU eviction."""
+    entry = await cache_collection.find_one_and_update(
+        {"_id": key},
+        {"$set": {"last_used": datetime.utcnow()}, "$addToSet": {"log_ids": log_id}}
+    )
+    if entry is None:
+        return None
+    try:
+        blob = await store.open(cache_blob_name(key))
+        # Read now: once in memory, dropping the entry no longer affects this response
+        pdf_bytes = b"".join([chunk async for chunk in blob.iter_chunks()])
+    except (BlobNotFound, FileNotFoundError, CorruptGridFile):
+        pdf_bytes = None
+    if pdf_bytes is None or len(pdf_bytes) != blob.size:
+        # The blob was evicted or lost behind the index's back, possibly while it was read
+        await cache_collection.delete_one({"_id": key})
+        return None
+    return pdf_bytes
+
+
+async def store_pdf(store, cache_collection, key, log_id, pdf_bytes):
+    """Add a rendered PDF to the cache, then evict down to the size bound"""
+    await store.save(cache_blob_name(key), iter_bytes(pdf_bytes), content_type=PDF_CONTENT_TYPE)
+    now = datetime.utcnow()
+    try:
+        await cache_collection.insert_one({
+            "_id": key,
+            "size": len(pdf_bytes),
+            "log_ids": [log_id],
+            "template_version": PDF_TEMPLATE_VERSION,
+            "created": now,
+            "last_used": now,
+        })
+    except DuplicateKeyError:
+        # Rendered concurrently by another request; same key, same content
+        await cache_collection.update_one({"_id": key}, {"$set": {"last_used": now}, "$addToSet": {"log_ids": log_id}})
+    await evict(store, cache_collection)
+
+
+async def _drop(store, cache_collection, key):
+    await cache_collection.delete_one({"_id": key})
+    await store.delete(cache_blob_name(key))
+
+
+async def evict(store, cache_collection, limit=None):
+    """Delete least recently used entries until the cache fits in `limit` bytes; returns how many"""
+    limit = max_cache_bytes() if limit is None else limit
+    total = 0
+    async for row in cache_collection.aggregate([{"$group": {"_id": None, "size": {"$sum": "$size"}}}]):
+        total = row["size"]
+    evicted = 0
+    if total <= limit:
+        return evicted
+    async for entry in cache_collection.find({}, {"size": 1}).sort("last_used", 1):
+        if total <= limit:
+            break
+        await _drop(store, cache_collection, entry["_id"])
+        total -= entry.get("size", 0)
+        evicted += 1
+    return evicted
+
+
+async def invalidate_log(store, cache_collection, log_id):
+    """Forget a log's cached PDFs after it was edited or deleted"""
+    async for entry in cache_collection.find({"log_ids": log_id}, {"log_ids": 1}):
+        others = [other for other in entry.get("log_ids", []) if other != log_id]
+        if others:
+            # Another log with identical content still uses this PDF
+            await cache_collection.update_one({"_id": entry["_id"]}, {"$pull": {"log_ids": log_id}})
+        else:
+            await _drop(store, cache_collection, entry["_id"])
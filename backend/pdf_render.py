@@ -0,0 +1,341 @@
+"""
+ReportLab template for maintenance log PDF exports.
+
+Rendering is pure CPU work, so routes run `render_pdf` in `pdf_pool` with the
+plain document dict from `pdf_document`; a full pool answers 429. Paragraph
+and table styles are built once per process at import, not on every render.
+"""
+
+import os
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from worker_pools import BoundedProcessPool
+
+# One render per core; PDF_QUEUE more may wait (default: as many as there are workers), beyond that exports get 429
+pdf_pool = BoundedProcessPool("pdf", "PDF_WORKERS", os.cpu_count() or 1, "PDF_QUEUE")
+
+# Modern color scheme
+PRIMARY_COLOR = colors.HexColor('#1e40af')  # Blue
+SECONDARY_COLOR = colors.HexColor('#64748b')  # Gray
+ACCENT_COLOR = colors.HexColor('#f59e0b')  # Amber
+SUCCESS_COLOR = colors.HexColor('#059669')  # Green
+DANGER_COLOR = colors.HexColor('#dc2626')  # Red
+
+_styles = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'ModernTitle',
+    parent=_styles['Heading1'],
+    fontSize=24,
+    spaceAfter=20,
+    alignment=TA_CENTER,
+    textColor=PRIMARY_COLOR,
+    fontName='Helvetica-Bold'
+)
+
+SECTION_STYLE = ParagraphStyle(
+    'SectionTitle',
+    parent=_styles['Heading2'],
+    fontSize=14,
+    spaceAfter=8,
+    spaceBefore=15,
+    textColor=PRIMARY_COLOR,
+    fontName='Helvetica-Bold'
+)
+
+ENTRY_STYLE = ParagraphStyle(
+    'EntryTitle',
+    parent=_styles['Heading3'],
+    fontSize=12,
+    spaceAfter=6,
+    spaceBefore=10,
+    textColor=colors.HexColor('#7c3aed'),
+    fontName='Helvetica-Bold'
+)
+
+LABEL_STYLE = ParagraphStyle(
+    'Label',
+    parent=_styles['Normal'],
+    fontSize=10,
+    textColor=SECONDARY_COLOR,
+    fontName='Helvetica-Bold'
+)
+
+VALUE_STYLE = ParagraphStyle(
+    'Value',
+    parent=_styles['Normal'],
+    fontSize=11,
+    textColor=colors.black,
+    fontName='Helvetica'
+)
+
+NORMAL_STYLE = ParagraphStyle(
+    'Normal',
+    parent=_styles['Normal'],
+    fontSize=10,
+    fontName='Helvetica'
+)
+
+SEPARATOR_STYLE = ParagraphStyle(
+    'Separator',
+    parent=_styles['Normal'],
+    fontSize=8,
+    alignment=TA_CENTER,
+    textColor=SECONDARY_COLOR
+)
+
+FOOTER_STYLE = ParagraphStyle(
+    'Footer',
+    parent=_styles['Normal'],
+    fontSize=8,
+    alignment=TA_CENTER,
+    textColor=SECONDARY_COLOR
+)
+
+HEADER_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
+    ('ROUNDEDCORNERS', (0, 0), (-1, -1), 10),
+    ('LEFTPADDING', (0, 0), (-1, -1), 20),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 20),
+    ('TOPPADDING', (0, 0), (-1, -1), 15),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
+])
+
+AIRCRAFT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
+    ('TEXTCOLOR', (0, 0), (0, -1), SECONDARY_COLOR),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('LEFTPADDING', (0, 0), (-1, -1), 12),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+    ('ROUNDEDCORNERS', (0, 0), (-1, -1), 5),
+])
+
+
+def _note_table_style(background):
+    """Full-width shaded box for free text (work description, reason, certification)"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor(background)),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 15),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 15),
+        ('TOPPADDING', (0, 0), (-1, -1), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('ROUNDEDCORNERS', (0, 0), (-1, -1), 5),
+    ])
+
+
+WORK_TABLE_STYLE = _note_table_style('#fef3c7')
+REASON_TABLE_STYLE = _note_table_style('#dbeafe')
+CERT_TABLE_STYLE = _note_table_style('#ecfdf5')
+
+# Technician, risk and compliance label/value tables
+DETAIL_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
+    ('TEXTCOLOR', (0, 0), (0, -1), SECONDARY_COLOR),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('LEFTPADDING', (0, 0), (-1, -1), 8),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+    ('ROUNDEDCORNERS', (0, 0), (-1, -1), 3),
+])
+
+PARTS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#fef3c7')),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 8),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('ROUNDEDCORNERS', (0, 0), (-1, -1), 3),
+])
+
+COLUMNS_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('LEFTPADDING', (0, 0), (0, -1), 0),
+    ('RIGHTPADDING', (1, 0), (1, -1), 0),
+])
+
+
+def safe_str(value, default="Not specified"):
+    """Safely get string values"""
+    if value is None:
+        return default
+    return str(value)
+
+
+def pdf_document(doc):
+    """The plain dict the template reads from a log document, small and picklable for a worker process"""
+    return {"structured_data": doc.get("structured_data") or {}}
+
+
+def header_flowables():
+    """Header with logo-like design"""
+    header_table = Table([[Paragraph("✈️ AIRCRAFT MAINTENANCE LOG", TITLE_STYLE)]], colWidths=[7*inch])
+    header_table.setStyle(HEADER_TABLE_STYLE)
+    return [header_table, Spacer(1, 15)]
+
+
+def _note_table(text, style):
+    table = Table([[Paragraph(text, NORMAL_STYLE)]], colWidths=[7*inch])
+    table.setStyle(style)
+    return table
+
+
+def _detail_table(rows):
+    table = Table(
+        [[Paragraph(label, LABEL_STYLE), Paragraph(value, VALUE_STYLE)] for label, value in rows],
+        colWidths=[1.8*inch, 2.2*inch]
+    )
+    table.setStyle(DETAIL_TABLE_STYLE)
+    return table
+
+
+def log_flowables(log_data):
+    """Aircraft information and every entry of one log"""
+    story = []
+
+    # Get structured data safely
+    structured_data = log_data.get("structured_data", {})
+    log_entries = structured_data.get("log_entries", [])
+
+    # Aircraft Information - Compact 2-column layout
+    aircraft_info = [
+        [
+            Paragraph("Aircraft Registration", LABEL_STYLE),
+            Paragraph(safe_str(structured_data.get("aircraft_registration")), VALUE_STYLE)
+        ],
+        [
+            Paragraph("Make/Model", LABEL_STYLE),
+            Paragraph(safe_str(structured_data.get("aircraft_make_model")), VALUE_STYLE)
+        ],
+    ]
+    aircraft_table = Table(aircraft_info, colWidths=[2.5*inch, 4.5*inch])
+    aircraft_table.setStyle(AIRCRAFT_TABLE_STYLE)
+    story.append(aircraft_table)
+    story.append(Spacer(1, 15))
+
+    # Process each log entry
+    for i, entry in enumerate(log_entries, 1):
+        # Entry header
+        story.append(Paragraph(f"Entry #{i}", ENTRY_STYLE))
+
+        # Entry details in two columns
+        left_column = []
+        right_column = []
+
+        # Work Description - Full width
+        work_desc = safe_str(entry.get("description_of_work_performed"))
+        if work_desc and work_desc != "Not specified":
+            story.append(_note_table(work_desc, WORK_TABLE_STYLE))
+            story.append(Spacer(1, 10))
+
+        # Reason for Maintenance - Full width
+        reason_for_maintenance = safe_str(entry.get("reason_for_maintenance"))
+        if reason_for_maintenance and reason_for_maintenance != "Not specified":
+            story.append(_note_table(reason_for_maintenance, REASON_TABLE_STYLE))
+            story.append(Spacer(1, 10))
+
+        # Technician Information
+        left_column.append(Paragraph("Technician Info", SECTION_STYLE))
+        left_column.append(_detail_table([
+            ("Performed By", safe_str(entry.get("performed_by"))),
+            ("License Number", safe_str(entry.get("license_number"))),
+            ("Date", safe_str(entry.get("date"))),
+            ("Tach Time", safe_str(entry.get("tach_time"))),
+            ("Hobbs Time", safe_str(entry.get("hobbs_time"))),
+        ]))
+        left_column.append(Spacer(1, 10))
+
+        # Risk Assessment
+        is_airworthy = entry.get("is_airworthy", False)
+        right_column.append(Paragraph("Risk Assessment", SECTION_STYLE))
+        right_column.append(_detail_table([
+            ("Risk Level", safe_str(entry.get("risk_level"))),
+            ("Urgency", safe_str(entry.get("urgency"))),
+            ("Airworthy", "Yes" if is_airworthy else "No"),
+        ]))
+        right_column.append(Spacer(1, 10))
+
+        # Compliance Information
+        left_column.append(Paragraph("Compliance", SECTION_STYLE))
+        left_column.append(_detail_table([
+            ("AD Compliance", safe_str(entry.get("ad_compliance"))),
+            ("Next Due", safe_str(entry.get("next_due_compliance"))),
+            ("Service Bulletin", safe_str(entry.get("service_bulletin_reference"))),
+            ("Manual Ref", safe_str(entry.get("manual_reference"))),
+        ]))
+        left_column.append(Spacer(1, 10))
+
+        # Part Numbers
+        part_numbers = entry.get("part_number_replaced", [])
+        if part_numbers and isinstance(part_numbers, list) and len(part_numbers) > 0:
+            parts_text = "<br/>".join([f"• {safe_str(part)}" for part in part_numbers])
+            parts_table = Table([[Paragraph(parts_text, NORMAL_STYLE)]], colWidths=[4*inch])
+            parts_table.setStyle(PARTS_TABLE_STYLE)
+            right_column.append(Paragraph("Parts Replaced", SECTION_STYLE))
+            right_column.append(parts_table)
+            right_column.append(Spacer(1, 10))
+
+        # Combine left and right columns for this entry
+        if left_column and right_column:
+            combined_table = Table([[left_column, right_column]], colWidths=[3.5*inch, 3.5*inch])
+            combined_table.setStyle(COLUMNS_TABLE_STYLE)
+            story.append(combined_table)
+
+        # Certification Statement - Full width at bottom of entry
+        cert_statement = safe_str(entry.get("certification_statement"))
+        if cert_statement and cert_statement != "Not specified":
+            story.append(Spacer(1, 10))
+            story.append(_note_table(cert_statement, CERT_TABLE_STYLE))
+
+        # Add separator between entries (except for last entry)
+        if i < len(log_entries):
+            story.append(Spacer(1, 20))
+            story.append(Paragraph("─" * 50, SEPARATOR_STYLE))
+            story.append(Spacer(1, 20))
+
+    return story
+
+
+def footer_flowables():
+    # No render time: a cached PDF is served unchanged long after it was rendered, so the
+    # page holds only what the cache key covers (the structured data and the template)
+    footer_text = "Aircraft Maintenance Log System"
+    return [Spacer(1, 20), Paragraph(footer_text, FOOTER_STYLE)]
+
+
+def generate_maintenance_log_pdf(log_data):
+    """
+    Generate a modern, compact PDF report for a maintenance log with multiple entries
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=0.5*inch, rightMargin=0.5*inch, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    story = header_flowables() + log_flowables(log_data) + footer_flowables()
+
+    # Build PDF
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+
+def render_pdf(document):
+    """PDF bytes for a plain document dict (runs in a worker process)"""
+    return generate_maintenance_log_pdf(document).getvalue()
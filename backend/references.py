@@ -0,0 +1,192 @@
+"""
+Canonical airworthiness directive (AD) and service bulletin (SB) identifiers.
+
+`ad_compliance` and `service_bulletin_reference` are free text ("AD 2023-15-02
+complied with", "c/w AD 23-15-02 para (g)", "SB 72-0123 Rev 2"), so the
+identifiers are extracted with compiled patterns at ingest and stored as
+derived `references` that the compliance endpoint can look up by index.
+"""
+
+import re
+
+REFERENCE_AD = "AD"
+REFERENCE_SB = "SB"
+
+# FAA ADs "2023-15-02" / "23-15-02" and EASA ADs "2021-0123", with an optional
+# revision suffix ("R1"). Group 1 is the "AD" label, which bare dates lack.
+_AD_PATTERN = re.compile(
+    r'(\bAD\s*(?:NO\.?|#)?\s*:?\s*)?\b(?:((?:19|20)?\d{2})-(\d{2})-(\d{2})|((?:19|20)\d{2})-(\d{4}))(?:\s*R\s*\d+)?\b',
+    re.IGNORECASE
+)
+
+# Service bulletins: "SB 72-0123", "MSB M20-123", "S.B. 2023-01", "Service Bulletin No. SEB94-3"
+_SB_LABEL = r'(?:M?SB|S\.\s*B\.?|SEB|SERVICE\s+BULLETIN)'
+_SB_PATTERN = re.compile(rf'\b{_SB_LABEL}\s*(?:NO\.?|NUMBER|#)?\s*:?\s*([A-Z0-9]+(?:[-/.][A-Z0-9]+)*)', re.IGNORECASE)
+
+# A bare identifier in the SB field itself: has a digit and a separator ("72-0123")
+_BARE_SB_PATTERN = re.compile(r'\b([A-Z]*\d+[A-Z]*(?:[-/.][A-Z0-9]+)+)\b', re.IGNORECASE)
+_SB_REVISION_PATTERN = re.compile(r'\s*REV(?:ISION)?\.?\s*\w+$', re.IGNORECASE)
+
+# Statements recording that an AD/SB was complied with, and that it was *not*
+_COMPLIED_PATTERN = re.compile(
+    r'\b(?:complied|c/w|accomplished|completed|done|performed|incorporated|inspected|installed)(?!\w)',
+    re.IGNORECASE
+)
+_NOT_COMPLIED_PATTERN = re.compile(
+    r'\b(?:not\s+(?:complied|accomplished|done|performed|applicable)|non[\s-]?complian\w*|n/a|pending|deferred|overdue)(?!\w)',
+    re.IGNORECASE
+)
+
+# Clauses of a compliance statement: "AD 2020-12-05 complied; AD 2021-03-01 deferred. SB 72-0123 ..."
+_CLAUSE_SEPARATOR_PATTERN = re.compile(r'[;\n]|\.\s+(?=[A-Z])')
+
+
+def _ad_year(year):
+    if len(year) == 4:
+        return year
+    # Two-digit FAA years: AD numbering started in the 1960s
+    return ("19" if int(year) >= 50 else "20") + year
+
+
+def _ad_matches(text, bare=False):
+    """(key, start) of every distinct AD number in the text, at its first mention; see `ad_keys`"""
+    if not text:
+        return []
+    labelled, unlabelled = {}, {}
+    for match in _AD_PATTERN.finditer(text):
+        if match.group(2):
+            key = f"{_ad_year(match.group(2))}-{match.group(3)}-{match.group(4)}"
+        else:
+            key = f"{match.group(5)}-{match.group(6)}"
+        found = labelled if match.group(1) else unlabelled
+        found.setdefault(key, match.start())
+    return list((labelled or (unlabelled if bare else {})).items())
+
+
+def ad_keys(text, bare=False):
+    """
+    Every canonical AD number in a piece of text ("2023-15-02", "2021-0123"),
+    revisions dropped. Numbers need an "AD" label, since a bare 2024-01-15 is
+    usually a date; with `bare`, unlabelled ones count when nothing is labelled.
+    """
+    return [key for key, _ in _ad_matches(text, bare)]
+
+
+def ad_key(text):
+    """Canonical AD number given by a user, labelled or not; None when there is none"""
+    keys = ad_keys(text, bare=True)
+    return keys[0] if keys else None
+
+
+def _sb_matches(text, bare=False):
+    """(key, start) of every distinct SB number in the text, at its first mention; see `sb_keys`"""
+    if not text:
+        return []
+    found = {}
+    matches = list(_SB_PATTERN.finditer(text))
+    if not matches and bare:
+        matches = list(_BARE_SB_PATTERN.finditer(text))
+    for match in matches:
+        key = _SB_REVISION_PATTERN.sub('', match.group(1).upper()).rstrip('.-/')
+        if any(ch.isdigit() for ch in key):
+            found.setdefault(key, match.start())
+    return list(found.items())
+
+
+def sb_keys(text, bare=False):
+    """
+    Every canonical SB number in a piece of text: uppercased, revision dropped.
+    With `bare`, identifiers without an "SB" label count too (for the SB field).
+    """
+    return [key for key, _ in _sb_matches(text, bare)]
+
+
+def mask_references(text):
+    """
+    The text with every labelled AD/SB number blanked out, so "AD 2020-12-05"
+    is not read as a date (or "SB 72-0123" as a count) by other parsers
+    """
+    if not text:
+        return text or ""
+    text = _AD_PATTERN.sub(lambda match: " " if match.group(1) else match.group(), text)
+    return _SB_PATTERN.sub(" ", text)
+
+
+def reference_key(kind, text):
+    """Canonical identifier of one AD or SB number given by a user"""
+    if kind == REFERENCE_AD:
+        return ad_key(text)
+    keys = sb_keys(text, bare=True)
+    return keys[0] if keys else None
+
+
+def _status(text):
+    """True/False when the text says done / not done, None when it says neither"""
+    if _NOT_COMPLIED_PATTERN.search(text):
+        return False
+    if _COMPLIED_PATTERN.search(text):
+        return True
+    return None
+
+
+def complied_at(text, start, starts):
+    """
+    Whether a statement records the reference mentioned at `start` as done.
+    `starts` are where every AD/SB in the text is mentioned. Each reference is
+    judged by its own part of its clause - from its mention to the next one,
+    plus any words leading the clause ("Deferred: AD ..., AD ...") - and by the
+    whole clause when that part says neither ("AD ..., AD ... deferred").
+    """
+    clause_start, clause_end = 0, len(text)
+    for separator in _CLAUSE_SEPARATOR_PATTERN.finditer(text):
+        if separator.end() <= start:
+            clause_start = separator.end()
+        elif separator.start() >= start:
+            clause_end = separator.start()
+            break
+    in_clause = sorted(other for other in starts if clause_start <= other < clause_end)
+    following = [other for other in in_clause if other > start]
+    lead = text[clause_start:in_clause[0] if in_clause else start]
+    own = text[start:following[0] if following else clause_end]
+
+    for part in (lead + own, text[clause_start:clause_end]):
+        status = _status(part)
+        if status is not None:
+            return status
+    return True
+
+
+def build_references(structured_data, entry_values):
+    """
+    One item per AD/SB identifier per entry, with the entry's date (typed,
+    from `entry_values`) and whether the text records that one as complied with
+    """
+    references = []
+    for entry_index, entry in enumerate(structured_data.get("log_entries") or []):
+        entry_date = entry_values[entry_index]["date"]
+        ad_text = entry.get("ad_compliance") or ""
+        sb_text = entry.get("service_bulletin_reference") or ""
+
+        ad_text_ads, ad_text_sbs = _ad_matches(ad_text, bare=True), _sb_matches(ad_text)
+        sb_text_ads = _ad_matches(sb_text)
+        sb_text_sbs = _sb_matches(sb_text, bare=not sb_text_ads)
+        # Where every AD/SB is mentioned in each field, so each one is judged by its own clause
+        ad_starts = [start for _, start in ad_text_ads + ad_text_sbs]
+        sb_starts = [start for _, start in sb_text_ads + sb_text_sbs]
+        entry_ads = {key for key, _ in ad_text_ads}
+        entry_sbs = {key for key, _ in sb_text_sbs}
+        items = [(REFERENCE_AD, key, ad_text, start, ad_starts) for key, start in ad_text_ads]
+        items += [(REFERENCE_SB, key, sb_text, start, sb_starts) for key, start in sb_text_sbs]
+        # ADs are sometimes cited in the SB field and the other way round
+        items += [(REFERENCE_AD, key, sb_text, start, sb_starts) for key, start in sb_text_ads if key not in entry_ads]
+        items += [(REFERENCE_SB, key, ad_text, start, ad_starts) for key, start in ad_text_sbs if key not in entry_sbs]
+
+        for kind, key, text, start, starts in items:
+            references.append({
+                "type": kind,
+                "id": key,
+                "entry_index": entry_index,
+                "date": entry_date,
+                "complied": complied_at(text, start, starts),
+            })
+    return references
@@ -0,0 +1,229 @@
+"""
+Aircraft registration canonicalization and nationality lookup.
+
+A registration is a nationality mark followed by the aircraft's own mark
+("G-ABCD", "N123AB", "9V-SKA"). The AI reads it off a logbook page, so the
+same aircraft shows up as "N123AB", "n-123ab" or "N 123AB". Every
+registration-keyed field, query and index goes through `registration_key`,
+which maps all of those to one key.
+
+Nationality marks are one to three characters and some are prefixes of
+others ("C" Canada, "CC" Chile, "CS" Portugal), so they are kept in a trie:
+walking a key through it yields every mark the key could start with, and the
+longest one whose country format fits the rest of the key wins.
+"""
+
+import re
+
+# Separators that show up in hand-written and OCR'd registrations ("N-123AB", "G ABCD", "C.GABC")
+_SEPARATOR_PATTERN = re.compile(r'[\s\-\.‐-―_]+')
+
+# Characters allowed in a prefix search term once separators have been removed
+_KEY_PATTERN = re.compile(r'^[A-Z0-9]+$')
+
+# US N-numbers: a non-zero digit, up to five characters, at most two trailing
+# letters and never I or O (they read as 1 and 0)
+_US_SUFFIX = r'[1-9](?:[0-9]{0,4}|[0-9]{0,3}[A-HJ-NP-Z]|[0-9]{0,2}[A-HJ-NP-Z]{2})'
+
+# Nationality mark -> (country, format of the rest of the registration)
+NATIONALITY_MARKS = {
+    "N": ("United States", _US_SUFFIX),
+    "C": ("Canada", r'[FGI][A-Z]{3}'),
+    "XA": ("Mexico", r'[A-Z]{3}'),
+    "XB": ("Mexico", r'[A-Z]{3}'),
+    "XC": ("Mexico", r'[A-Z]{3}'),
+    "G": ("United Kingdom", r'[A-Z]{4}'),
+    "EI": ("Ireland", r'[A-Z]{3}'),
+    "F": ("France", r'[A-Z]{4}'),
+    "D": ("Germany", r'[A-Z]{4}|[0-9]{4}'),
+    "OE": ("Austria", r'[A-Z]{3}|[0-9]{4}'),
+    "HB": ("Switzerland", r'[A-Z]{3}|[0-9]{3}'),
+    "I": ("Italy", r'[A-Z]{4}'),
+    "EC": ("Spain", r'[A-Z]{3}|[0-9]{3}'),
+    "CS": ("Portugal", r'[A-Z]{3}'),
+    "PH": ("Netherlands", r'[A-Z]{3}|[0-9]{1,4}'),
+    "OO": ("Belgium", r'[A-Z]{3}|[0-9]{2,3}'),
+    "LX": ("Luxembourg", r'[A-Z]{3}'),
+    "OY": ("Denmark", r'[A-Z]{3}'),
+    "LN": ("Norway", r'[A-Z]{3}'),
+    "SE": ("Sweden", r'[A-Z]{3}'),
+    "OH": ("Finland", r'[A-Z]{3}|[0-9]{3}'),
+    "TF": ("Iceland", r'[A-Z]{3}'),
+    "SP": ("Poland", r'[A-Z]{3}|[0-9]{4}'),
+    "OK": ("Czech Republic", r'[A-Z]{3}|[0-9]{3,4}'),
+    "OM": ("Slovakia", r'[A-Z]{3}|[0-9]{4}'),
+    "HA": ("Hungary", r'[A-Z]{3}|[0-9]{4}'),
+    "YR": ("Romania", r'[A-Z]{3}'),
+    "LZ": ("Bulgaria", r'[A-Z]{3}'),
+    "SX": ("Greece", r'[A-Z]{3}'),
+    "TC": ("Turkey", r'[A-Z]{3}'),
+    "9A": ("Croatia", r'[A-Z]{3}'),
+    "S5": ("Slovenia", r'[A-Z]{3}'),
+    "YL": ("Latvia", r'[A-Z]{3}'),
+    "LY": ("Lithuania", r'[A-Z]{3}'),
+    "ES": ("Estonia", r'[A-Z]{3}'),
+    "UR": ("Ukraine", r'[A-Z]{3,5}|[0-9]{5}'),
+    "RA": ("Russia", r'[0-9]{5}|[0-9]{4}[A-Z]'),
+    "4X": ("Israel", r'[A-Z]{3}'),
+    "A6": ("United Arab Emirates", r'[A-Z]{3}'),
+    "A7": ("Qatar", r'[A-Z]{3}'),
+    "HZ": ("Saudi Arabia", r'[A-Z]{2,3}'),
+    "SU": ("Egypt", r'[A-Z]{3}'),
+    "ZS": ("South Africa", r'[A-Z]{3}'),
+    "5Y": ("Kenya", r'[A-Z]{3}'),
+    "5N": ("Nigeria", r'[A-Z]{3}'),
+    "ET": ("Ethiopia", r'[A-Z]{3}'),
+    "CN": ("Morocco", r'[A-Z]{3}'),
+    "VH": ("Australia", r'[A-Z]{3}'),
+    "ZK": ("New Zealand", r'[A-Z]{3}'),
+    "JA": ("Japan", r'[0-9]{4}|[0-9]{3}[A-Z]|[0-9]{2}[A-Z]{2}|A[0-9]{3}'),
+    "HL": ("South Korea", r'[0-9]{4}'),
+    "B": ("China", r'[0-9]{4,5}|[0-9]{3}[A-Z]'),
+    "VT": ("India", r'[A-Z]{3}'),
+    "AP": ("Pakistan", r'[A-Z]{3}'),
+    "9V": ("Singapore", r'[A-Z]{3}'),
+    "9M": ("Malaysia", r'[A-Z]{3}'),
+    "HS": ("Thailand", r'[A-Z]{3}'),
+    "PK": ("Indonesia", r'[A-Z]{3}'),
+    "RP": ("Philippines", r'C[0-9]{3,4}|[A-Z]{3}'),
+    "VN": ("Vietnam", r'[A-Z][0-9]{3}'),
+    "PP": ("Brazil", r'[A-Z]{3}'),
+    "PR": ("Brazil", r'[A-Z]{3}'),
+    "PS": ("Brazil", r'[A-Z]{3}'),
+    "PT": ("Brazil", r'[A-Z]{3}'),
+    "PU": ("Brazil", r'[A-Z]{3}'),
+    "LV": ("Argentina", r'[A-Z]{3}|[0-9]{3}'),
+    "CC": ("Chile", r'[A-Z]{3}'),
+    "HK": ("Colombia", r'[0-9]{3,4}[A-Z]?'),
+    "OB": ("Peru", r'[0-9]{4}'),
+    "YV": ("Venezuela", r'[0-9]{3,4}'),
+    "HP": ("Panama", r'[0-9]{3,4}[A-Z]{0,3}'),
+    "TI": ("Costa Rica", r'[A-Z]{3}'),
+    "CX": ("Uruguay", r'[A-Z]{3}'),
+    "HC": ("Ecuador", r'[A-Z]{3}'),
+    "CP": ("Bolivia", r'[0-9]{4}'),
+    "ZP": ("Paraguay", r'[A-Z]{3}'),
+    "C6": ("Bahamas", r'[A-Z]{3}'),
+    "VP": ("British Overseas Territories", r'[A-Z]{3}'),
+    "VQ": ("British Overseas Territories", r'[A-Z]{3}'),
+    "M": ("Isle of Man", r'[A-Z]{4}'),
+    "2": ("Guernsey", r'[A-Z]{4}'),
+    "ZJ": ("Jersey", r'[A-Z]{3}'),
+    "T7": ("San Marino", r'[A-Z]{3}'),
+    "9H": ("Malta", r'[A-Z]{3}'),
+    "5B": ("Cyprus", r'[A-Z]{3}'),
+}
+
+# Written without a dash between the nationality mark and the rest ("N123AB", "JA801A", "HL7700")
+_UNDASHED_MARKS = frozenset(["N", "JA", "HL"])
+
+# Letters OCR reads in place of digits
+_DIGIT_LOOKALIKES = str.maketrans({"O": "0", "I": "1"})
+
+
+def _build_trie(marks):
+    trie = {}
+    for mark in marks:
+        node = trie
+        for char in mark:
+            node = node.setdefault(char, {})
+        node[""] = mark
+    return trie
+
+
+_MARK_TRIE = _build_trie(NATIONALITY_MARKS)
+
+_SUFFIX_PATTERNS = {mark: re.compile(suffix) for mark, (_, suffix) in NATIONALITY_MARKS.items()}
+
+
+def _candidate_marks(key):
+    """Nationality marks `key` starts with, longest first"""
+    marks = []
+    node = _MARK_TRIE
+    for char in key:
+        node = node.get(char)
+        if node is None:
+            break
+        if "" in node:
+            marks.append(node[""])
+    return reversed(marks)
+
+
+def _normalized(registration):
+    if not registration or not isinstance(registration, str):
+        return None
+    key = _SEPARATOR_PATTERN.sub('', registration.upper())
+    if not key or not _KEY_PATTERN.match(key):
+        return None
+    return key
+
+
+def _parse_key(key):
+    for mark in _candidate_marks(key):
+        suffix = key[len(mark):]
+        pattern = _SUFFIX_PATTERNS[mark]
+        if not pattern.fullmatch(suffix):
+            # N-numbers have no I or O, so "N12O4" is N1204
+            if mark != "N" or not pattern.fullmatch(suffix.translate(_DIGIT_LOOKALIKES)):
+                continue
+            suffix = suffix.translate(_DIGIT_LOOKALIKES)
+        country = NATIONALITY_MARKS[mark][0]
+        return {
+            "key": mark + suffix,
+            "registration": mark + suffix if mark in _UNDASHED_MARKS else f"{mark}-{suffix}",
+            "nationality_mark": mark,
+            "country": country,
+        }
+    return None
+
+
+def parse_registration(registration):
+    """
+    Validate and canonicalize a registration, e.g. "g abcd" ->
+    {"key": "GABCD", "registration": "G-ABCD", "nationality_mark": "G", "country": "United Kingdom"}.
+    Returns None when no known nationality mark and format fit.
+    """
+    key = _normalized(registration)
+    return _parse_key(key) if key else None
+
+
+def registration_key(registration):
+    """
+    Canonical search key for an aircraft registration.
+
+    Uppercased with spaces, dashes and dots removed, so "n-123ab", "N 123AB"
+    and "N123AB" all map to "N123AB", and ICAO-style "G-ABCD" maps to "GABCD".
+    A registration that parses is also corrected where its country's format
+    allows only one reading ("N12O4" -> "N1204"). Anything else (partial
+    search terms, unknown marks) keeps its separator-free form, so prefix
+    searches match stored keys. Returns None when nothing usable is left.
+    """
+    key = _normalized(registration)
+    if not key:
+        return None
+    parsed = _parse_key(key)
+    return parsed["key"] if parsed else key
+
+
+def registration_country(registration):
+    """Country of a registration's nationality mark, or None when it does not parse"""
+    parsed = parse_registration(registration)
+    return parsed["country"] if parsed else None
+
+
+def registration_format(key):
+    """Classify a registration key as 'US', 'ICAO' or None when it matches neither"""
+    parsed = _parse_key(key) if key else None
+    if not parsed:
+        return None
+    return "US" if parsed["nationality_mark"] == "N" else "ICAO"
+
+
+def registration_prefix_pattern(prefix_key):
+    """
+    Anchored, case-sensitive regex for a prefix search on `registration_key`.
+
+    MongoDB can only answer a $regex from an index when it is anchored with ^
+    and case sensitive; the key is already uppercased so no $options are needed.
+    """
+    return f"^{re.escape(prefix_key)}"
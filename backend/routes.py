@@ -1,31 +1,56 @@
 import os
+import asyncio
 import logging
-from typing import List
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
+import tempfile
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query, Header, Path as PathParam, Response
 from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
-from datetime import datetime
+from fastapi.concurrency import run_in_threadpool
+from datetime import date, datetime, timezone
+from email.utils import format_datetime
 import json
+import re
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
 import shutil
 from pathlib import Path
-from urllib.parse import unquote
+from urllib.parse import quote, unquote
 from datetime import datetime
 from io import BytesIO
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-
-from models import MaintenanceLog, MaintenanceLogData, LogSummary, UploadResponse, ExportRequest
+from PIL import UnidentifiedImageError
+
+from models import (MaintenanceLog, MaintenanceLogData, LogEntryUpdate, LogEntriesUpdate, LogSummary, UploadResponse, ExportRequest, SearchResponse,
+                    PartInstallation, AnalyticsResponse, AircraftState, DueItem, ComplianceResponse, ArchiveReport)
 from database import Database
 from ai_service import AIService
+from indexing import build_derived_fields, part_number_key, entry_range_conditions, entry_range_query, entry_in_range
+from etags import (log_etag, collection_etag, etag_matches, not_modified_since, parse_byte_range, revision_from_etag, revision_filter,
+                   get_collection_revision, bump_collection_revision)
+from registration import registration_key, registration_prefix_pattern
+from text_search import entry_hits, local_index, query_terms
+from bulk_export import EXPORT_BATCH_SIZE, EXPORT_PROJECTION, EXPORT_SORT, decode_cursor, resume_filter, stream_export
+from columnar_export import COLUMNAR_PROJECTION, stream_columnar
+from analytics import build_analytics_pipeline
+from aircraft_state import apply_log, remove_log, due_query, due_items, DUE_PROJECTION, TIMELINE_SORT
+from references import REFERENCE_AD, REFERENCE_SB, reference_key
+from blob_storage import BlobNotFound, get_blob_store, iter_file, content_addressed_name, is_content_addressed
+from image_derivatives import DERIVATIVE_SIZES, open_derivative, delete_derivatives
+from archival import archive_report, retained_original, schedule_archive
+from pdf_cache import PDF_CONTENT_TYPE, pdf_cache_key, read_cached_pdf, store_pdf, invalidate_log
+from pdf_render import pdf_document, pdf_pool, render_pdf
+from bundle_export import BUNDLE_BATCH_SIZE, BUNDLE_SORT, BundleAborted, stream_bundle
+from serialization import FastJSONResponse, StoredDocumentSerializer
+from fleet_report import REPORT_BATCH_SIZE, REPORT_PROJECTION, REPORT_SORT, spool_logs, render_report, stream_report
+from worker_pools import PoolSaturated
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["maintenance-logs"])
 
+# Stored logs were validated when written, so reads serialize them without building models
+stored_logs = StoredDocumentSerializer(MaintenanceLog)
+
 # Initialize AI service lazily
 _ai_service = None
 
@@ -38,6 +63,81 @@ def get_ai_service():
         print(f"✅ AI service initialized")
     return _ai_service
 
+def content_disposition(filename, disposition="attachment"):
+    """Content-Disposition header value, RFC 5987-encoded when the name is not plain ASCII"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+async def delete_log_image(image_filename):
+    """Remove a deleted log's image from the blob store; a leftover image only costs space"""
+    if not image_filename:
+        return
+    try:
+        deleted = await get_blob_store().delete(image_filename)
+        await delete_derivatives(get_blob_store(), image_filename)
+        print(f"📝 Image {image_filename} deleted from blob store: {deleted}")
+    except Exception as e:
+        print(f"⚠️ WARNING: could not delete image {image_filename}: {e}")
+        logger.warning(f"Image delete failed for {image_filename}: {e}")
+
+async def sync_aircraft_state(doc):
+    """Fold a written log into its aircraft's materialized state; drift is repaired by rebuild-aircraft"""
+    try:
+        await apply_log(Database.get_aircraft_collection(), Database.get_aircraft_timeline_collection(),
+                        Database.get_aircraft_sources_collection(), doc)
+        print(f"✅ Aircraft state updated for {doc.get('registration_key')}")
+    except Exception as e:
+        print(f"⚠️ Warning: Failed to update aircraft state for log {doc.get('_id')}: {e}")
+        logger.warning(f"Failed to update aircraft state for log {doc.get('_id')}: {e}")
+
+async def drop_aircraft_state(log_id):
+    """Remove a deleted log from its aircraft's materialized state"""
+    try:
+        await remove_log(Database.get_aircraft_collection(), Database.get_aircraft_timeline_collection(),
+                         Database.get_aircraft_sources_collection(), log_id)
+        print(f"✅ Aircraft state updated after deleting {log_id}")
+    except Exception as e:
+        print(f"⚠️ Warning: Failed to update aircraft state after deleting log {log_id}: {e}")
+        logger.warning(f"Failed to update aircraft state after deleting log {log_id}: {e}")
+
+async def invalidate_pdf_cache(log_id):
+    """Drop a log's cached PDF exports after it was edited or deleted"""
+    try:
+        await invalidate_log(get_blob_store(), Database.get_pdf_cache_collection(), log_id)
+        print(f"✅ PDF cache invalidated for {log_id}")
+    except Exception as e:
+        print(f"⚠️ Warning: Failed to invalidate PDF cache for log {log_id}: {e}")
+        logger.warning(f"Failed to invalidate PDF cache for log {log_id}: {e}")
+
+def entry_range(
+    tach_min: Optional[float] = Query(None, description="Only logs with an entry at or above this tach time"),
+    tach_max: Optional[float] = Query(None, description="Only logs with an entry at or below this tach time"),
+    hobbs_min: Optional[float] = Query(None, description="Only logs with an entry at or above this hobbs time"),
+    hobbs_max: Optional[float] = Query(None, description="Only logs with an entry at or below this hobbs time"),
+    date_from: Optional[date] = Query(None, description="Only logs with an entry performed on or after this date"),
+    date_to: Optional[date] = Query(None, description="Only logs with an entry performed on or before this date"),
+    include_uncertain: bool = Query(False, description="Also match values read with inferred or ambiguous confidence")
+):
+    """Inclusive range filters on the typed entry values; all bounds apply to the same entry"""
+    return entry_range_conditions(tach_min, tach_max, hobbs_min, hobbs_max, date_from, date_to, include_uncertain)
+
+def hits_in_range(doc, hits, conditions):
+    """Keep only the search hits whose entry is inside the requested ranges"""
+    if not conditions:
+        return hits
+    in_range = {values["entry_index"] for values in doc.get("entry_values") or [] if entry_in_range(values, conditions)}
+    return [hit for hit in hits if hit["entry_index"] in in_range]
+
+def print_score_disagreements(entry_scores):
+    """Warn about entries whose AI risk/urgency rating disagrees with the local keyword score"""
+    for scores in entry_scores:
+        for score in ("risk_level", "urgency"):
+            if scores[f"{score}_agrees"] is False:
+                print(f"⚠️ Entry {scores['entry_index']}: AI {score} disagrees with keyword score {scores[score]} "
+                      f"(keywords: {', '.join(scores[f'{score}_factors']) or 'none'})")
+
 @router.post("/upload-log/", response_model=UploadResponse)
 async def upload_maintenance_log(file: UploadFile = File(...)):
     """
@@ -58,25 +158,20 @@ async def upload_maintenance_log(file: UploadFile = File(...)):
         
         # Save image file
         print(f"🔄 Saving image file")
-        uploads_dir = Path("uploads")
-        print(f"📝 Uploads directory path: {uploads_dir.absolute()}")
-        uploads_dir.mkdir(exist_ok=True)
-        print(f"✅ Uploads directory created/verified")
+        blob_store = get_blob_store()
         
-        # Generate unique filename
+        # Generate unique, content-addressed filename (served with immutable caching)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-        image_filename = f"maintenance_log_{timestamp}{file_extension}"
-        image_path = uploads_dir / image_filename
+        image_filename = content_addressed_name(f"maintenance_log_{timestamp}", image_bytes, file_extension)
         print(f"📝 Generated filename: {image_filename}")
-        print(f"📝 Full image path: {image_path.absolute()}")
         
-        # Save the image
+        # Save the image, streamed from the spooled upload into the blob store
         try:
-            with open(image_path, "wb") as f:
-                f.write(image_bytes)
-            print(f"✅ Image saved successfully to: {image_path.absolute()}")
-            print(f"📝 File size: {image_path.stat().st_size} bytes")
+            await file.seek(0)
+            image_size = await blob_store.save(image_filename, iter_file(file), content_type=file.content_type)
+            print(f"✅ Image saved successfully to {type(blob_store).__name__}: {image_filename}")
+            print(f"📝 File size: {image_size} bytes")
         except Exception as e:
             print(f"❌ ERROR saving image: {e}")
             raise e
@@ -106,6 +201,9 @@ async def upload_maintenance_log(file: UploadFile = File(...)):
         print(f"✅ Database collection obtained")
         
         log_dict = maintenance_log.dict(by_alias=True, exclude={'id'})
+        log_dict.update(build_derived_fields(log_dict["structured_data"]))
+        log_dict["revision"] = 1
+        print_score_disagreements(log_dict["entry_scores"])
         print(f"📝 Log dict prepared: {list(log_dict.keys())}")
         print(f"📝 Log dict _id field: {log_dict.get('_id', 'NOT PRESENT')}")
         
@@ -118,6 +216,11 @@ async def upload_maintenance_log(file: UploadFile = File(...)):
         # Get the inserted document ID
         log_id = str(result.inserted_id)
         print(f"✅ Log ID converted to string: {log_id}")
+        revision = await bump_collection_revision(Database.get_meta_collection())
+        local_index.on_write(log_dict, revision)
+        await sync_aircraft_state(log_dict)
+        # Transcode the stored image to the archival format in the background
+        schedule_archive(blob_store, collection, Database.get_meta_collection(), log_id)
         
         logger.info(f"Successfully saved maintenance log with ID: {log_id}")
         print(f"✅ Successfully saved maintenance log with ID: {log_id}")
@@ -151,17 +254,28 @@ async def upload_maintenance_log(file: UploadFile = File(...)):
         logger.error(f"Error uploading maintenance log: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to process maintenance log: {str(e)}")
 
-@router.get("/logs/", response_model=List[LogSummary])
-async def get_all_logs():
+@router.get("/logs/", response_model=List[LogSummary], response_class=FastJSONResponse)
+async def get_all_logs(response: Response, if_none_match: Optional[str] = Header(None), ranges: dict = Depends(entry_range)):
     """
     Get all maintenance logs (summary view for sidebar)
     """
     print(f"=== GET ALL LOGS START ===")
     try:
+        # The list changes only when some log is written, so its ETag is the collection revision
+        # together with the normalized range filters that select it
+        etag = collection_etag(await get_collection_revision(Database.get_meta_collection()), ranges)
+        if etag_matches(if_none_match, etag):
+            print(f"✅ Log list unchanged, returning 304")
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+
         collection = Database.get_collection()
         print(f"✅ Database collection obtained")
         
-        cursor = collection.find({}).sort("timestamp", -1).limit(50)
+        query = entry_range_query(ranges)
+        print(f"📝 Entry range filter: {query}")
+        cursor = collection.find(query).sort("timestamp", -1).limit(50)
         print(f"✅ Database cursor created")
         
         logs = []
@@ -228,8 +342,18 @@ async def get_all_logs():
         logger.error(f"Error retrieving logs: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve logs: {str(e)}")
 
-@router.get("/logs/{log_id}", response_model=MaintenanceLog)
-async def get_log_by_id(log_id: str):
+def print_structured_data(structured_data):
+    """Log the headline fields of a stored log's structured data"""
+    if not structured_data:
+        return
+    print(f"   - Aircraft registration: {structured_data.get('aircraft_registration')}")
+    print(f"   - Aircraft make/model: {structured_data.get('aircraft_make_model')}")
+    print(f"   - Summary: {structured_data.get('summary')}")
+    print(f"   - Is multiple entries: {structured_data.get('is_mult')}")
+    print(f"   - Number of log entries: {len(structured_data.get('log_entries') or [])}")
+
+@router.get("/logs/{log_id}", response_model=MaintenanceLog, response_class=FastJSONResponse)
+async def get_log_by_id(log_id: str, if_none_match: Optional[str] = Header(None)):
     """
     Get full structured data for one maintenance log
     """
@@ -256,27 +380,22 @@ async def get_log_by_id(log_id: str):
         print(f"✅ Document found: {doc.get('_id', 'NO_ID')}")
         print(f"📝 Document keys: {list(doc.keys())}")
         
-        # Convert the _id to string for proper Pydantic validation
-        original_id = doc["_id"]
-        doc["_id"] = str(doc["_id"])
-        print(f"📝 Converted _id from {original_id} to {doc['_id']}")
+        etag = log_etag(log_id, doc.get("revision"), doc.get("image_revision"))
+        if etag_matches(if_none_match, etag):
+            print(f"✅ Log unchanged, returning 304")
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
         
-        print(f"🔄 Creating MaintenanceLog from document")
-        maintenance_log = MaintenanceLog(**doc)
-        print(f"✅ MaintenanceLog created successfully")
+        print(f"🔄 Serializing stored document")
+        content = stored_logs.dump(doc)
+        print(f"✅ Document serialized successfully")
         print(f"📝 Response data:")
-        print(f"   - Log ID: {maintenance_log.id}")
-        print(f"   - Image filename: {maintenance_log.image_filename}")
-        print(f"   - Uploaded by: {maintenance_log.uploaded_by}")
-        print(f"   - Timestamp: {maintenance_log.timestamp}")
-        if maintenance_log.structured_data:
-            print(f"   - Aircraft registration: {maintenance_log.structured_data.aircraft_registration}")
-            print(f"   - Aircraft make/model: {maintenance_log.structured_data.aircraft_make_model}")
-            print(f"   - Summary: {maintenance_log.structured_data.summary}")
-            print(f"   - Is multiple entries: {maintenance_log.structured_data.is_mult}")
-            print(f"   - Number of log entries: {len(maintenance_log.structured_data.log_entries)}")
-        
-        return maintenance_log
+        print(f"   - Log ID: {doc['_id']}")
+        print(f"   - Image filename: {doc.get('image_filename')}")
+        print(f"   - Uploaded by: {doc.get('uploaded_by')}")
+        print(f"   - Timestamp: {doc.get('timestamp')}")
+        print_structured_data(doc.get("structured_data"))
+        
+        return Response(content=content, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
         
     except HTTPException:
         print(f"❌ HTTPException raised, re-raising")
@@ -288,8 +407,21 @@ async def get_log_by_id(log_id: str):
         logger.error(f"Error retrieving log {log_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve log: {str(e)}")
 
-@router.put("/logs/{log_id}", response_model=MaintenanceLog)
-async def update_log(log_id: str, log_data: MaintenanceLogData):
+def expected_revision(if_match, log_id):
+    """Revision required by an If-Match header, or None when the write is unconditional"""
+    try:
+        return revision_from_etag(if_match, log_id)
+    except ValueError:
+        raise HTTPException(status_code=412, detail="Maintenance log was modified by another request")
+
+async def raise_not_found_or_modified(collection, log_id, expected, detail="Maintenance log not found"):
+    """Explain why a conditional write matched nothing: the log is gone (404) or has moved on (412)"""
+    if expected is not None and await collection.count_documents({"_id": ObjectId(log_id)}, limit=1):
+        raise HTTPException(status_code=412, detail="Maintenance log was modified by another request")
+    raise HTTPException(status_code=404, detail=detail)
+
+@router.put("/logs/{log_id}", response_model=MaintenanceLog, response_class=FastJSONResponse)
+async def update_log(log_id: str, log_data: MaintenanceLogData, if_match: Optional[str] = Header(None)):
     """
     Update a maintenance log
     """
@@ -299,35 +431,43 @@ async def update_log(log_id: str, log_data: MaintenanceLogData):
         if not ObjectId.is_valid(log_id):
             raise HTTPException(status_code=400, detail="Invalid log ID format")
         
+        expected = expected_revision(if_match, log_id)
+        log_filter = {"_id": ObjectId(log_id)}
+        if expected is not None:
+            log_filter["revision"] = revision_filter(expected)
+        
         collection = Database.get_collection()
         
-        # Update the document
-        result = await collection.update_one(
-            {"_id": ObjectId(log_id)},
-            {"$set": {"structured_data": log_data.dict()}}
+        # Update the document together with the fields derived from it and
+        # get the new version back in the same round trip
+        structured_data = log_data.dict()
+        updated_doc = await collection.find_one_and_update(
+            log_filter,
+            {
+                "$set": {"structured_data": structured_data, **build_derived_fields(structured_data)},
+                "$inc": {"revision": 1}
+            },
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="Maintenance log not found")
+        if updated_doc is None:
+            await raise_not_found_or_modified(collection, log_id, expected)
+        
+        revision = await bump_collection_revision(Database.get_meta_collection())
+        etag = log_etag(log_id, updated_doc["revision"], updated_doc.get("image_revision"))
         
-        # Return the updated document
-        updated_doc = await collection.find_one({"_id": ObjectId(log_id)})
-        # Convert the _id to string for proper Pydantic validation
         updated_doc["_id"] = str(updated_doc["_id"])
-        maintenance_log = MaintenanceLog(**updated_doc)
+        local_index.on_write(updated_doc, revision)
+        await sync_aircraft_state(updated_doc)
+        await invalidate_pdf_cache(log_id)
+        # The new structured data was validated as MaintenanceLogData on the way in
+        content = stored_logs.dump(updated_doc)
         print(f"✅ Update completed successfully")
         print(f"📝 Response data:")
-        print(f"   - Log ID: {maintenance_log.id}")
-        print(f"   - Matched count: {result.matched_count}")
-        print(f"   - Modified count: {result.modified_count}")
-        if maintenance_log.structured_data:
-            print(f"   - Aircraft registration: {maintenance_log.structured_data.aircraft_registration}")
-            print(f"   - Aircraft make/model: {maintenance_log.structured_data.aircraft_make_model}")
-            print(f"   - Summary: {maintenance_log.structured_data.summary}")
-            print(f"   - Is multiple entries: {maintenance_log.structured_data.is_mult}")
-            print(f"   - Number of log entries: {len(maintenance_log.structured_data.log_entries)}")
-        
-        return maintenance_log
+        print(f"   - Log ID: {updated_doc['_id']}")
+        print_structured_data(updated_doc.get("structured_data"))
+        
+        return Response(content=content, media_type="application/json", headers={"ETag": etag})
         
     except HTTPException:
         raise
@@ -335,332 +475,151 @@ async def update_log(log_id: str, log_data: MaintenanceLogData):
         logger.error(f"Error updating log {log_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to update log: {str(e)}")
 
-def generate_maintenance_log_pdf(log_data):
+# Attempts at an entry update whose log keeps changing underneath it before giving up
+ENTRY_PATCH_ATTEMPTS = 5
+
+async def patch_log_entries(collection, log_id, entry_changes, expected):
     """
-    Generate a modern, compact PDF report for a maintenance log with multiple entries
+    Write {entry_index: {field: value}} into a log in one update, together with
+    the derived fields recomputed from the result.
+
+    Derived fields depend on the whole document, so they are computed from a
+    snapshot and the update only applies while the log is still at that
+    snapshot's revision. An update that lost a race to another write is
+    recomputed from the newer document and retried, or fails with 412 when the
+    client asked for a specific revision.
     """
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=0.5*inch, rightMargin=0.5*inch, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    story = []
-    
-    # Helper function to safely get string values
-    def safe_str(value, default="Not specified"):
-        if value is None:
-            return default
-        return str(value)
-    
-    # Get styles
-    styles = getSampleStyleSheet()
-    
-    # Modern color scheme
-    primary_color = colors.HexColor('#1e40af')  # Blue
-    secondary_color = colors.HexColor('#64748b')  # Gray
-    accent_color = colors.HexColor('#f59e0b')  # Amber
-    success_color = colors.HexColor('#059669')  # Green
-    danger_color = colors.HexColor('#dc2626')  # Red
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'ModernTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=20,
-        alignment=TA_CENTER,
-        textColor=primary_color,
-        fontName='Helvetica-Bold'
-    )
-    
-    section_style = ParagraphStyle(
-        'SectionTitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=8,
-        spaceBefore=15,
-        textColor=primary_color,
-        fontName='Helvetica-Bold'
-    )
-    
-    entry_style = ParagraphStyle(
-        'EntryTitle',
-        parent=styles['Heading3'],
-        fontSize=12,
-        spaceAfter=6,
-        spaceBefore=10,
-        textColor=colors.HexColor('#7c3aed'),
-        fontName='Helvetica-Bold'
-    )
-    
-    label_style = ParagraphStyle(
-        'Label',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=secondary_color,
-        fontName='Helvetica-Bold'
-    )
-    
-    value_style = ParagraphStyle(
-        'Value',
-        parent=styles['Normal'],
-        fontSize=11,
-        textColor=colors.black,
-        fontName='Helvetica'
-    )
-    
-    normal_style = ParagraphStyle(
-        'Normal',
-        parent=styles['Normal'],
-        fontSize=10,
-        fontName='Helvetica'
-    )
-    
-    # Header with logo-like design
-    header_data = [
-        [Paragraph("✈️ AIRCRAFT MAINTENANCE LOG", title_style)]
-    ]
-    header_table = Table(header_data, colWidths=[7*inch])
-    header_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
-        ('ROUNDEDCORNERS', (0, 0), (-1, -1), 10),
-        ('LEFTPADDING', (0, 0), (-1, -1), 20),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 20),
-        ('TOPPADDING', (0, 0), (-1, -1), 15),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
-    ]))
-    story.append(header_table)
-    story.append(Spacer(1, 15))
-    
-    # Get structured data safely
-    structured_data = log_data.get("structured_data", {})
-    log_entries = structured_data.get("log_entries", [])
-    
-    # Aircraft Information - Compact 2-column layout
-    aircraft_info = [
-        [
-            Paragraph("Aircraft Registration", label_style),
-            Paragraph(safe_str(structured_data.get("aircraft_registration")), value_style)
-        ],
-        [
-            Paragraph("Make/Model", label_style),
-            Paragraph(safe_str(structured_data.get("aircraft_make_model")), value_style)
-        ],
-    ]
-    
-    aircraft_table = Table(aircraft_info, colWidths=[2.5*inch, 4.5*inch])
-    aircraft_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-        ('TEXTCOLOR', (0, 0), (0, -1), secondary_color),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 12),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-        ('ROUNDEDCORNERS', (0, 0), (-1, -1), 5),
-    ]))
-    story.append(aircraft_table)
-    story.append(Spacer(1, 15))
-    
-    # Process each log entry
-    for i, entry in enumerate(log_entries, 1):
-        # Entry header
-        story.append(Paragraph(f"Entry #{i}", entry_style))
-        
-        # Entry details in two columns
-        left_column = []
-        right_column = []
-        
-        # Work Description - Full width
-        work_desc = safe_str(entry.get("description_of_work_performed"))
-        if work_desc and work_desc != "Not specified":
-            work_table_data = [[Paragraph(work_desc, normal_style)]]
-            work_table = Table(work_table_data, colWidths=[7*inch])
-            work_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#fef3c7')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 15),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 15),
-                ('TOPPADDING', (0, 0), (-1, -1), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-                ('ROUNDEDCORNERS', (0, 0), (-1, -1), 5),
-            ]))
-            story.append(work_table)
-            story.append(Spacer(1, 10))
-        
-        # Reason for Maintenance - Full width
-        reason_for_maintenance = safe_str(entry.get("reason_for_maintenance"))
-        if reason_for_maintenance and reason_for_maintenance != "Not specified":
-            reason_table_data = [[Paragraph(reason_for_maintenance, normal_style)]]
-            reason_table = Table(reason_table_data, colWidths=[7*inch])
-            reason_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#dbeafe')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 15),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 15),
-                ('TOPPADDING', (0, 0), (-1, -1), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-                ('ROUNDEDCORNERS', (0, 0), (-1, -1), 5),
-            ]))
-            story.append(reason_table)
-            story.append(Spacer(1, 10))
-        
-        # Technician Information
-        tech_info = [
-            [Paragraph("Performed By", label_style), Paragraph(safe_str(entry.get("performed_by")), value_style)],
-            [Paragraph("License Number", label_style), Paragraph(safe_str(entry.get("license_number")), value_style)],
-            [Paragraph("Date", label_style), Paragraph(safe_str(entry.get("date")), value_style)],
-            [Paragraph("Tach Time", label_style), Paragraph(safe_str(entry.get("tach_time")), value_style)],
-            [Paragraph("Hobbs Time", label_style), Paragraph(safe_str(entry.get("hobbs_time")), value_style)],
-        ]
-        tech_table = Table(tech_info, colWidths=[1.8*inch, 2.2*inch])
-        tech_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-            ('TEXTCOLOR', (0, 0), (0, -1), secondary_color),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-            ('ROUNDEDCORNERS', (0, 0), (-1, -1), 3),
-        ]))
-        left_column.append(Paragraph("Technician Info", section_style))
-        left_column.append(tech_table)
-        left_column.append(Spacer(1, 10))
-        
-        # Risk Assessment
-        risk_level = safe_str(entry.get("risk_level"))
-        urgency = safe_str(entry.get("urgency"))
-        is_airworthy = entry.get("is_airworthy", False)
-        
-        risk_info = [
-            [Paragraph("Risk Level", label_style), Paragraph(risk_level, value_style)],
-            [Paragraph("Urgency", label_style), Paragraph(urgency, value_style)],
-            [Paragraph("Airworthy", label_style), Paragraph("Yes" if is_airworthy else "No", value_style)],
-        ]
-        risk_table = Table(risk_info, colWidths=[1.8*inch, 2.2*inch])
-        risk_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-            ('TEXTCOLOR', (0, 0), (0, -1), secondary_color),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-            ('ROUNDEDCORNERS', (0, 0), (-1, -1), 3),
-        ]))
-        right_column.append(Paragraph("Risk Assessment", section_style))
-        right_column.append(risk_table)
-        right_column.append(Spacer(1, 10))
-        
-        # Compliance Information
-        compliance_info = [
-            [Paragraph("AD Compliance", label_style), Paragraph(safe_str(entry.get("ad_compliance")), value_style)],
-            [Paragraph("Next Due", label_style), Paragraph(safe_str(entry.get("next_due_compliance")), value_style)],
-            [Paragraph("Service Bulletin", label_style), Paragraph(safe_str(entry.get("service_bulletin_reference")), value_style)],
-            [Paragraph("Manual Ref", label_style), Paragraph(safe_str(entry.get("manual_reference")), value_style)],
-        ]
-        compliance_table = Table(compliance_info, colWidths=[1.8*inch, 2.2*inch])
-        compliance_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-            ('TEXTCOLOR', (0, 0), (0, -1), secondary_color),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-            ('ROUNDEDCORNERS', (0, 0), (-1, -1), 3),
-        ]))
-        left_column.append(Paragraph("Compliance", section_style))
-        left_column.append(compliance_table)
-        left_column.append(Spacer(1, 10))
-        
-        # Part Numbers
-        part_numbers = entry.get("part_number_replaced", [])
-        if part_numbers and isinstance(part_numbers, list) and len(part_numbers) > 0:
-            parts_text = "<br/>".join([f"• {safe_str(part)}" for part in part_numbers])
-            parts_para = Paragraph(parts_text, normal_style)
-            parts_table_data = [[parts_para]]
-            parts_table = Table(parts_table_data, colWidths=[4*inch])
-            parts_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#fef3c7')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 8),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('ROUNDEDCORNERS', (0, 0), (-1, -1), 3),
-            ]))
-            right_column.append(Paragraph("Parts Replaced", section_style))
-            right_column.append(parts_table)
-            right_column.append(Spacer(1, 10))
-        
-        # Combine left and right columns for this entry
-        if left_column and right_column:
-            combined_data = [[left_column, right_column]]
-            combined_table = Table(combined_data, colWidths=[3.5*inch, 3.5*inch])
-            combined_table.setStyle(TableStyle([
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('LEFTPADDING', (0, 0), (0, -1), 0),
-                ('RIGHTPADDING', (1, 0), (1, -1), 0),
-            ]))
-            story.append(combined_table)
-        
-        # Certification Statement - Full width at bottom of entry
-        cert_statement = safe_str(entry.get("certification_statement"))
-        if cert_statement and cert_statement != "Not specified":
-            story.append(Spacer(1, 10))
-            cert_table_data = [[Paragraph(cert_statement, normal_style)]]
-            cert_table = Table(cert_table_data, colWidths=[7*inch])
-            cert_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#ecfdf5')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 15),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 15),
-                ('TOPPADDING', (0, 0), (-1, -1), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-                ('ROUNDEDCORNERS', (0, 0), (-1, -1), 5),
-            ]))
-            story.append(cert_table)
-        
-        # Add separator between entries (except for last entry)
-        if i < len(log_entries):
-            story.append(Spacer(1, 20))
-            story.append(Paragraph("─" * 50, ParagraphStyle(
-                'Separator',
-                parent=styles['Normal'],
-                fontSize=8,
-                alignment=TA_CENTER,
-                textColor=secondary_color
-            )))
-            story.append(Spacer(1, 20))
-    
-    # Footer
-    story.append(Spacer(1, 20))
-    footer_text = f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Aircraft Maintenance Log System"
-    story.append(Paragraph(footer_text, ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        alignment=TA_CENTER,
-        textColor=secondary_color
-    )))
+    for attempt in range(ENTRY_PATCH_ATTEMPTS):
+        doc = await collection.find_one({"_id": ObjectId(log_id)}, {"structured_data": 1, "revision": 1})
+        if doc is None:
+            raise HTTPException(status_code=404, detail="Maintenance log not found")
+        revision = doc.get("revision") or 0
+        if expected is not None and revision != expected:
+            raise HTTPException(status_code=412, detail="Maintenance log was modified by another request")
+        
+        structured_data = doc.get("structured_data") or {}
+        entries = list(structured_data.get("log_entries") or [])
+        if any(entry_index >= len(entries) for entry_index in entry_changes):
+            raise HTTPException(status_code=404, detail="Maintenance log entry not found")
+        for entry_index, changes in entry_changes.items():
+            entries[entry_index] = {**entries[entry_index], **changes}
+        derived = build_derived_fields({**structured_data, "log_entries": entries})
+        
+        # Positional paths touch only the changed fields of each entry
+        changed_fields = {
+            f"structured_data.log_entries.{entry_index}.{field}": value
+            for entry_index, changes in entry_changes.items()
+            for field, value in changes.items()
+        }
+        updated_doc = await collection.find_one_and_update(
+            {"_id": doc["_id"], "revision": revision_filter(revision)},
+            {
+                "$set": {**changed_fields, **derived},
+                "$inc": {"revision": 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if updated_doc is not None:
+            return updated_doc
+        print(f"🔄 Log {log_id} changed during the update, retrying ({attempt + 1}/{ENTRY_PATCH_ATTEMPTS})")
     
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+    raise HTTPException(status_code=409, detail="Maintenance log is being modified by other requests, try again")
+
+@router.patch("/logs/{log_id}/entries/{entry_index}", response_model=MaintenanceLog, response_class=FastJSONResponse)
+async def update_log_entry(log_id: str, entry_index: int, entry_update: LogEntryUpdate, if_match: Optional[str] = Header(None)):
+    """
+    Update individual fields of one log entry, writing only the fields that were sent
+    """
+    print(f"=== UPDATE LOG ENTRY START === Log ID: {log_id}, Entry: {entry_index}")
+    try:
+        # Validate ObjectId
+        if not ObjectId.is_valid(log_id):
+            raise HTTPException(status_code=400, detail="Invalid log ID format")
+        if entry_index < 0:
+            raise HTTPException(status_code=400, detail="Invalid entry index")
+        
+        changes = entry_update.model_dump(exclude_unset=True)
+        if not changes:
+            raise HTTPException(status_code=400, detail="No fields to update")
+        print(f"📝 Changed fields: {list(changes.keys())}")
+        
+        expected = expected_revision(if_match, log_id)
+        
+        collection = Database.get_collection()
+        updated_doc = await patch_log_entries(collection, log_id, {entry_index: changes}, expected)
+        
+        revision = await bump_collection_revision(Database.get_meta_collection())
+        etag = log_etag(log_id, updated_doc["revision"], updated_doc.get("image_revision"))
+        
+        updated_doc["_id"] = str(updated_doc["_id"])
+        local_index.on_write(updated_doc, revision)
+        await sync_aircraft_state(updated_doc)
+        await invalidate_pdf_cache(log_id)
+        # The changed fields were validated as LogEntryUpdate on the way in
+        content = stored_logs.dump(updated_doc)
+        print(f"✅ Entry update completed successfully")
+        print(f"📝 Response data:")
+        print(f"   - Log ID: {updated_doc['_id']}")
+        print(f"   - Entry index: {entry_index}")
+        print(f"   - Updated fields: {list(changes.keys())}")
+        
+        return Response(content=content, media_type="application/json", headers={"ETag": etag})
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating entry {entry_index} of log {log_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to update log entry: {str(e)}")
+
+@router.patch("/logs/{log_id}/entries", response_model=MaintenanceLog, response_class=FastJSONResponse)
+async def update_log_entries(log_id: str, entries_update: LogEntriesUpdate, if_match: Optional[str] = Header(None)):
+    """
+    Update individual fields of several log entries in one write: all of the edits apply or none do
+    """
+    print(f"=== UPDATE LOG ENTRIES START === Log ID: {log_id}, Entries: {sorted(entries_update.entries)}")
+    try:
+        # Validate ObjectId
+        if not ObjectId.is_valid(log_id):
+            raise HTTPException(status_code=400, detail="Invalid log ID format")
+        if any(entry_index < 0 for entry_index in entries_update.entries):
+            raise HTTPException(status_code=400, detail="Invalid entry index")
+        
+        entry_changes = {
+            entry_index: changes
+            for entry_index, changes in ((entry_index, update.model_dump(exclude_unset=True)) for entry_index, update in entries_update.entries.items())
+            if changes
+        }
+        if not entry_changes:
+            raise HTTPException(status_code=400, detail="No fields to update")
+        for entry_index, changes in sorted(entry_changes.items()):
+            print(f"📝 Entry {entry_index} changed fields: {list(changes.keys())}")
+        
+        expected = expected_revision(if_match, log_id)
+        
+        collection = Database.get_collection()
+        updated_doc = await patch_log_entries(collection, log_id, entry_changes, expected)
+        
+        revision = await bump_collection_revision(Database.get_meta_collection())
+        etag = log_etag(log_id, updated_doc["revision"], updated_doc.get("image_revision"))
+        
+        updated_doc["_id"] = str(updated_doc["_id"])
+        local_index.on_write(updated_doc, revision)
+        await sync_aircraft_state(updated_doc)
+        await invalidate_pdf_cache(log_id)
+        # The changed fields were validated as LogEntryUpdate on the way in
+        content = stored_logs.dump(updated_doc)
+        print(f"✅ Entries update completed successfully")
+        print(f"📝 Response data:")
+        print(f"   - Log ID: {updated_doc['_id']}")
+        print(f"   - Updated entries: {sorted(entry_changes)}")
+        
+        return Response(content=content, media_type="application/json", headers={"ETag": etag})
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating entries of log {log_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to update log entries: {str(e)}")
 
 @router.post("/logs/{log_id}/export")
 async def export_log(log_id: str, export_request: ExportRequest):
@@ -689,16 +648,34 @@ async def export_log(log_id: str, export_request: ExportRequest):
             print(f"   - Log ID: {log_id}")
             print(f"   - Content type: application/json")
             print(f"   - Filename: maintenance_log_{log_id}.json")
-            return JSONResponse(
-                content=doc,
+            # The log as GET /logs/{log_id} returns it, without the derived index fields
+            return Response(
+                content=stored_logs.dump(doc),
                 media_type="application/json",
                 headers={"Content-Disposition": f"attachment; filename=maintenance_log_{log_id}.json"}
             )
         
         elif export_request.format.lower() == "pdf":
+            headers = {"Content-Disposition": f"attachment; filename=maintenance_log_{log_id}.pdf"}
+            blob_store = get_blob_store()
+            cache_collection = Database.get_pdf_cache_collection()
+            cache_key = pdf_cache_key(doc.get("structured_data"))
+            
+            # Unchanged logs are served straight from the cache
+            cached = await read_cached_pdf(blob_store, cache_collection, cache_key, log_id)
+            if cached is not None:
+                print(f"✅ PDF cache hit: {cache_key}")
+                print(f"   - PDF size: {len(cached)} bytes")
+                return Response(content=cached, media_type=PDF_CONTENT_TYPE, headers=headers)
+            
             # Generate PDF
-            print(f"📄 Generating PDF report")
-            pdf_buffer = generate_maintenance_log_pdf(doc)
+            print(f"📄 Generating PDF report (cache miss: {cache_key})")
+            try:
+                pdf_bytes = await pdf_pool.run(render_pdf, pdf_document(doc))
+            except PoolSaturated as e:
+                print(f"⚠️ PDF workers saturated: {e}")
+                raise HTTPException(status_code=429, detail="Too many PDF exports in progress, retry shortly", headers={"Retry-After": "1"})
+            await store_pdf(blob_store, cache_collection, cache_key, log_id, pdf_bytes)
             
             print(f"✅ PDF generated successfully")
             print(f"📝 Response data:")
@@ -706,11 +683,12 @@ async def export_log(log_id: str, export_request: ExportRequest):
             print(f"   - Log ID: {log_id}")
             print(f"   - Content type: application/pdf")
             print(f"   - Filename: maintenance_log_{log_id}.pdf")
-            print(f"   - PDF size: {len(pdf_buffer.getvalue())} bytes")
+            print(f"   - PDF size: {len(pdf_bytes)} bytes")
+            headers["Content-Length"] = str(len(pdf_bytes))
             return StreamingResponse(
-                BytesIO(pdf_buffer.getvalue()),
-                media_type="application/pdf",
-                headers={"Content-Disposition": f"attachment; filename=maintenance_log_{log_id}.pdf"}
+                BytesIO(pdf_bytes),
+                media_type=PDF_CONTENT_TYPE,
+                headers=headers
             )
         
         else:
@@ -725,8 +703,295 @@ async def export_log(log_id: str, export_request: ExportRequest):
         logger.error(f"Error exporting log {log_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to export log: {str(e)}")
 
+def log_filter_conditions(registration, match, since, until):
+    """Query conditions shared by the bulk endpoints: aircraft registration and upload time range"""
+    conditions = []
+    if registration:
+        conditions.append(registration_query(registration, match))
+    if since or until:
+        timestamp_range = {}
+        if since:
+            timestamp_range["$gte"] = since
+        if until:
+            timestamp_range["$lt"] = until
+        conditions.append({"timestamp": timestamp_range})
+    return conditions
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+EXPORT_EXTENSIONS = {"arrow": "arrows"}
+
+@router.get("/export/logs")
+async def bulk_export_logs(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet|arrow)$", description="One row per log entry as NDJSON, CSV, or a typed Parquet / Arrow IPC stream"),
+    registration: Optional[str] = Query(None, description="Only logs for this aircraft registration"),
+    match: str = Query("exact", pattern="^(exact|prefix)$", description="Match the whole registration or a prefix of it"),
+    since: Optional[datetime] = Query(None, description="Only logs uploaded at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only logs uploaded before this time"),
+    cursor: Optional[str] = Query(None, description="Resume after the row carrying this cursor token")
+):
+    """
+    Stream every matching log entry, with its log's aircraft fields repeated on each row
+    """
+    columnar = format in ("parquet", "arrow")
+    print(f"=== BULK EXPORT START === Format: {format}, Registration: {registration}, Match: {match}, Since: {since}, Until: {until}, Resuming: {bool(cursor)}")
+    try:
+        conditions = log_filter_conditions(registration, match, since, until)
+
+        after = None
+        if cursor:
+            if columnar:
+                raise HTTPException(status_code=400, detail="Resuming with a cursor is only supported for ndjson and csv exports")
+            try:
+                after = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            conditions.append(resume_filter(after[0], after[1]))
+
+        query = {"$and": conditions} if conditions else {}
+        print(f"📝 Export query: {query}")
+
+        collection = Database.get_collection()
+        # (timestamp, _id) order is index-backed, so the cursor streams instead of sorting in memory
+        projection = COLUMNAR_PROJECTION if columnar else EXPORT_PROJECTION
+        db_cursor = collection.find(query, projection).sort(EXPORT_SORT).batch_size(EXPORT_BATCH_SIZE)
+
+        if columnar:
+            # Parquet/Arrow encoding is CPU-bound, so each record batch is written in a worker thread
+            encoded = stream_columnar(db_cursor, format, run_sync=run_in_threadpool)
+        else:
+            encoded = stream_export(db_cursor, format, after)
+
+        async def chunks():
+            rows = 0
+            try:
+                async for chunk in encoded:
+                    rows += 1
+                    yield chunk
+                print(f"✅ Bulk export completed: {rows} chunks streamed")
+            except Exception as e:
+                # Headers are already sent; the client resumes from the last cursor it received
+                print(f"❌ ERROR during bulk export stream after {rows} chunks: {e}")
+                logger.error(f"Error streaming bulk export: {e}")
+                raise
+            finally:
+                await db_cursor.close()
+
+        media_type = EXPORT_MEDIA_TYPES[format]
+        filename = f"maintenance_log_entries.{EXPORT_EXTENSIONS.get(format, format)}"
+        return StreamingResponse(
+            chunks(),
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ ERROR in bulk_export_logs: {e}")
+        import traceback
+        print(f"❌ ERROR traceback: {traceback.format_exc()}")
+        logger.error(f"Error starting bulk export: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to export logs: {str(e)}")
+
+@router.get("/export/report")
+async def export_report(
+    registration: Optional[str] = Query(None, description="Only logs for this aircraft registration (the whole fleet when omitted)"),
+    match: str = Query("exact", pattern="^(exact|prefix)$", description="Match the whole registration or a prefix of it"),
+    since: Optional[datetime] = Query(None, description="Only logs uploaded at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only logs uploaded before this time")
+):
+    """
+    One PDF of every matching log, oldest first, with a table of contents
+    """
+    print(f"=== REPORT EXPORT START === Registration: {registration}, Match: {match}, Since: {since}, Until: {until}")
+    directory = None
+    try:
+        conditions = log_filter_conditions(registration, match, since, until)
+        query = {"$and": conditions} if conditions else {}
+        print(f"📝 Report query: {query}")
+
+        collection = Database.get_collection()
+        db_cursor = collection.find(query, REPORT_PROJECTION).sort(REPORT_SORT).batch_size(REPORT_BATCH_SIZE)
+
+        # Logs are spooled to disk and the PDF is written there too, so memory does not grow with the report
+        directory = await asyncio.to_thread(tempfile.mkdtemp, prefix="maintenance_report_")
+        spool_path = os.path.join(directory, "logs.jsonl")
+        pdf_path = os.path.join(directory, "report.pdf")
+        try:
+            log_count = await spool_logs(db_cursor, spool_path)
+        finally:
+            await db_cursor.close()
+
+        if not log_count:
+            raise HTTPException(status_code=404, detail="No maintenance logs match the report filters")
+
+        if not registration:
+            title = "Fleet Maintenance Report"
+        else:
+            title = f"Aircraft {registration.upper()}{'' if match == 'exact' else '*'} Maintenance Report"
+
+        print(f"📄 Rendering report of {log_count} logs")
+        try:
+            pages = await pdf_pool.run(render_report, spool_path, pdf_path, title, log_count)
+        except PoolSaturated as e:
+            print(f"⚠️ PDF workers saturated: {e}")
+            raise HTTPException(status_code=429, detail="Too many PDF exports in progress, retry shortly", headers={"Retry-After": "1"})
+        size = await asyncio.to_thread(os.path.getsize, pdf_path)
+
+        print(f"✅ Report generated successfully")
+        print(f"📝 Response data:")
+        print(f"   - Logs: {log_count}")
+        print(f"   - Pages: {pages}")
+        print(f"   - PDF size: {size} bytes")
+
+        filename = f"maintenance_report_{registration_key(registration)}.pdf" if registration else "maintenance_report_fleet.pdf"
+        response = StreamingResponse(
+            stream_report(directory, pdf_path),
+            media_type=PDF_CONTENT_TYPE,
+            headers={"Content-Disposition": content_disposition(filename), "Content-Length": str(size)}
+        )
+        # The stream removes the directory once the file has been sent
+        directory = None
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ ERROR in export_report: {e}")
+        import traceback
+        print(f"❌ ERROR traceback: {traceback.format_exc()}")
+        logger.error(f"Error exporting report: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to export report: {str(e)}")
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+@router.get("/export/bundle")
+async def export_bundle(
+    registration: str = Query(..., description="Aircraft registration whose records to bundle"),
+    match: str = Query("exact", pattern="^(exact|prefix)$", description="Match the whole registration or a prefix of it"),
+    since: Optional[datetime] = Query(None, description="Only logs uploaded at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only logs uploaded before this time")
+):
+    """
+    Stream a ZIP with every matching log as JSON, PDF and its scanned image
+    """
+    print(f"=== BUNDLE EXPORT START === Registration: {registration}, Match: {match}, Since: {since}, Until: {until}")
+    try:
+        conditions = log_filter_conditions(registration, match, since, until)
+        query = {"$and": conditions}
+        print(f"📝 Bundle query: {query}")
+
+        collection = Database.get_collection()
+        # Checked before streaming: once the ZIP has started there is no status code left to send
+        if not await collection.find_one(query, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="No maintenance logs match the bundle filters")
+
+        db_cursor = collection.find(query).sort(BUNDLE_SORT).batch_size(BUNDLE_BATCH_SIZE)
+        root = f"maintenance_records_{registration_key(registration)}"
+        bundle = stream_bundle(db_cursor, get_blob_store(), Database.get_pdf_cache_collection(), root)
+
+        async def chunks():
+            sent = 0
+            try:
+                async for chunk in bundle:
+                    sent += len(chunk)
+                    yield chunk
+                print(f"✅ Bundle export completed: {sent} bytes streamed")
+            except BundleAborted as e:
+                # Headers are already sent; ending the stream early leaves the client a truncated ZIP
+                print(f"⚠️ Bundle export aborted after {sent} bytes: {e}")
+                raise
+            except Exception as e:
+                # Headers are already sent; the client sees a truncated ZIP
+                print(f"❌ ERROR during bundle export stream after {sent} bytes: {e}")
+                logger.error(f"Error streaming bundle export: {e}")
+                raise
+            finally:
+                await bundle.aclose()
+                await db_cursor.close()
+
+        return StreamingResponse(
+            chunks(),
+            media_type="application/zip",
+            headers={"Content-Disposition": content_disposition(f"{root}.zip")}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ ERROR in export_bundle: {e}")
+        import traceback
+        print(f"❌ ERROR traceback: {traceback.format_exc()}")
+        logger.error(f"Error starting bundle export: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to export bundle: {str(e)}")
+
+@router.get("/analytics/entries", response_model=AnalyticsResponse)
+async def get_entry_analytics(
+    registration: Optional[str] = Query(None, description="Only logs for this aircraft registration"),
+    match: str = Query("exact", pattern="^(exact|prefix)$", description="Match the whole registration or a prefix of it"),
+    since: Optional[datetime] = Query(None, description="Only logs uploaded at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only logs uploaded before this time"),
+    risk_level: Optional[str] = Query(None, description="Only entries with this risk level"),
+    urgency: Optional[str] = Query(None, description="Only entries with this urgency"),
+    is_airworthy: Optional[bool] = Query(None, description="Only entries with this airworthiness"),
+    country: Optional[str] = Query(None, description="Only aircraft registered in this country (as in by_country)"),
+    top_aircraft: int = Query(50, ge=1, le=1000, description="Maximum number of aircraft in by_aircraft")
+):
+    """
+    Count log entries by risk level, urgency, airworthiness, aircraft, make/model, registration country and month of the work
+    """
+    print(f"=== ENTRY ANALYTICS START === Registration: {registration}, Country: {country}, Since: {since}, Until: {until}, Risk: {risk_level}, Urgency: {urgency}, Airworthy: {is_airworthy}")
+    try:
+        conditions = log_filter_conditions(registration, match, since, until)
+        if country:
+            conditions.append({"registration_country": country})
+        document_query = {"$and": conditions} if conditions else {}
+        filters = {"risk_level": risk_level, "urgency": urgency, "is_airworthy": is_airworthy}
+        pipeline = build_analytics_pipeline(document_query, filters, top_aircraft)
+
+        collection = Database.get_collection()
+        # One $facet result document; the grouping runs inside MongoDB
+        results = await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=1)
+        facets = results[0] if results else {}
+
+        totals = (facets.get("totals") or [{}])[0]
+        analytics = AnalyticsResponse(
+            total_entries=totals.get("entries", 0),
+            total_aircraft=totals.get("aircraft", 0),
+            by_risk_level=facets.get("by_risk_level", []),
+            by_urgency=facets.get("by_urgency", []),
+            by_airworthy=facets.get("by_airworthy", []),
+            by_make_model=facets.get("by_make_model", []),
+            by_country=facets.get("by_country", []),
+            by_month=facets.get("by_month", []),
+            by_aircraft=facets.get("by_aircraft", [])
+        )
+
+        print(f"✅ Entry analytics completed")
+        print(f"📝 Response data:")
+        print(f"   - Total entries: {analytics.total_entries}")
+        print(f"   - Total aircraft: {analytics.total_aircraft}")
+
+        return analytics
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ ERROR in get_entry_analytics: {e}")
+        import traceback
+        print(f"❌ ERROR traceback: {traceback.format_exc()}")
+        logger.error(f"Error computing entry analytics: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute analytics: {str(e)}")
+
 @router.delete("/logs/{log_id}")
-async def delete_log(log_id: str):
+async def delete_log(log_id: str, if_match: Optional[str] = Header(None)):
     """
     Delete a maintenance log
     """
@@ -740,22 +1005,32 @@ async def delete_log(log_id: str):
         
         print(f"✅ ObjectId validation passed")
         
+        expected = expected_revision(if_match, log_id)
+        log_filter = {"_id": ObjectId(log_id)}
+        if expected is not None:
+            log_filter["revision"] = revision_filter(expected)
+        
         collection = Database.get_collection()
         print(f"✅ Database collection obtained")
         
         print(f"🔄 Attempting to delete document with _id: {ObjectId(log_id)}")
-        result = await collection.delete_one({"_id": ObjectId(log_id)})
+        deleted = await collection.find_one_and_delete(log_filter, projection={"image_filename": 1, "image_archive": 1})
         
-        print(f"📝 Delete result: {result}")
-        print(f"📝 Deleted count: {result.deleted_count}")
+        print(f"📝 Deleted document: {deleted}")
         
-        if result.deleted_count == 0:
+        if deleted is None:
             print(f"❌ No document found to delete")
-            raise HTTPException(status_code=404, detail="Maintenance log not found")
-        
+            await raise_not_found_or_modified(collection, log_id, expected)
+        
+        revision = await bump_collection_revision(Database.get_meta_collection())
+        local_index.on_delete(log_id, revision)
+        await drop_aircraft_state(log_id)
+        await invalidate_pdf_cache(log_id)
+        await delete_log_image(deleted.get("image_filename"))
+        await delete_log_image(retained_original(deleted))
         print(f"✅ Document deleted successfully")
         print(f"📝 Response data:")
-        print(f"   - Deleted count: {result.deleted_count}")
+        print(f"   - Deleted count: 1")
         print(f"   - Message: Maintenance log deleted successfully")
         
         return {"message": "Maintenance log deleted successfully"}
@@ -770,23 +1045,207 @@ async def delete_log(log_id: str):
         logger.error(f"Error deleting log {log_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to delete log: {str(e)}")
 
+@router.get("/aircraft/{aircraft_registration}/state", response_model=AircraftState)
+async def get_aircraft_state(aircraft_registration: str):
+    """
+    Current state of one aircraft: entry timeline, latest tach/hobbs, last annual,
+    outstanding next-due items and airworthiness, from its materialized document
+    """
+    print(f"=== GET AIRCRAFT STATE START === Aircraft: {aircraft_registration}")
+    try:
+        key = registration_key(aircraft_registration)
+        if not key:
+            raise HTTPException(status_code=400, detail="Invalid aircraft registration")
+
+        state = await Database.get_aircraft_collection().find_one({"_id": key})
+        if not state:
+            raise HTTPException(status_code=404, detail="No maintenance logs for this aircraft")
+
+        # The timeline lives one document per entry next to the summary
+        timeline = await Database.get_aircraft_timeline_collection().find({"registration_key": key}).sort(TIMELINE_SORT).to_list(None)
+        aircraft_state = AircraftState(**state, timeline=timeline)
+        print(f"✅ Aircraft state found")
+        print(f"📝 Response data:")
+        print(f"   - Registration key: {aircraft_state.registration_key}")
+        print(f"   - Logs: {aircraft_state.log_count}, Entries: {aircraft_state.entry_count}")
+        print(f"   - Current tach: {aircraft_state.current_tach_time}")
+
+        return aircraft_state
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ ERROR in get_aircraft_state: {e}")
+        import traceback
+        print(f"❌ ERROR traceback: {traceback.format_exc()}")
+        logger.error(f"Error reading aircraft state for {aircraft_registration}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get aircraft state: {str(e)}")
+
+@router.get("/due/", response_model=List[DueItem])
+async def get_items_coming_due(
+    within_hours: Optional[float] = Query(None, ge=0, description="Items due within this many tach hours of the aircraft's current tach"),
+    within_days: Optional[int] = Query(None, ge=0, description="Items due within this many days from today"),
+    registration: Optional[str] = Query(None, description="Only this aircraft"),
+    limit: int = Query(500, ge=1, le=5000)
+):
+    """
+    Every outstanding next-due item in the fleet coming due within N hours or days, most urgent (and overdue) first
+    """
+    print(f"=== DUE ITEMS START === Within hours: {within_hours}, Within days: {within_days}, Registration: {registration}")
+    try:
+        if within_hours is None and within_days is None:
+            raise HTTPException(status_code=400, detail="Give within_hours and/or within_days")
+
+        today = date.today()
+        query = due_query(within_hours, within_days, today)
+        if registration:
+            key = registration_key(registration)
+            if not key:
+                raise HTTPException(status_code=400, detail="Invalid aircraft registration")
+            query = {"_id": key, **query}
+
+        # Only aircraft with something due are read, through the outstanding_items indexes
+        items = []
+        async for state in Database.get_aircraft_collection().find(query, DUE_PROJECTION):
+            items.extend(due_items(state, within_hours, within_days, today))
+
+        items.sort(key=lambda item: (item["urgency"], item["registration_key"]))
+        items = items[:limit]
+
+        print(f"✅ Due items computed")
+        print(f"📝 Response data:")
+        print(f"   - Number of items: {len(items)}")
+        print(f"   - Overdue: {sum(1 for item in items if item['overdue'])}")
+
+        return items
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ ERROR in get_items_coming_due: {e}")
+        import traceback
+        print(f"❌ ERROR traceback: {traceback.format_exc()}")
+        logger.error(f"Error listing items coming due: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to list items coming due: {str(e)}")
+
+@router.get("/compliance/{kind}/{reference:path}", response_model=ComplianceResponse)
+async def get_reference_compliance(
+    kind: str = PathParam(..., pattern="^(ad|sb)$", description="'ad' for an airworthiness directive, 'sb' for a service bulletin"),
+    reference: str = PathParam(..., description="AD or SB number, e.g. 2023-15-02"),
+    make_model: Optional[str] = Query(None, description="Only aircraft whose make/model contains this text, e.g. the AD's applicability")
+):
+    """
+    Every aircraft with a log entry recording compliance with an AD or SB and its
+    latest compliance date, plus the aircraft without one as gaps
+    """
+    print(f"=== REFERENCE COMPLIANCE START === Kind: {kind}, Reference: {reference}, Make/model: {make_model}")
+    try:
+        reference_type = REFERENCE_AD if kind == "ad" else REFERENCE_SB
+        key = reference_key(reference_type, reference)
+        if not key:
+            raise HTTPException(status_code=400, detail=f"Invalid {reference_type} number")
+        print(f"📝 Canonical {reference_type} number: {key}")
+
+        reference_match = {"references.type": reference_type, "references.id": key}
+        pipeline = [
+            {"$match": {"references": {"$elemMatch": {"type": reference_type, "id": key}}}},
+            {"$project": {
+                "registration_key": 1,
+                "timestamp": 1,
+                "references": 1,
+            }},
+            {"$unwind": "$references"},
+            {"$match": reference_match},
+            # Per aircraft, the newest entry recording compliance comes first
+            {"$sort": {"references.complied": -1, "references.date": -1, "timestamp": -1}},
+            {"$group": {
+                "_id": "$registration_key",
+                "log_id": {"$first": "$_id"},
+                "entry_index": {"$first": "$references.entry_index"},
+                "date": {"$first": "$references.date"},
+                "complied": {"$first": "$references.complied"},
+                "entries": {"$sum": 1},
+            }},
+        ]
+        matches = {}
+        async for row in Database.get_collection().aggregate(pipeline):
+            if row["_id"]:
+                matches[row["_id"]] = row
+
+        # The fleet is every aircraft with a materialized state document
+        complied, gaps = [], []
+        needle = make_model.lower() if make_model else None
+        async for aircraft in Database.get_aircraft_collection().find({}, {"aircraft_registration": 1, "aircraft_make_model": 1}).sort("_id", 1):
+            if needle and needle not in (aircraft.get("aircraft_make_model") or "").lower():
+                continue
+            fields = {
+                "registration_key": aircraft["_id"],
+                "aircraft_registration": aircraft.get("aircraft_registration"),
+                "aircraft_make_model": aircraft.get("aircraft_make_model"),
+            }
+            row = matches.get(aircraft["_id"])
+            if row and row["complied"]:
+                complied.append({
+                    **fields,
+                    "latest_compliance_date": row.get("date"),
+                    "log_id": str(row["log_id"]),
+                    "entry_index": row["entry_index"],
+                    "entries": row["entries"],
+                })
+            elif row:
+                gaps.append({**fields, "reason": "Log entries record this reference as not complied with"})
+            else:
+                gaps.append({**fields, "reason": "No log entry references this number"})
+
+        complied.sort(key=lambda item: item["latest_compliance_date"] or "", reverse=True)
+
+        print(f"✅ Reference compliance computed")
+        print(f"📝 Response data:")
+        print(f"   - Complied aircraft: {len(complied)}")
+        print(f"   - Gaps: {len(gaps)}")
+
+        return ComplianceResponse(type=reference_type, reference=key, complied=complied, gaps=gaps)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ ERROR in get_reference_compliance: {e}")
+        import traceback
+        print(f"❌ ERROR traceback: {traceback.format_exc()}")
+        logger.error(f"Error computing compliance for {kind} {reference}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute compliance: {str(e)}")
+
+def registration_query(aircraft_registration, match):
+    """Query on the normalized registration key, exact or anchored prefix"""
+    # Search on the normalized key so "n-123ab" finds "N123AB" through the index
+    search_key = registration_key(aircraft_registration)
+    if not search_key:
+        raise HTTPException(status_code=400, detail="Invalid aircraft registration")
+    print(f"📝 Registration search key: {search_key}")
+
+    if match == "exact":
+        return {"registration_key": search_key}
+    return {"registration_key": {"$regex": registration_prefix_pattern(search_key)}}
+
 @router.get("/logs/search/{aircraft_registration}")
-async def search_logs_by_aircraft(aircraft_registration: str):
+async def search_logs_by_aircraft(
+    aircraft_registration: str,
+    match: str = Query("prefix", pattern="^(exact|prefix)$", description="Match the whole registration or a prefix of it"),
+    limit: int = Query(50, ge=1, le=500),
+    skip: int = Query(0, ge=0),
+    ranges: dict = Depends(entry_range)
+):
     """
     Search maintenance logs by aircraft registration
     """
-    print(f"=== SEARCH LOGS START === Aircraft: {aircraft_registration}")
+    print(f"=== SEARCH LOGS START === Aircraft: {aircraft_registration}, Match: {match}, Limit: {limit}, Skip: {skip}")
     try:
+        query = {**registration_query(aircraft_registration, match), **entry_range_query(ranges)}
+
         collection = Database.get_collection()
-        cursor = collection.find({
-            "structured_data.aircraft_registration": {"$regex": aircraft_registration, "$options": "i"}
-        }).sort("timestamp", -1)
+        cursor = collection.find(query).sort("timestamp", -1).skip(skip).limit(limit)
         
-        logs = []
-        async for doc in cursor:
-            # Convert the _id to string for proper Pydantic validation
-            doc["_id"] = str(doc["_id"])
-            logs.append(MaintenanceLog(**doc))
+        logs = await cursor.to_list(length=None)
         
         print(f"✅ Search completed successfully")
         print(f"📝 Response data:")
@@ -794,12 +1253,14 @@ async def search_logs_by_aircraft(aircraft_registration: str):
         print(f"   - Number of results: {len(logs)}")
         for i, log in enumerate(logs):
             print(f"   - Result {i+1}:")
-            print(f"     * ID: {log.id}")
-            print(f"     * Aircraft: {log.structured_data.aircraft_registration if log.structured_data else 'Unknown'}")
-            print(f"     * Timestamp: {log.timestamp}")
-        
-        return logs
+            print(f"     * ID: {log['_id']}")
+            print(f"     * Aircraft: {(log.get('structured_data') or {}).get('aircraft_registration', 'Unknown')}")
+            print(f"     * Timestamp: {log.get('timestamp')}")
         
+        return Response(content=stored_logs.dump_many(logs), media_type="application/json")
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ ERROR in search_logs_by_aircraft: {e}")
         import traceback
@@ -807,43 +1268,231 @@ async def search_logs_by_aircraft(aircraft_registration: str):
         logger.error(f"Error searching logs for aircraft {aircraft_registration}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to search logs: {str(e)}")
 
+# Ranked log ids checked against the entry range filters per query
+RANKED_RANGE_BATCH_SIZE = 200
+
+async def ranked_in_range(collection, ranked, range_query, wanted):
+    """The first `wanted` logs of a ranking that pass the range filters, looked up a batch at a time"""
+    kept = []
+    for start in range(0, len(ranked), RANKED_RANGE_BATCH_SIZE):
+        batch = ranked[start:start + RANKED_RANGE_BATCH_SIZE]
+        in_range = set()
+        async for doc in collection.find({"_id": {"$in": [ObjectId(log_id) for log_id, _ in batch]}, **range_query}, {"_id": 1}):
+            in_range.add(str(doc["_id"]))
+        kept.extend((log_id, score) for log_id, score in batch if log_id in in_range)
+        if len(kept) >= wanted:
+            break
+    return kept[:wanted]
+
+@router.get("/search/", response_model=SearchResponse, response_class=FastJSONResponse)
+async def search_log_entries(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in work descriptions, reasons, AD/SB references and summaries"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of log documents per page"),
+    skip: int = Query(0, ge=0),
+    ranges: dict = Depends(entry_range)
+):
+    """
+    Full-text search across maintenance log entries, ranked and highlighted per entry
+    """
+    print(f"=== TEXT SEARCH START === Query: {q}, Limit: {limit}, Skip: {skip}")
+    try:
+        terms = query_terms(q)
+        if not terms:
+            raise HTTPException(status_code=400, detail="Search query has no searchable words")
+        print(f"📝 Search terms: {terms}")
+
+        collection = Database.get_collection()
+        projection = {"structured_data": 1, "timestamp": 1, "entry_values": 1}
+        range_query = entry_range_query(ranges)
+        hits = []
+        backend = "mongo-text"
+
+        if Database.text_search_available:
+            try:
+                cursor = collection.find(
+                    {"$text": {"$search": q}, **range_query},
+                    {**projection, "score": {"$meta": "textScore"}}
+                ).sort([("score", {"$meta": "textScore"})]).skip(skip).limit(limit)
+                async for doc in cursor:
+                    hits.extend(hits_in_range(doc, entry_hits(doc, terms, doc.get("score", 1.0), matched=True), ranges))
+            except OperationFailure as e:
+                print(f"⚠️ Text index query failed, falling back to in-process index: {e}")
+                Database.text_search_available = False
+
+        if not Database.text_search_available:
+            backend = "inverted-index"
+            # Built at startup; rebuilt here only after another process wrote to the collection
+            if await local_index.refresh(collection, Database.get_meta_collection()):
+                print(f"✅ In-process search index rebuilt: {len(local_index)} documents")
+
+            ranked = local_index.search(terms)
+            if range_query:
+                # The in-process index knows nothing about the typed values, so narrow the ranking first
+                ranked = await ranked_in_range(collection, ranked, range_query, skip + limit)
+            ranked = ranked[skip:skip + limit]
+            docs = {}
+            async for doc in collection.find({"_id": {"$in": [ObjectId(log_id) for log_id, _ in ranked]}}, projection):
+                docs[str(doc["_id"])] = doc
+            for log_id, score in ranked:
+                if log_id in docs:
+                    hits.extend(hits_in_range(docs[log_id], entry_hits(docs[log_id], terms, score), ranges))
+
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+
+        print(f"✅ Text search completed")
+        print(f"📝 Response data:")
+        print(f"   - Backend: {backend}")
+        print(f"   - Number of entry hits: {len(hits)}")
+
+        return SearchResponse(query=q, backend=backend, skip=skip, limit=limit, hits=hits)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ ERROR in search_log_entries: {e}")
+        import traceback
+        print(f"❌ ERROR traceback: {traceback.format_exc()}")
+        logger.error(f"Error searching log entries for '{q}': {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to search logs: {str(e)}")
+
+@router.get("/parts/{part_number:path}", response_model=List[PartInstallation])
+async def lookup_part_installations(
+    part_number: str,
+    match: str = Query("exact", pattern="^(exact|prefix)$", description="Match the whole part number or a prefix of it"),
+    limit: int = Query(100, ge=1, le=1000),
+    skip: int = Query(0, ge=0)
+):
+    """
+    Find every aircraft and log entry where a part number was replaced, newest first
+    """
+    print(f"=== PART LOOKUP START === Part: {part_number}, Match: {match}, Limit: {limit}, Skip: {skip}")
+    try:
+        key = part_number_key(part_number)
+        if not key:
+            raise HTTPException(status_code=400, detail="Invalid part number")
+        print(f"📝 Part number key: {key}")
+
+        key_condition = key if match == "exact" else {"$regex": f"^{re.escape(key)}"}
+
+        collection = Database.get_collection()
+        pipeline = [
+            # Select documents through the multikey index, then keep only the matching parts
+            {"$match": {"parts.key": key_condition}},
+            {"$project": {
+                "timestamp": 1,
+                "structured_data.aircraft_registration": 1,
+                "structured_data.aircraft_make_model": 1,
+                "parts": 1,
+            }},
+            {"$unwind": "$parts"},
+            {"$match": {"parts.key": key_condition}},
+            {"$sort": {"timestamp": -1, "parts.entry_index": 1}},
+            {"$skip": skip},
+            {"$limit": limit},
+        ]
+
+        installations = []
+        async for doc in collection.aggregate(pipeline):
+            part = doc["parts"]
+            structured_data = doc.get("structured_data", {})
+            installations.append(PartInstallation(
+                log_id=str(doc["_id"]),
+                entry_index=part["entry_index"],
+                aircraft_registration=structured_data.get("aircraft_registration"),
+                aircraft_make_model=structured_data.get("aircraft_make_model"),
+                part_number=part["part_number"],
+                date=part.get("date"),
+                tach_time=part.get("tach_time"),
+                timestamp=doc.get("timestamp")
+            ))
+
+        print(f"✅ Part lookup completed")
+        print(f"📝 Response data:")
+        print(f"   - Part key: {key}")
+        print(f"   - Number of installations: {len(installations)}")
+
+        return installations
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ ERROR in lookup_part_installations: {e}")
+        import traceback
+        print(f"❌ ERROR traceback: {traceback.format_exc()}")
+        logger.error(f"Error looking up part {part_number}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to look up part: {str(e)}")
+
 @router.get("/images/{image_filename:path}")
-async def get_image(image_filename: str):
+async def get_image(
+    image_filename: str,
+    size: str = Query("original", pattern=f"^(original|{'|'.join(DERIVATIVE_SIZES)})$", description="The uploaded original, or a resized JPEG (thumbnail, medium, full)"),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None)
+):
     """
-    Serve uploaded maintenance log images
+    Serve uploaded maintenance log images, or a resized derivative generated on first request.
+    Supports conditional requests (ETag / Last-Modified) and single byte ranges.
     """
-    print(f"=== GET IMAGE START === Filename: {image_filename}")
+    print(f"=== GET IMAGE START === Filename: {image_filename}, Size: {size}")
     try:
-        # Create uploads directory if it doesn't exist
-        uploads_dir = Path("uploads")
-        uploads_dir.mkdir(exist_ok=True)
-        print(f"📝 Uploads directory path: {uploads_dir.absolute()}")
-        
         # Decode the URL-encoded filename
         decoded_filename = unquote(image_filename)
         print(f"📝 Decoded filename: {decoded_filename}")
         
-        image_path = uploads_dir / decoded_filename
-        print(f"📝 Requested image path: {image_path.absolute()}")
-        print(f"📝 Image exists: {image_path.exists()}")
-        
-        if not image_path.exists():
-            print(f"❌ Image not found: {image_path.absolute()}")
+        blob_store = get_blob_store()
+        try:
+            if size == "original":
+                blob = await blob_store.open(decoded_filename)
+            else:
+                blob = await open_derivative(blob_store, decoded_filename, size)
+        except (BlobNotFound, ValueError):
+            print(f"❌ Image not found: {decoded_filename}")
             raise HTTPException(status_code=404, detail="Image not found")
-        
-        print(f"✅ Image found, serving: {image_path.absolute()}")
-        print(f"📝 File size: {image_path.stat().st_size} bytes")
+        except UnidentifiedImageError:
+            print(f"❌ Image cannot be decoded for resizing: {decoded_filename}")
+            raise HTTPException(status_code=422, detail="Image cannot be resized; request size=original")
+        
+        headers = {
+            "ETag": blob.etag,
+            "Accept-Ranges": "bytes",
+            # Content-addressed names never change their bytes; anything else is revalidated
+            "Cache-Control": "public, max-age=31536000, immutable" if is_content_addressed(blob.name) else "no-cache",
+        }
+        if blob.updated_at is not None:
+            headers["Last-Modified"] = format_datetime(blob.updated_at.astimezone(timezone.utc), usegmt=True)
+        
+        # If-None-Match takes precedence over If-Modified-Since
+        if etag_matches(if_none_match, blob.etag) or (if_none_match is None and not_modified_since(if_modified_since, blob.updated_at)):
+            print(f"✅ Image unchanged, returning 304")
+            return Response(status_code=304, headers=headers)
+        
+        # A stale If-Range (the image changed since the partial fetch) gets the whole image
+        byte_range = None
+        if range_header and (if_range is None or if_range.strip() == blob.etag or (headers.get("Last-Modified") and if_range.strip() == headers["Last-Modified"])):
+            try:
+                byte_range = parse_byte_range(range_header, blob.size)
+            except ValueError:
+                print(f"❌ Unsatisfiable range: {range_header}")
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{blob.size}"})
+        
+        headers["Content-Disposition"] = content_disposition(blob.name, "inline")
+        print(f"✅ Image found, serving: {blob.name}")
         print(f"📝 Response data:")
-        print(f"   - Filename: {decoded_filename}")
-        print(f"   - File path: {image_path.absolute()}")
-        print(f"   - File size: {image_path.stat().st_size} bytes")
-        print(f"   - Media type: image/*")
-        
-        return FileResponse(
-            path=str(image_path),
-            media_type="image/*",
-            filename=decoded_filename
-        )
+        print(f"   - Filename: {blob.name}")
+        print(f"   - File size: {blob.size} bytes")
+        print(f"   - Media type: {blob.content_type}")
+        print(f"   - Range: {byte_range}")
+        
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{blob.size}"
+            headers["Content-Length"] = str(end - start)
+            return StreamingResponse(blob.iter_chunks(start, end), status_code=206, media_type=blob.content_type, headers=headers)
+        
+        headers["Content-Length"] = str(blob.size)
+        return StreamingResponse(blob.iter_chunks(), media_type=blob.content_type, headers=headers)
         
     except HTTPException:
         print(f"❌ HTTPException raised, re-raising")
@@ -853,4 +1502,28 @@ async def get_image(image_filename: str):
         import traceback
         print(f"❌ ERROR traceback: {traceback.format_exc()}")
         logger.error(f"Error serving image {image_filename}: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to serve image: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to serve image: {str(e)}") 
+
+@router.get("/storage/archive-report", response_model=ArchiveReport)
+async def get_archive_report():
+    """
+    Image archival progress and the bytes saved by transcoding stored images
+    """
+    print(f"=== GET ARCHIVE REPORT START ===")
+    try:
+        report = await archive_report(Database.get_collection())
+        print(f"✅ Archive report computed")
+        print(f"📝 Response data:")
+        print(f"   - Archived images: {report['archived_images']} of {report['images']}")
+        print(f"   - Bytes saved: {report['bytes_saved']}")
+        return ArchiveReport(**report)
+        
+    except HTTPException:
+        print(f"❌ HTTPException raised, re-raising")
+        raise
+    except Exception as e:
+        print(f"❌ ERROR in get_archive_report: {e}")
+        import traceback
+        print(f"❌ ERROR traceback: {traceback.format_exc()}")
+        logger.error(f"Error computing archive report: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute archive report: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+JSON encoding for API responses and exports.
+
+Raw MongoDB documents carry `ObjectId`s and `datetime`s that the standard
+`json` module cannot encode, and `jsonable_encoder` walks every value in
+Python before `json.dumps` walks it again. Everything here goes through
+orjson instead: datetimes, dates, UUIDs and enums are encoded natively,
+`ObjectId`s become their hex string and Pydantic models are dumped by alias,
+in a single pass to bytes.
+
+Routes with a `response_model` use `response_class=FastJSONResponse`:
+FastAPI still validates the result and converts it to JSON-compatible
+values, and orjson replaces `json.dumps` for the final encoding.
+
+Stored log documents were validated by their model when they were written,
+so reads do not need to validate them again. `StoredDocumentSerializer`
+writes a stored document (or a list of them, in one call) straight to the
+JSON its response model would produce: same fields, aliases and order,
+extra stored fields left out, and nothing validated. Documents written before
+a field existed lack it, so missing fields are filled with the model's
+defaults first, as validation would; complete documents are passed through
+as they are.
+"""
+
+from functools import lru_cache
+from typing import Annotated, Any, List, Union, get_args, get_origin
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, PlainSerializer, TypeAdapter
+from typing_extensions import TypedDict
+
+# UTC datetimes as "...Z", like Pydantic's JSON
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def _default(value):
+    """Encode the types orjson does not know"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(by_alias=True)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """JSON bytes for documents, models and plain values"""
+    return orjson.dumps(content, default=_default, option=JSON_OPTIONS)
+
+
+def dumps_line(content):
+    """One newline-terminated JSON line (NDJSON)"""
+    return orjson.dumps(content, default=_default, option=JSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+def loads(data):
+    return orjson.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded by `dumps`"""
+
+    def render(self, content):
+        return dumps(content)
+
+
+# `_id` is stored as an ObjectId and sent as its hex string
+_ObjectIdString = Annotated[Any, PlainSerializer(str, return_type=str)]
+
+
+def _stored_type(annotation):
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return stored_shape(annotation)
+    origin = get_origin(annotation)
+    if origin is list:
+        return List[_stored_type(get_args(annotation)[0])]
+    if origin is Union:
+        return Union[tuple(_stored_type(arg) for arg in get_args(annotation))]
+    return annotation
+
+
+@lru_cache(maxsize=None)
+def stored_shape(model):
+    """A TypedDict with the fields of `model` under their aliases, nested models mirrored the same way"""
+    fields = {}
+    for name, field in model.model_fields.items():
+        key = field.alias or name
+        fields[key] = _ObjectIdString if key == "_id" else _stored_type(field.annotation)
+    return TypedDict(f"Stored{model.__name__}", fields, total=False)
+
+
+def _fill_nested(annotation):
+    """Function filling the defaults of the models inside a field's values, or None when it holds none"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return default_filler(annotation)
+    origin = get_origin(annotation)
+    if origin is list:
+        fill_item = _fill_nested(get_args(annotation)[0])
+        if fill_item is None:
+            return None
+
+        def fill_list(values):
+            if not isinstance(values, list):
+                return values
+            for index, value in enumerate(values):
+                if fill_item(value) is not value:
+                    return values[:index] + [fill_item(value) for value in values[index:]]
+            # The stored list itself when no item needed filling
+            return values
+        return fill_list
+    if origin is Union:
+        fills = [fill for fill in map(_fill_nested, get_args(annotation)) if fill is not None]
+        return fills[0] if fills else None
+    return None
+
+
+@lru_cache(maxsize=None)
+def default_filler(model):
+    """
+    Function returning a stored document of `model` with the defaults of its
+    missing fields (and of its nested models' missing fields) filled in, in
+    field order. A document that is already complete is returned as it is.
+    """
+    fields = []
+    for name, field in model.model_fields.items():
+        key = field.alias or name
+        fields.append((key, None if field.is_required() else field, _fill_nested(field.annotation)))
+    keys = {key for key, _, _ in fields}
+    nested = [(key, fill) for key, _, fill in fields if fill is not None]
+
+    def fill(doc):
+        if not isinstance(doc, dict):
+            return doc
+        if not nested and keys <= doc.keys():
+            return doc
+        changed = {}
+        for key, fill_value in nested:
+            if key in doc:
+                value = fill_value(doc[key])
+                if value is not doc[key]:
+                    changed[key] = value
+        if not changed and keys <= doc.keys():
+            return doc
+        filled = {}
+        for key, field, _ in fields:
+            if key in changed:
+                filled[key] = changed[key]
+            elif key in doc:
+                filled[key] = doc[key]
+            elif field is not None:
+                filled[key] = field.get_default(call_default_factory=True)
+        return filled
+    return fill
+
+
+class StoredDocumentSerializer:
+    """Serializes trusted stored documents to a model's JSON without validating them"""
+
+    def __init__(self, model):
+        shape = stored_shape(model)
+        self._fill = default_filler(model)
+        self._one = TypeAdapter(shape)
+        self._many = TypeAdapter(List[shape])
+
+    def dump(self, doc, indent=None):
+        return self._one.dump_json(self._fill(doc), indent=indent, warnings=False)
+
+    def dump_many(self, docs):
+        return self._many.dump_json([self._fill(doc) for doc in docs], warnings=False)
@@ -0,0 +1,179 @@
+"""
+Tests for the materialized aircraft state: incremental updates against a full rebuild
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from aircraft_state import TIMELINE_SORT, apply_log, build_aircraft_state, log_source, remove_log, timeline_items
+from indexing import build_derived_fields
+
+START = datetime(2024, 1, 1, 12, 0)
+
+
+def entry(day, tach, description="Oil change", due=None, airworthy=True):
+    return {
+        "date": f"2024-01-{day:02d}",
+        "tach_time": str(tach),
+        "description_of_work_performed": description,
+        "next_due_compliance": due,
+        "is_airworthy": airworthy,
+    }
+
+
+def log_document(registration, entries, hours=0, log_id=None):
+    structured_data = {"aircraft_registration": registration, "aircraft_make_model": "Cessna 172", "log_entries": entries}
+    return {
+        "_id": log_id or ObjectId(),
+        "timestamp": START + timedelta(hours=hours),
+        "structured_data": structured_data,
+        **build_derived_fields(structured_data),
+    }
+
+
+@pytest.fixture
+def collections():
+    database = AsyncMongoMockClient()["test"]
+    return database["logs_aircraft"], database["logs_aircraft_timeline"], database["logs_aircraft_sources"]
+
+
+async def stored_state(collections, key):
+    state_collection, timeline_collection, _ = collections
+    state = await state_collection.find_one({"_id": key})
+    if state is None:
+        return None, []
+    state.pop("revision")
+    timeline = await timeline_collection.find({"registration_key": key}).sort(TIMELINE_SORT).to_list(None)
+    return state, timeline
+
+
+async def assert_matches_rebuild(collections, logs, key):
+    """The incrementally maintained state equals the one rebuilt from the logs now filed under `key`"""
+    docs = [doc for doc in logs.values() if doc.get("registration_key") == key]
+    state, timeline = await stored_state(collections, key)
+    if not docs:
+        assert state is None
+        return
+    expected_timeline = [item for doc in docs for item in timeline_items(doc)]
+    assert state == build_aircraft_state(key, [log_source(doc) for doc in docs], expected_timeline)
+    assert sorted(timeline, key=lambda item: item["_id"]) == sorted(expected_timeline, key=lambda item: item["_id"])
+
+
+@pytest.mark.asyncio
+async def test_state_summarizes_the_aircraft_logs(collections):
+    first = log_document("N123AB", [
+        entry(5, 1200.0, "Annual inspection", "Next annual due 01/2025"),
+        entry(6, 1210.0, "Oil change", "Oil change due in 50 hours"),
+    ])
+    second = log_document("n-123ab", [
+        entry(20, 1250.5, "Oil change", "Oil change due in 50 hours"),
+        entry(21, "2024-01-21", "Cracked exhaust", airworthy=False),
+    ], hours=1)
+    for doc in (first, second):
+        await apply_log(*collections, doc)
+
+    state, timeline = await stored_state(collections, "N123AB")
+    assert (state["log_count"], state["entry_count"]) == (2, 4)
+    # The date typed into the tach field is no reading
+    assert state["current_tach_time"] == 1250.5
+    assert state["last_entry_date"] == "2024-01-21"
+    assert state["last_annual"]["log_id"] == str(first["_id"])
+    assert state["airworthiness"] == {
+        "is_airworthy": False,
+        "as_of": {"log_id": str(second["_id"]), "entry_index": 1, "date": "2024-01-21", "tach_time": None},
+        "non_airworthy_entries": 1,
+    }
+    # The newer oil change statement supersedes the older one
+    assert [(item["subject"], item["due_tach"], item["hours_remaining"]) for item in state["outstanding_items"]] == [
+        ("oil change", 1300.5, 50.0),
+        ("annual", None, None),
+    ]
+    assert [item["entry_index"] for item in timeline] == [0, 1, 0, 1]
+    # Only the summary is stored on the aircraft document
+    assert "timeline" not in state and "sources" not in state
+
+
+@pytest.mark.asyncio
+async def test_update_brings_back_a_superseded_statement(collections):
+    older = log_document("N123AB", [entry(5, 1200.0, "Oil change", "Oil change due in 50 hours")])
+    newer = log_document("N123AB", [entry(20, 1250.0, "Oil change", "Oil change due in 25 hours")], hours=1)
+    logs = {doc["_id"]: doc for doc in (older, newer)}
+    for doc in logs.values():
+        await apply_log(*collections, doc)
+
+    logs[newer["_id"]] = log_document("N123AB", [entry(20, 1250.0, "Washed aircraft")], hours=1, log_id=newer["_id"])
+    await apply_log(*collections, logs[newer["_id"]])
+
+    state, _ = await stored_state(collections, "N123AB")
+    assert [(item["log_id"], item["due_tach"], item["hours_remaining"]) for item in state["outstanding_items"]] == [
+        (str(older["_id"]), 1250.0, 0.0),
+    ]
+    await assert_matches_rebuild(collections, logs, "N123AB")
+
+
+@pytest.mark.asyncio
+async def test_re_registered_log_moves_between_aircraft(collections):
+    moving = log_document("N123AB", [entry(5, 1300.0, "Annual inspection")])
+    staying = log_document("N123AB", [entry(6, 1200.0)], hours=1)
+    logs = {doc["_id"]: doc for doc in (moving, staying)}
+    for doc in logs.values():
+        await apply_log(*collections, doc)
+
+    logs[moving["_id"]] = log_document("G-ABCD", moving["structured_data"]["log_entries"], log_id=moving["_id"])
+    await apply_log(*collections, logs[moving["_id"]])
+
+    state, _ = await stored_state(collections, "N123AB")
+    assert (state["log_count"], state["current_tach_time"], state["last_annual"]) == (1, 1200.0, None)
+    for key in ("N123AB", "GABCD"):
+        await assert_matches_rebuild(collections, logs, key)
+
+
+@pytest.mark.asyncio
+async def test_deleting_the_last_log_drops_the_aircraft(collections):
+    doc = log_document("N123AB", [entry(5, 1200.0)])
+    await apply_log(*collections, doc)
+    await remove_log(*collections, str(doc["_id"]))
+
+    assert await stored_state(collections, "N123AB") == (None, [])
+    _, _, source_collection = collections
+    assert await source_collection.count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_log_without_entries_still_counts(collections):
+    doc = log_document("N123AB", [])
+    await apply_log(*collections, doc)
+
+    state, timeline = await stored_state(collections, "N123AB")
+    assert (state["log_count"], state["entry_count"], state["aircraft_make_model"], timeline) == (1, 0, "Cessna 172", [])
+
+
+@pytest.mark.asyncio
+async def test_random_writes_match_a_rebuild(collections):
+    rng = random.Random(34)
+    registrations = ["N123AB", "N123AB", "G-ABCD", None]
+    subjects = ["Oil change", "Annual inspection", "ELT battery", "Transponder check"]
+    logs = {}
+    for step in range(60):
+        action = rng.random()
+        if logs and action < 0.2:
+            log_id = rng.choice(list(logs))
+            del logs[log_id]
+            await remove_log(*collections, str(log_id))
+            continue
+        log_id = rng.choice(list(logs)) if logs and action < 0.5 else ObjectId()
+        entries = [
+            entry(rng.randint(1, 28), rng.choice([round(rng.uniform(1000, 1500), 1), "n/a", "01/15/24"]),
+                  rng.choice(subjects), rng.choice([None, "due in 50 hours", f"due 0{rng.randint(1, 9)}/2025"]),
+                  rng.random() > 0.2)
+            for _ in range(rng.randint(0, 3))
+        ]
+        logs[log_id] = log_document(rng.choice(registrations), entries, hours=step, log_id=log_id)
+        await apply_log(*collections, logs[log_id])
+
+    for key in ("N123AB", "GABCD"):
+        await assert_matches_rebuild(collections, logs, key)
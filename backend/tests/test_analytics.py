@@ -0,0 +1,66 @@
+"""
+Tests for the fleet analytics aggregation
+"""
+
+from datetime import datetime
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from analytics import build_analytics_pipeline
+from indexing import build_derived_fields
+
+
+def log_document(registration, uploaded, entries):
+    structured_data = {"aircraft_registration": registration, "aircraft_make_model": "Cessna 172", "log_entries": entries}
+    return {"timestamp": uploaded, "structured_data": structured_data, **build_derived_fields(structured_data)}
+
+
+async def run(documents, filters=None):
+    collection = AsyncMongoMockClient()["test"]["logs"]
+    await collection.insert_many(documents)
+    results = await collection.aggregate(build_analytics_pipeline({}, filters or {})).to_list(length=1)
+    return results[0]
+
+
+def buckets(facet):
+    return {bucket["key"]: bucket["count"] for bucket in facet}
+
+
+@pytest.mark.asyncio
+async def test_months_come_from_the_entry_dates():
+    # A backlog of old logs scanned in one month
+    facets = await run([
+        log_document("N123AB", datetime(2024, 6, 3), [
+            {"date": "2019-03-14", "risk_level": "Low"},
+            {"date": "03/20/2019", "risk_level": "High"},
+            {"date": "2021-11-02", "risk_level": "Low"},
+        ]),
+        log_document("G-ABCD", datetime(2024, 6, 4), [{"date": "2020-07-01", "risk_level": "Low"}]),
+    ])
+    assert facets["by_month"] == [
+        {"key": "2019-03", "count": 2},
+        {"key": "2020-07", "count": 1},
+        {"key": "2021-11", "count": 1},
+    ]
+    assert facets["totals"] == [{"entries": 4, "aircraft": 2}]
+
+
+@pytest.mark.asyncio
+async def test_undated_entries_fall_back_to_the_upload_month():
+    facets = await run([log_document("N123AB", datetime(2024, 6, 3), [
+        {"date": None, "risk_level": "Low"},
+        {"date": "last Tuesday", "risk_level": "Low"},
+        {"date": "2024-01-15", "risk_level": "Low"},
+    ])])
+    assert buckets(facets["by_month"]) == {"2024-01": 1, "2024-06": 2}
+
+
+@pytest.mark.asyncio
+async def test_entry_filters_keep_each_entry_s_own_date():
+    facets = await run([log_document("N123AB", datetime(2024, 6, 3), [
+        {"date": "2019-03-14", "risk_level": "Low"},
+        {"date": "2021-11-02", "risk_level": "High"},
+    ])], {"risk_level": "High"})
+    assert buckets(facets["by_month"]) == {"2021-11": 1}
+    assert buckets(facets["by_risk_level"]) == {"High": 1}
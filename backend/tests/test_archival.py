@@ -0,0 +1,145 @@
+"""
+Tests for archiving stored images: the log is repointed without invalidating edits made against it
+"""
+
+import asyncio
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from PIL import Image, ImageDraw
+
+import archival
+import blob_storage
+import routes
+from archival import archive_log_image, retained_original
+from blob_storage import LocalBlobStore, iter_bytes
+from database import Database
+from etags import log_etag, revision_from_etag
+from indexing import build_derived_fields
+
+
+def screenshot():
+    """An uncompressed PNG of a logbook page: lossless WebP shrinks it a lot"""
+    image = Image.new("RGB", (400, 300), "white")
+    draw = ImageDraw.Draw(image)
+    for row in range(12):
+        draw.text((10, 10 + row * 24), f"01/{row + 1:02d}/24  Oil change  1250.{row}", fill="black")
+    output = BytesIO()
+    image.save(output, "PNG", compress_level=0)
+    return output.getvalue()
+
+
+def log_document(image_filename):
+    structured_data = {
+        "aircraft_registration": "N123AB",
+        "aircraft_make_model": "Cessna 172",
+        "log_entries": [{"description_of_work_performed": "Oil change", "tach_time": "1250.5", "date": "2024-01-15"}],
+    }
+    return {
+        "_id": ObjectId(),
+        "uploaded_by": "anonymous",
+        "timestamp": datetime(2024, 1, 16),
+        "image_filename": image_filename,
+        "structured_data": structured_data,
+        "revision": 0,
+        **build_derived_fields(structured_data),
+    }
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalBlobStore(tmp_path)
+    monkeypatch.setattr(blob_storage, "_blob_store", store)
+    return store
+
+
+@pytest.fixture(autouse=True)
+def in_process_transcoding(monkeypatch):
+    async def run(fn, *args, background=False):
+        return fn(*args)
+    monkeypatch.setattr(archival.archive_pool, "run", run)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Database, "client", AsyncMongoMockClient())
+    monkeypatch.setattr(Database, "database_name", "test")
+    monkeypatch.setattr(Database, "collection_name", "logs")
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def archive(store, doc, grace=7):
+    async def run():
+        await store.save(doc["image_filename"], iter_bytes(screenshot()))
+        await Database.get_collection().insert_one(doc)
+        return await archive_log_image(store, Database.get_collection(), Database.get_meta_collection(), doc, grace)
+    return asyncio.run(run())
+
+
+def stored(doc):
+    return asyncio.run(Database.get_collection().find_one({"_id": doc["_id"]}))
+
+
+def test_image_revision_is_not_an_edit():
+    assert log_etag("abc", 3) == '"abc-3"'
+    assert log_etag("abc", 3, 1) == '"abc-3.1"'
+    assert revision_from_etag('"abc-3.1"', "abc") == revision_from_etag('"abc-3"', "abc") == 3
+
+
+def test_archival_repoints_the_log(client, store):
+    doc = log_document("maintenance_log_20240116.png")
+    result = archive(store, doc)
+    assert result["status"] == "archived"
+    assert result["archived_bytes"] < result["original_bytes"]
+
+    archived = stored(doc)
+    assert archived["image_filename"] == result["image_filename"]
+    assert archived["image_filename"].startswith("maintenance_log_20240116_") and archived["image_filename"].endswith(".webp")
+    assert (archived["revision"], archived["image_revision"]) == (0, 1)
+    # The original stays through its grace period, and the log serves the archived copy
+    assert retained_original(archived) == "maintenance_log_20240116.png"
+    assert asyncio.run(store.exists("maintenance_log_20240116.png"))
+    response = client.get(f"/api/v1/images/{archived['image_filename']}")
+    assert response.status_code == 200
+    assert Image.open(BytesIO(response.content)).format == "WEBP"
+
+
+def test_original_is_deleted_without_a_grace_period(client, store):
+    doc = log_document("maintenance_log_20240116.png")
+    archive(store, doc, grace=0)
+    assert retained_original(stored(doc)) is None
+    assert not asyncio.run(store.exists("maintenance_log_20240116.png"))
+
+
+def test_archival_refreshes_cached_logs_but_keeps_if_match(client, store):
+    doc = log_document("maintenance_log_20240116.png")
+    log_id = str(doc["_id"])
+    asyncio.run(Database.get_collection().insert_one(dict(doc)))
+    before = client.get(f"/api/v1/logs/{log_id}").headers["ETag"]
+    asyncio.run(Database.get_collection().delete_one({"_id": doc["_id"]}))
+    archive(store, doc)
+
+    # A cached copy names the old image, so it is no longer current
+    response = client.get(f"/api/v1/logs/{log_id}", headers={"If-None-Match": before})
+    assert response.status_code == 200
+    assert response.json()["image_filename"].endswith(".webp")
+    after = response.headers["ETag"]
+    assert after != before
+
+    # An edit made against the copy from before archival is no conflict
+    structured_data = {**doc["structured_data"], "summary": "Oil changed"}
+    response = client.put(f"/api/v1/logs/{log_id}", json=structured_data, headers={"If-Match": before})
+    assert response.status_code == 200
+    assert response.json()["image_filename"].endswith(".webp")
+    assert response.headers["ETag"] == log_etag(log_id, 1, 1)
+
+    # ...but an edit made against a superseded revision still is
+    response = client.put(f"/api/v1/logs/{log_id}", json=structured_data, headers={"If-Match": after})
+    assert response.status_code == 412
@@ -0,0 +1,97 @@
+"""
+Tests for the blob store: streamed writes and reads, byte ranges, names and deletes
+"""
+
+import os
+
+import pytest
+
+import blob_storage
+from blob_storage import (CHUNK_SIZE, BlobNotFound, LocalBlobStore, check_blob_name, content_addressed_name, get_blob_store,
+                          is_content_addressed, iter_bytes)
+
+
+async def read(blob, start=0, end=None):
+    return b"".join([chunk async for chunk in blob.iter_chunks(start, end)])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalBlobStore(tmp_path / "uploads")
+
+
+@pytest.mark.asyncio
+async def test_save_and_read_back_in_chunks(store):
+    data = bytes(range(256)) * (CHUNK_SIZE // 128 + 3)
+    assert await store.save("scan_0123456789abcdef.jpg", iter_bytes(data)) == len(data)
+
+    blob = await store.open("scan_0123456789abcdef.jpg")
+    assert (blob.size, blob.content_type) == (len(data), "image/jpeg")
+    chunks = [chunk async for chunk in blob.iter_chunks()]
+    assert len(chunks) > 1 and max(map(len, chunks)) <= CHUNK_SIZE
+    assert b"".join(chunks) == data
+    assert await read(blob, 10, 20) == data[10:20]
+    assert await read(blob, len(data) - 5) == data[-5:]
+    assert await read(blob, 0, len(data) + 100) == data
+
+
+@pytest.mark.asyncio
+async def test_replacing_a_blob_changes_its_etag(store):
+    await store.save("page.png", iter_bytes(b"first"))
+    first = await store.open("page.png")
+    await store.save("page.png", iter_bytes(b"second!"))
+    second = await store.open("page.png")
+    assert first.etag != second.etag
+    assert await read(second) == b"second!"
+    # Writes go to a temporary file that is renamed into place
+    assert sorted(os.listdir(store.root)) == ["page.png"]
+
+
+@pytest.mark.asyncio
+async def test_a_failed_write_leaves_nothing_behind(store):
+    async def failing():
+        yield b"partial"
+        raise RuntimeError("client went away")
+
+    with pytest.raises(RuntimeError):
+        await store.save("page.png", failing())
+    assert os.listdir(store.root) == []
+    assert not await store.exists("page.png")
+
+
+@pytest.mark.asyncio
+async def test_delete(store):
+    await store.save("page.png", iter_bytes(b"data"))
+    assert await store.delete("page.png") is True
+    assert await store.delete("page.png") is False
+    with pytest.raises(BlobNotFound):
+        await store.open("page.png")
+
+
+@pytest.mark.parametrize("name", ["", ".hidden", "../etc/passwd", "a/b.jpg", "a\\b.jpg", "a\x00.jpg"])
+def test_names_that_could_escape_the_store_are_rejected(name):
+    with pytest.raises(ValueError):
+        check_blob_name(name)
+
+
+def test_content_addressed_names():
+    name = content_addressed_name("maintenance_log_20240116", b"image bytes", ".JPG")
+    assert name.startswith("maintenance_log_20240116_") and name.endswith(".jpg")
+    assert name == content_addressed_name("maintenance_log_20240116", b"image bytes", ".jpg")
+    assert name != content_addressed_name("maintenance_log_20240116", b"other bytes", ".jpg")
+    assert content_addressed_name("log", b"x", ".../evil").endswith(".bin")
+    assert is_content_addressed(name)
+    assert is_content_addressed(f"{name}.thumbnail.jpg")
+    assert not is_content_addressed("maintenance_log_20240116.jpg")
+
+
+def test_backend_is_chosen_by_environment(monkeypatch, tmp_path):
+    monkeypatch.setattr(blob_storage, "_blob_store", None)
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path / "images"))
+    assert isinstance(get_blob_store(), LocalBlobStore)
+    assert get_blob_store() is get_blob_store()
+
+    monkeypatch.setattr(blob_storage, "_blob_store", None)
+    monkeypatch.setenv("BLOB_STORAGE", "s3")
+    with pytest.raises(ValueError):
+        get_blob_store()
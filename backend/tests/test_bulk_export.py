@@ -0,0 +1,113 @@
+"""
+Tests for the streamed NDJSON/CSV bulk export and resuming it from a row's cursor
+"""
+
+import asyncio
+import csv
+import json
+from datetime import datetime
+from io import StringIO
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import routes
+from bulk_export import EXPORT_COLUMNS, decode_cursor, encode_cursor
+from database import Database
+from indexing import build_derived_fields
+
+
+def log_document(registration, uploaded, descriptions):
+    structured_data = {
+        "aircraft_registration": registration,
+        "aircraft_make_model": "Cessna 172",
+        "log_entries": [
+            {"description_of_work_performed": description, "part_number_replaced": ["A-1", "B-2"], "is_airworthy": True}
+            for description in descriptions
+        ],
+    }
+    return {
+        "_id": ObjectId(),
+        "uploaded_by": "anonymous",
+        "timestamp": uploaded,
+        "image_filename": "scan.jpg",
+        "structured_data": structured_data,
+        **build_derived_fields(structured_data),
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Database, "client", AsyncMongoMockClient())
+    monkeypatch.setattr(Database, "database_name", "test")
+    monkeypatch.setattr(Database, "collection_name", "logs")
+    app = FastAPI()
+    app.include_router(routes.router)
+    client = TestClient(app)
+    # Two logs uploaded in the same second are ordered by id
+    for doc in (
+        log_document("N123AB", datetime(2024, 1, 1), ["Oil change", "Tire change"]),
+        log_document("N123AB", datetime(2024, 2, 1), ["Annual inspection", "ELT battery", "Magneto timing"]),
+        log_document("G-ABCD", datetime(2024, 2, 1), ["Washed aircraft"]),
+        log_document("N123AB", datetime(2024, 3, 1), []),
+    ):
+        asyncio.run(Database.get_collection().insert_one(doc))
+    return client
+
+
+def ndjson(client, **params):
+    response = client.get("/api/v1/export/logs", params={"format": "ndjson", **params})
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_cursor_round_trip():
+    log_id = ObjectId()
+    assert decode_cursor(encode_cursor(datetime(2024, 2, 1, 10, 30), log_id, 2)) == (datetime(2024, 2, 1, 10, 30), log_id, 2)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_ndjson_has_one_row_per_entry_newest_first(client):
+    rows = ndjson(client)
+    assert [row["description_of_work_performed"] for row in rows[:3]] in (
+        ["Annual inspection", "ELT battery", "Magneto timing"],
+        ["Washed aircraft", "Annual inspection", "ELT battery"],
+    )
+    assert len(rows) == 6
+    assert [row["description_of_work_performed"] for row in rows[-2:]] == ["Oil change", "Tire change"]
+    assert rows[-1]["entry_index"] == 1
+    assert rows[-1]["part_number_replaced"] == ["A-1", "B-2"]
+    assert rows[-1]["timestamp"] == "2024-01-01T00:00:00"
+    assert len(ndjson(client, registration="g-abcd")) == 1
+
+
+@pytest.mark.parametrize("stop", range(6))
+def test_resuming_after_any_row_continues_with_the_next(client, stop):
+    rows = ndjson(client)
+    assert ndjson(client, cursor=rows[stop]["cursor"]) == rows[stop + 1:]
+
+
+def test_csv_has_a_header_and_joined_lists(client):
+    response = client.get("/api/v1/export/logs", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == "attachment; filename=maintenance_log_entries.csv"
+    records = list(csv.reader(StringIO(response.text)))
+    assert records[0] == EXPORT_COLUMNS
+    assert len(records) == 7
+    rows = [dict(zip(records[0], record)) for record in records[1:]]
+    assert rows[-1]["part_number_replaced"] == "A-1; B-2"
+    assert rows[-1]["summary"] == ""
+
+    # A CSV resumes without repeating the header row's data
+    resumed = list(csv.reader(StringIO(client.get("/api/v1/export/logs", params={"format": "csv", "cursor": rows[3]["cursor"]}).text)))
+    assert resumed == [records[0]] + records[5:]
+
+
+def test_bad_cursors_are_rejected(client):
+    assert client.get("/api/v1/export/logs", params={"cursor": "not-a-cursor"}).status_code == 400
+    cursor = ndjson(client)[0]["cursor"]
+    assert client.get("/api/v1/export/logs", params={"format": "parquet", "cursor": cursor}).status_code == 400
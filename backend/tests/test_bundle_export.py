@@ -0,0 +1,132 @@
+"""
+Tests for the streamed ZIP records bundle of an aircraft's logs
+"""
+
+import asyncio
+import json
+import zipfile
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import blob_storage
+import bundle_export
+import routes
+from blob_storage import LocalBlobStore, iter_bytes
+from bundle_export import BundleAborted, stream_bundle
+from database import Database
+from indexing import build_derived_fields
+from pdf_render import pdf_pool
+from worker_pools import PoolSaturated
+
+
+def log_document(registration, day, image_filename=None):
+    structured_data = {
+        "aircraft_registration": registration,
+        "aircraft_make_model": "Cessna 172",
+        "log_entries": [{"description_of_work_performed": f"Work on day {day}", "tach_time": "1250.5", "date": f"2024-01-{day:02d}"}],
+    }
+    return {
+        "_id": ObjectId(),
+        "uploaded_by": "anonymous",
+        "timestamp": datetime(2024, 1, day, 9, 30),
+        "image_filename": image_filename,
+        "structured_data": structured_data,
+        "revision": 0,
+        **build_derived_fields(structured_data),
+    }
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Logs whose PDFs were rendered by the PDF workers, which run in-process here"""
+    rendered = []
+
+    async def run(fn, *args, background=False):
+        assert background
+        rendered.append(args[0]["structured_data"]["log_entries"][0]["description_of_work_performed"])
+        return fn(*args)
+    monkeypatch.setattr(pdf_pool, "run", run)
+    return rendered
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalBlobStore(tmp_path)
+    monkeypatch.setattr(blob_storage, "_blob_store", store)
+    return store
+
+
+@pytest.fixture
+def client(monkeypatch, store):
+    monkeypatch.setattr(Database, "client", AsyncMongoMockClient())
+    monkeypatch.setattr(Database, "database_name", "test")
+    monkeypatch.setattr(Database, "collection_name", "logs")
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def test_bundle_has_json_pdf_and_scan_of_every_log(client, store, renders):
+    asyncio.run(store.save("scan_5.jpg", iter_bytes(b"jpeg bytes of day 5")))
+    logs = [
+        log_document("N123AB", 5, "scan_5.jpg"),
+        log_document("N123AB", 3, "missing.jpg"),
+        log_document("N123AB", 4),
+        log_document("G-ABCD", 6),
+    ]
+    for doc in logs:
+        asyncio.run(Database.get_collection().insert_one(doc))
+
+    response = client.get("/api/v1/export/bundle", params={"registration": "N123AB"})
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(BytesIO(response.content))
+    assert archive.testzip() is None
+
+    root = "maintenance_records_N123AB"
+    folders = [f"{root}/20240103_093000_{logs[1]['_id']}", f"{root}/20240104_093000_{logs[2]['_id']}", f"{root}/20240105_093000_{logs[0]['_id']}"]
+    # Oldest first; a scan missing from storage is left out
+    assert archive.namelist() == [
+        f"{folders[0]}/log.json", f"{folders[0]}/log.pdf",
+        f"{folders[1]}/log.json", f"{folders[1]}/log.pdf",
+        f"{folders[2]}/log.json", f"{folders[2]}/log.pdf", f"{folders[2]}/scan_5.jpg",
+    ]
+    assert archive.read(f"{folders[2]}/scan_5.jpg") == b"jpeg bytes of day 5"
+    assert archive.getinfo(f"{folders[2]}/scan_5.jpg").compress_type == zipfile.ZIP_STORED
+    assert archive.getinfo(f"{folders[2]}/log.json").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo(f"{folders[2]}/log.json").date_time == (2024, 1, 5, 9, 30, 0)
+    assert all(archive.read(f"{folder}/log.pdf").startswith(b"%PDF") for folder in folders)
+
+    # The JSON is the log as the API returns it
+    log_id = str(logs[0]["_id"])
+    assert json.loads(archive.read(f"{folders[2]}/log.json")) == client.get(f"/api/v1/logs/{log_id}").json()
+    assert renders == ["Work on day 3", "Work on day 4", "Work on day 5"]
+
+    # PDFs are cached, so a second bundle renders nothing
+    again = client.get("/api/v1/export/bundle", params={"registration": "N123AB"})
+    assert zipfile.ZipFile(BytesIO(again.content)).namelist() == archive.namelist()
+    assert len(renders) == 3
+
+
+def test_bundle_without_logs_is_404(client, renders):
+    assert client.get("/api/v1/export/bundle", params={"registration": "N999ZZ"}).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_bundle_gives_up_when_no_pdf_worker_comes_free(store, monkeypatch):
+    async def saturated(fn, *args, background=False):
+        raise PoolSaturated("pdf pool is busy")
+    monkeypatch.setattr(pdf_pool, "run", saturated)
+    monkeypatch.setattr(bundle_export, "PDF_WAIT_SECONDS", 0)
+
+    collection = AsyncMongoMockClient()["test"]["logs"]
+    await collection.insert_one(log_document("N123AB", 5))
+    bundle = stream_bundle(collection.find({}), store, AsyncMongoMockClient()["test"]["logs_pdf_cache"], "records")
+    with pytest.raises(BundleAborted):
+        async for _ in bundle:
+            pass
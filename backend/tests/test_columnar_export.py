@@ -0,0 +1,110 @@
+"""
+Tests for the typed Parquet / Arrow IPC export: what is written reads back with its types
+"""
+
+import asyncio
+from datetime import date, datetime, timezone
+from io import BytesIO
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import routes
+from columnar_export import COLUMNAR_SCHEMA, write_columnar
+from database import Database
+from indexing import build_derived_fields
+
+
+def log_document(registration, uploaded, entries):
+    structured_data = {"aircraft_registration": registration, "aircraft_make_model": "Cessna 172", "log_entries": entries}
+    return {
+        "_id": ObjectId(),
+        "timestamp": uploaded,
+        "structured_data": structured_data,
+        **build_derived_fields(structured_data),
+    }
+
+
+def entry(description, tach, day, risk="Low", parts=None, airworthy=True):
+    return {
+        "description_of_work_performed": description,
+        "tach_time": tach,
+        "hobbs_time": None,
+        "date": day,
+        "risk_level": risk,
+        "urgency": "Normal",
+        "part_number_replaced": parts,
+        "is_airworthy": airworthy,
+    }
+
+
+DOCS = [
+    log_document("N123AB", datetime(2024, 1, 16, 10, 30), [
+        entry("Oil change", "1,250.5", "01/15/2024", parts=["CH48110-1"]),
+        entry("Cracked exhaust", "n/a", "sometime", risk="High", airworthy=None),
+    ]),
+    log_document("G-ABCD", datetime(2024, 2, 1), [entry("Annual inspection", "980", "2024-01-31", risk="Medium")]),
+    log_document("N999ZZ", datetime(2024, 3, 1), []),
+]
+
+
+def test_parquet_round_trip():
+    sink = BytesIO()
+    # A batch size of two makes several row groups
+    assert write_columnar(DOCS, sink, "parquet", batch_size=2) == 3
+    parquet = pq.ParquetFile(BytesIO(sink.getvalue()))
+    assert parquet.metadata.num_row_groups == 2
+    table = parquet.read()
+    assert table.schema.equals(COLUMNAR_SCHEMA)
+
+    rows = table.to_pylist()
+    assert [row["log_id"] for row in rows] == [str(DOCS[0]["_id"])] * 2 + [str(DOCS[1]["_id"])]
+    assert rows[0]["timestamp"] == datetime(2024, 1, 16, 10, 30, tzinfo=timezone.utc)
+    assert (rows[0]["registration_key"], rows[2]["registration_key"]) == ("N123AB", "GABCD")
+    assert [row["entry_index"] for row in rows] == [0, 1, 0]
+    # Parsed values next to the text they came from
+    assert [(row["date"], row["date_raw"]) for row in rows] == [
+        (date(2024, 1, 15), "01/15/2024"), (None, "sometime"), (date(2024, 1, 31), "2024-01-31"),
+    ]
+    assert [(row["tach_time"], row["tach_time_raw"]) for row in rows] == [(1250.5, "1,250.5"), (None, "n/a"), (980.0, "980")]
+    assert [row["part_number_replaced"] for row in rows] == [["CH48110-1"], [], []]
+    assert [row["risk_level"] for row in rows] == ["Low", "High", "Medium"]
+    assert [row["is_airworthy"] for row in rows] == [True, None, True]
+    assert pa.types.is_dictionary(table.schema.field("urgency").type)
+
+
+def test_arrow_stream_round_trip():
+    sink = BytesIO()
+    write_columnar(DOCS, sink, "arrow")
+    table = pa.ipc.open_stream(sink.getvalue()).read_all()
+    assert table.num_rows == 3
+    assert table.column("tach_time").to_pylist() == [1250.5, None, 980.0]
+
+
+def test_unknown_format_is_refused():
+    with pytest.raises(ValueError):
+        write_columnar(DOCS, BytesIO(), "feather")
+
+
+@pytest.mark.parametrize("export_format, extension", [("parquet", "parquet"), ("arrow", "arrows")])
+def test_export_route_streams_a_readable_file(monkeypatch, export_format, extension):
+    monkeypatch.setattr(Database, "client", AsyncMongoMockClient())
+    monkeypatch.setattr(Database, "database_name", "test")
+    monkeypatch.setattr(Database, "collection_name", "logs")
+    app = FastAPI()
+    app.include_router(routes.router)
+    asyncio.run(Database.get_collection().insert_many([dict(doc) for doc in DOCS]))
+
+    response = TestClient(app).get("/api/v1/export/logs", params={"format": export_format, "registration": "N123AB"})
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"].endswith(f".{extension}")
+    if export_format == "parquet":
+        table = pq.read_table(BytesIO(response.content))
+    else:
+        table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("description_of_work_performed").to_pylist() == ["Oil change", "Cracked exhaust"]
@@ -0,0 +1,149 @@
+"""
+Tests for ETags, conditional GETs and If-Match on log writes
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import blob_storage
+import routes
+from blob_storage import LocalBlobStore
+from database import Database
+from etags import collection_etag, etag_matches, log_etag, not_modified_since, revision_from_etag
+from indexing import build_derived_fields
+
+
+def log_document():
+    structured_data = {
+        "aircraft_registration": "N123AB",
+        "aircraft_make_model": "Cessna 172",
+        "log_entries": [{"description_of_work_performed": "Oil change", "tach_time": "1250.5", "date": "2024-01-15"}],
+    }
+    return {
+        "_id": ObjectId(),
+        "uploaded_by": "anonymous",
+        "timestamp": datetime(2024, 1, 16),
+        "image_filename": "scan.jpg",
+        "structured_data": structured_data,
+        "revision": 0,
+        **build_derived_fields(structured_data),
+    }
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(blob_storage, "_blob_store", LocalBlobStore(tmp_path))
+    monkeypatch.setattr(Database, "client", AsyncMongoMockClient())
+    monkeypatch.setattr(Database, "database_name", "test")
+    monkeypatch.setattr(Database, "collection_name", "logs")
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def insert_log(doc):
+    asyncio.run(Database.get_collection().insert_one(doc))
+    return str(doc["_id"])
+
+
+def test_list_etag_depends_on_the_query():
+    assert collection_etag(3) == '"logs-3"'
+    assert collection_etag(3, {}) == collection_etag(3)
+    ranged = collection_etag(3, {"tach_time": {"$gte": 1200.0}})
+    assert ranged.startswith('"logs-3-') and ranged != collection_etag(3)
+    assert ranged != collection_etag(3, {"tach_time": {"$gte": 1300.0}})
+    assert ranged != collection_etag(4, {"tach_time": {"$gte": 1200.0}})
+
+
+def test_list_etag_is_not_replayed_across_filters(client):
+    insert_log(log_document())
+    unfiltered = client.get("/api/v1/logs/")
+    ranged = client.get("/api/v1/logs/", params={"tach_min": 1300})
+    assert unfiltered.headers["ETag"] != ranged.headers["ETag"]
+
+    # The same list revalidates, another filter's ETag does not
+    assert client.get("/api/v1/logs/", headers={"If-None-Match": unfiltered.headers["ETag"]}).status_code == 304
+    response = client.get("/api/v1/logs/", params={"tach_min": 1300}, headers={"If-None-Match": unfiltered.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json() == []
+
+    # Spellings of the same filter share a tag
+    assert client.get("/api/v1/logs/", params={"tach_min": "1300.0"}).headers["ETag"] == ranged.headers["ETag"]
+
+
+def test_etag_helpers():
+    assert etag_matches('"a-1", W/"b-2"', '"b-2"')
+    assert etag_matches("*", '"a-1"')
+    assert not etag_matches(None, '"a-1"')
+    assert revision_from_etag(None, "a") is None
+    assert revision_from_etag("*", "a") is None
+    with pytest.raises(ValueError):
+        revision_from_etag('"b-1"', "a")
+    assert not_modified_since("Tue, 16 Jan 2024 10:00:00 GMT", datetime(2024, 1, 16, 10, 0, 0, 500000, tzinfo=timezone.utc))
+    assert not not_modified_since("Tue, 16 Jan 2024 10:00:00 GMT", datetime(2024, 1, 16, 10, 0, 1, tzinfo=timezone.utc))
+
+
+def test_unchanged_log_revalidates_with_304(client):
+    log_id = insert_log(log_document())
+    response = client.get(f"/api/v1/logs/{log_id}")
+    etag = response.headers["ETag"]
+    assert etag == log_etag(log_id, 0)
+
+    response = client.get(f"/api/v1/logs/{log_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_writes_with_a_stale_etag_get_412(client):
+    doc = log_document()
+    log_id = insert_log(doc)
+    fetched = client.get(f"/api/v1/logs/{log_id}").headers["ETag"]
+
+    response = client.put(f"/api/v1/logs/{log_id}", json=doc["structured_data"], headers={"If-Match": fetched})
+    assert response.status_code == 200
+    current = response.headers["ETag"]
+    assert current == log_etag(log_id, 1)
+    # The cached copy is stale now
+    assert client.get(f"/api/v1/logs/{log_id}", headers={"If-None-Match": fetched}).status_code == 200
+
+    # Every write made against the old copy is refused, and changes nothing
+    stale = {"If-Match": fetched}
+    assert client.put(f"/api/v1/logs/{log_id}", json=doc["structured_data"], headers=stale).status_code == 412
+    assert client.patch(f"/api/v1/logs/{log_id}/entries/0", json={"tach_time": "1300.0"}, headers=stale).status_code == 412
+    assert client.patch(f"/api/v1/logs/{log_id}/entries", json={"entries": {"0": {"tach_time": "1300.0"}}}, headers=stale).status_code == 412
+    assert client.delete(f"/api/v1/logs/{log_id}", headers=stale).status_code == 412
+    assert client.delete(f"/api/v1/logs/{log_id}", headers={"If-Match": '"someotherlog-1"'}).status_code == 412
+    assert client.get(f"/api/v1/logs/{log_id}").headers["ETag"] == current
+
+    response = client.patch(f"/api/v1/logs/{log_id}/entries/0", json={"tach_time": "1300.0"}, headers={"If-Match": current})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == log_etag(log_id, 2)
+    assert client.delete(f"/api/v1/logs/{log_id}", headers={"If-Match": "*"}).status_code == 200
+    # A conditional write to a log that is gone is a 404, not a conflict
+    assert client.delete(f"/api/v1/logs/{log_id}", headers={"If-Match": current}).status_code == 404
+
+
+def test_documents_from_before_revisions_match_revision_0(client):
+    doc = log_document()
+    del doc["revision"]
+    log_id = insert_log(doc)
+    etag = client.get(f"/api/v1/logs/{log_id}").headers["ETag"]
+    assert etag == log_etag(log_id, 0)
+    assert client.patch(f"/api/v1/logs/{log_id}/entries/0", json={"date": "2024-01-16"}, headers={"If-Match": etag}).status_code == 200
+
+
+def test_list_etag_changes_with_every_write(client):
+    doc = log_document()
+    log_id = insert_log(doc)
+    before = client.get("/api/v1/logs/").headers["ETag"]
+    assert client.put(f"/api/v1/logs/{log_id}", json=doc["structured_data"]).status_code == 200
+    response = client.get("/api/v1/logs/", headers={"If-None-Match": before})
+    assert response.status_code == 200
+    assert client.get("/api/v1/logs/", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
@@ -0,0 +1,193 @@
+"""
+Tests for per-entry PATCH writes: edits and derived fields written together, guarded by revision
+"""
+
+import asyncio
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import routes
+from database import Database
+from indexing import build_derived_fields
+
+
+def entry(description, parts):
+    return {
+        "description_of_work_performed": description,
+        "tach_time": "1250.5",
+        "part_number_replaced": parts,
+        "next_due_compliance": "Next inspection due in 50 hours",
+        "date": "2024-01-15",
+        "risk_level": "Low",
+        "urgency": "Normal",
+        "is_airworthy": True,
+    }
+
+
+def log_document():
+    structured_data = {
+        "aircraft_registration": "N123AB",
+        "aircraft_make_model": "Cessna 172",
+        "summary": "Tire and magneto work",
+        "is_mult": True,
+        "log_entries": [entry("Replaced left main tire", ["TIRE-1"]), entry("Timed magneto", ["MAG-1"])],
+    }
+    return {
+        "_id": ObjectId(),
+        "uploaded_by": "anonymous",
+        "image_filename": "scan.jpg",
+        "structured_data": structured_data,
+        "revision": 0,
+        **build_derived_fields(structured_data),
+    }
+
+
+def part_keys(doc):
+    return sorted(part["key"] for part in doc["parts"])
+
+
+def assert_derived_fields_current(doc):
+    derived = build_derived_fields(doc["structured_data"])
+    assert {field: doc[field] for field in derived} == derived
+
+
+@pytest.fixture
+def collection():
+    return AsyncMongoMockClient()["test"]["logs"]
+
+
+@pytest.mark.asyncio
+async def test_edit_and_derived_fields_written_together(collection):
+    doc = log_document()
+    await collection.insert_one(doc)
+
+    updated = await routes.patch_log_entries(collection, str(doc["_id"]), {1: {"part_number_replaced": ["MAG-2"]}}, None)
+
+    assert updated["revision"] == 1
+    assert updated["structured_data"]["log_entries"][1]["part_number_replaced"] == ["MAG-2"]
+    assert part_keys(updated) == ["MAG2", "TIRE1"]
+    assert_derived_fields_current(await collection.find_one({"_id": doc["_id"]}))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_patches_to_different_entries_keep_derived_fields_current(collection):
+    doc = log_document()
+    await collection.insert_one(doc)
+    log_id = str(doc["_id"])
+    original_find_one = collection.find_one
+    raced = []
+
+    async def find_one_then_race(*args, **kwargs):
+        snapshot = await original_find_one(*args, **kwargs)
+        if not raced:
+            # The other PATCH reads, computes and writes while this one holds its snapshot
+            raced.append(True)
+            collection.find_one = original_find_one
+            await routes.patch_log_entries(collection, log_id, {0: {"part_number_replaced": ["TIRE-2"]}}, None)
+            collection.find_one = find_one_then_race
+        return snapshot
+
+    collection.find_one = find_one_then_race
+    await routes.patch_log_entries(collection, log_id, {1: {"part_number_replaced": ["MAG-2"]}}, None)
+
+    stored = await original_find_one({"_id": doc["_id"]})
+    entries = stored["structured_data"]["log_entries"]
+    assert entries[0]["part_number_replaced"] == ["TIRE-2"]
+    assert entries[1]["part_number_replaced"] == ["MAG-2"]
+    # The slower write was recomputed from the newer document instead of overwriting its derived fields
+    assert part_keys(stored) == ["MAG2", "TIRE2"]
+    assert_derived_fields_current(stored)
+    assert stored["revision"] == 2
+
+
+@pytest.mark.asyncio
+async def test_conditional_patch_fails_when_the_log_moved_on(collection):
+    doc = log_document()
+    await collection.insert_one(doc)
+    log_id = str(doc["_id"])
+    await routes.patch_log_entries(collection, log_id, {0: {"tach_time": "1300"}}, None)
+
+    with pytest.raises(HTTPException) as error:
+        await routes.patch_log_entries(collection, log_id, {1: {"tach_time": "1301"}}, 0)
+    assert error.value.status_code == 412
+
+
+@pytest.mark.asyncio
+async def test_patch_gives_up_on_a_log_that_keeps_changing(collection):
+    doc = log_document()
+    await collection.insert_one(doc)
+    original_find_one = collection.find_one
+
+    async def find_one_then_write(*args, **kwargs):
+        snapshot = await original_find_one(*args, **kwargs)
+        await collection.update_one({"_id": doc["_id"]}, {"$inc": {"revision": 1}})
+        return snapshot
+
+    collection.find_one = find_one_then_write
+    with pytest.raises(HTTPException) as error:
+        await routes.patch_log_entries(collection, str(doc["_id"]), {0: {"tach_time": "1300"}}, None)
+    assert error.value.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_unknown_entry_fails_the_whole_patch(collection):
+    doc = log_document()
+    await collection.insert_one(doc)
+
+    with pytest.raises(HTTPException) as error:
+        await routes.patch_log_entries(collection, str(doc["_id"]), {0: {"tach_time": "1300"}, 5: {"tach_time": "1"}}, None)
+    assert error.value.status_code == 404
+
+    stored = await collection.find_one({"_id": doc["_id"]})
+    assert stored["structured_data"]["log_entries"][0]["tach_time"] == "1250.5"
+    assert stored["revision"] == 0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Database, "client", AsyncMongoMockClient())
+    monkeypatch.setattr(Database, "database_name", "test")
+    monkeypatch.setattr(Database, "collection_name", "logs")
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def insert_log(doc):
+    asyncio.run(Database.get_collection().insert_one(doc))
+    return str(doc["_id"])
+
+
+def test_patch_several_entries_in_one_request(client):
+    log_id = insert_log(log_document())
+
+    response = client.patch(f"/api/v1/logs/{log_id}/entries", json={
+        "entries": {"0": {"tach_time": "1300.0"}, "1": {"part_number_replaced": ["MAG-2"], "is_airworthy": False}},
+    })
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{log_id}-1"'
+    entries = response.json()["structured_data"]["log_entries"]
+    assert [entries[0]["tach_time"], entries[1]["part_number_replaced"], entries[1]["is_airworthy"]] == ["1300.0", ["MAG-2"], False]
+    # Derived index fields stay out of the response
+    assert "parts" not in response.json()
+
+
+def test_patch_several_entries_with_stale_etag_is_rejected(client):
+    log_id = insert_log(log_document())
+    client.patch(f"/api/v1/logs/{log_id}/entries/0", json={"tach_time": "1300.0"})
+
+    response = client.patch(f"/api/v1/logs/{log_id}/entries", json={"entries": {"1": {"tach_time": "1301.0"}}},
+                            headers={"If-Match": f'"{log_id}-0"'})
+    assert response.status_code == 412
+
+
+def test_patch_entries_rejects_empty_and_negative_edits(client):
+    log_id = insert_log(log_document())
+    assert client.patch(f"/api/v1/logs/{log_id}/entries", json={"entries": {}}).status_code == 400
+    assert client.patch(f"/api/v1/logs/{log_id}/entries", json={"entries": {"-1": {"tach_time": "1"}}}).status_code == 400
+    assert client.patch(f"/api/v1/logs/{log_id}/entries", json={"entries": {"0": {"unknown": "1"}}}).status_code == 422
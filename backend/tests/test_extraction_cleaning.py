@@ -0,0 +1,122 @@
+"""
+Tests for cleaning AI extractions, checked against the per-field clean_* methods they replaced
+"""
+
+import random
+
+import pytest
+
+from benchmark import LegacyCleaner, sample_extraction
+from extraction_cleaning import clean_boolean, clean_extraction, clean_extractions, clean_string, clean_string_list
+from models import LogEntry, MaintenanceLogData
+
+# Values the model has been seen to answer with, for every kind of field
+STRING_VALUES = [None, "", "  ", "N/A", "n/a", "Unknown", "NONE", "  none ", "1250.5", " 1,250.5 hrs ", "Replaced tire",
+                 "unknown part", "N/A - see note", 1250.5, 42, 0]
+LIST_VALUES = [None, [], "", "  ", "TIRE-123", " TIRE-123 ", ["TIRE-123", " tube 456 "], ["", None, "X1", 0, 77],
+               ["  ", "Y2"], 12345]
+BOOLEAN_VALUES = [True, False, "true", "True", "yes", "YES", "airworthy", "Airworthy", "1", "no", "false", "0",
+                  "not airworthy", ""]
+
+
+def random_answer(rng):
+    def entry():
+        return {
+            **{field: rng.choice(STRING_VALUES) for field in LegacyCleaner.ENTRY_STRING_FIELDS},
+            "part_number_replaced": rng.choice(LIST_VALUES),
+            "is_airworthy": rng.choice(BOOLEAN_VALUES),
+        }
+
+    return {
+        "aircraft_registration": rng.choice(STRING_VALUES),
+        "aircraft_make_model": rng.choice(STRING_VALUES),
+        "summary": rng.choice(STRING_VALUES),
+        "is_mult": rng.choice(BOOLEAN_VALUES),
+        "log_entries": [entry() for _ in range(rng.randint(0, 4))],
+    }
+
+
+def test_matches_the_old_cleaning_on_random_answers():
+    rng = random.Random(48)
+    legacy = LegacyCleaner()
+    for _ in range(2000):
+        answer = random_answer(rng)
+        assert clean_extraction(answer) == legacy.clean(answer)
+
+
+def test_matches_the_old_cleaning_on_realistic_answers():
+    legacy = LegacyCleaner()
+    for index in range(5):
+        answer = sample_extraction(index)
+        assert clean_extraction(answer) == legacy.clean(answer)
+
+
+def test_booleans_missing_from_an_answer_take_the_model_default():
+    legacy = LegacyCleaner()
+    answer = {"log_entries": [{"description_of_work_performed": "Washed"}]}
+    assert clean_extraction(answer) == legacy.clean(answer)
+    assert clean_extraction(answer)["is_mult"] is False
+    assert clean_extraction(answer)["log_entries"][0]["is_airworthy"] is True
+
+    # The one intended change: a null or numeric is_mult used to become True
+    assert legacy.clean({"is_mult": None, "log_entries": []})["is_mult"] is True
+    assert clean_extraction({"is_mult": None, "log_entries": []})["is_mult"] is False
+    # ...while a missing is_airworthy still defaults to airworthy, as before
+    assert clean_extraction({"log_entries": [{"is_airworthy": None}]})["log_entries"][0]["is_airworthy"] is True
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None), ("", None), ("  N/A ", None), ("Unknown", None), ("none", None),
+    ("  Replaced tire ", "Replaced tire"), ("unknown part", "unknown part"), (1250.5, "1250.5"), (0, "0"),
+])
+def test_clean_string(value, expected):
+    assert clean_string(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, []), ("", []), (" TIRE-123 ", ["TIRE-123"]), (["TIRE-123", " tube 456 ", "", None, 0, "  "], ["TIRE-123", "tube 456"]),
+    ([77], ["77"]), (12345, []),
+])
+def test_clean_string_list(value, expected):
+    assert clean_string_list(value) == expected
+
+
+@pytest.mark.parametrize("value, default, expected", [
+    (True, False, True), (False, True, False), ("Airworthy", False, True), ("no", True, False), (None, True, True),
+    (None, False, False), (1, False, False),
+])
+def test_clean_boolean(value, default, expected):
+    assert clean_boolean(value, default) is expected
+
+
+def test_old_single_entry_format_becomes_one_entry():
+    cleaned = clean_extraction({
+        "aircraft_registration": " N123AB ",
+        "description_of_work_performed": "Replaced tire",
+        "part_number_replaced": "TIRE-123",
+        "is_airworthy": "yes",
+        "is_mult": True,
+    })
+    assert cleaned["aircraft_registration"] == "N123AB"
+    assert cleaned["is_mult"] is False
+    assert len(cleaned["log_entries"]) == 1
+    assert cleaned["log_entries"][0]["description_of_work_performed"] == "Replaced tire"
+    assert cleaned["log_entries"][0]["part_number_replaced"] == ["TIRE-123"]
+    assert cleaned["log_entries"][0]["is_airworthy"] is True
+
+
+def test_every_model_field_is_cleaned():
+    cleaned = clean_extraction({"log_entries": [{}]})
+    assert set(cleaned) == set(MaintenanceLogData.model_fields)
+    assert set(cleaned["log_entries"][0]) == set(LogEntry.model_fields)
+
+
+def test_entries_that_are_not_objects_are_dropped():
+    assert clean_extraction({"log_entries": [None, "text", {"date": "2024-01-15"}]})["log_entries"][0]["date"] == "2024-01-15"
+    assert len(clean_extraction({"log_entries": [None, "text", {"date": "2024-01-15"}]})["log_entries"]) == 1
+
+
+def test_clean_extractions_validates_a_batch_into_models():
+    logs = clean_extractions([sample_extraction(index) for index in range(3)])
+    assert all(isinstance(log, MaintenanceLogData) for log in logs)
+    assert logs == [MaintenanceLogData(**clean_extraction(sample_extraction(index))) for index in range(3)]
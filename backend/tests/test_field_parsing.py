@@ -0,0 +1,115 @@
+"""
+Tests for tach/hobbs and date parsing into typed shadow values
+"""
+
+from datetime import date
+
+import pytest
+
+from field_parsing import (CONFIDENCE_AMBIGUOUS, CONFIDENCE_EXACT, CONFIDENCE_INFERRED, CONFIDENCE_UNPARSED,
+                           parse_entry_date, parse_entry_date_with_confidence, parse_hours, parse_hours_with_confidence)
+from aircraft_state import build_aircraft_state, log_source, timeline_items
+from indexing import build_entry_values, entry_in_range, entry_range_conditions
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1250.5", (1250.5, CONFIDENCE_EXACT)),
+    ("1250", (1250.0, CONFIDENCE_EXACT)),
+    (1250, (1250.0, CONFIDENCE_EXACT)),
+    (1250.5, (1250.5, CONFIDENCE_EXACT)),
+    ("1,250.5 hrs", (1250.5, CONFIDENCE_INFERRED)),
+    ("Tach 1250.5", (1250.5, CONFIDENCE_INFERRED)),
+    (".5 hrs", (0.5, CONFIDENCE_INFERRED)),
+    # Two readings: the first is kept, but flagged
+    ("TT 1250.5 / 1260.0", (1250.5, CONFIDENCE_AMBIGUOUS)),
+    ("n/a", (None, CONFIDENCE_UNPARSED)),
+    (True, (None, CONFIDENCE_UNPARSED)),
+    # Dates in a reading field are not hours
+    ("01/15/24", (None, CONFIDENCE_UNPARSED)),
+    ("2024-01-15", (None, CONFIDENCE_UNPARSED)),
+    ("Jan 15, 2024", (None, CONFIDENCE_UNPARSED)),
+    # Decimal commas read differently depending on the locale
+    ("1.250,5", (None, CONFIDENCE_UNPARSED)),
+    ("1,5 hrs", (None, CONFIDENCE_UNPARSED)),
+    ("1250.5 hrs.", (1250.5, CONFIDENCE_INFERRED)),
+    ("", (None, None)),
+    ("   ", (None, None)),
+    (None, (None, None)),
+])
+def test_hours(value, expected):
+    assert parse_hours_with_confidence(value) == expected
+    assert parse_hours(value) == expected[0]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-01-15", (date(2024, 1, 15), CONFIDENCE_EXACT)),
+    ("  2024-01-15 ", (date(2024, 1, 15), CONFIDENCE_EXACT)),
+    ("01/15/24", (date(2024, 1, 15), CONFIDENCE_INFERRED)),
+    ("01/15/2024", (date(2024, 1, 15), CONFIDENCE_INFERRED)),
+    ("01-15-2024", (date(2024, 1, 15), CONFIDENCE_INFERRED)),
+    ("2024/01/15", (date(2024, 1, 15), CONFIDENCE_INFERRED)),
+    ("Jan 15, 2024", (date(2024, 1, 15), CONFIDENCE_INFERRED)),
+    ("January  15, 2024", (date(2024, 1, 15), CONFIDENCE_INFERRED)),
+    ("15 January 2024", (date(2024, 1, 15), CONFIDENCE_INFERRED)),
+    # Month first is assumed; 3 April would read the same
+    ("03/04/24", (date(2024, 3, 4), CONFIDENCE_AMBIGUOUS)),
+    # Day and month equal: both readings give the same date
+    ("04/04/2024", (date(2024, 4, 4), CONFIDENCE_INFERRED)),
+    # A day past 12 can only be the day
+    ("12/25/2023", (date(2023, 12, 25), CONFIDENCE_INFERRED)),
+    # Day-first dates do not fit the month-first spellings
+    ("13/01/24", (None, CONFIDENCE_UNPARSED)),
+    ("02/30/2024", (None, CONFIDENCE_UNPARSED)),
+    ("last Tuesday", (None, CONFIDENCE_UNPARSED)),
+    ("", (None, None)),
+    (None, (None, None)),
+])
+def test_entry_dates(value, expected):
+    assert parse_entry_date_with_confidence(value) == expected
+    assert parse_entry_date(value) == expected[0]
+
+
+def test_entry_values_keep_index_and_confidence_per_entry():
+    structured_data = {"log_entries": [
+        {"tach_time": "1,250.5 hrs", "hobbs_time": "1300", "date": "03/04/24"},
+        {"tach_time": None, "hobbs_time": "unknown", "date": "2024-05-01"},
+    ]}
+    assert build_entry_values(structured_data) == [
+        {"entry_index": 0, "tach_time": 1250.5, "tach_time_confidence": CONFIDENCE_INFERRED,
+         "hobbs_time": 1300.0, "hobbs_time_confidence": CONFIDENCE_EXACT,
+         "date": "2024-03-04", "date_confidence": CONFIDENCE_AMBIGUOUS},
+        {"entry_index": 1, "tach_time": None, "tach_time_confidence": None,
+         "hobbs_time": None, "hobbs_time_confidence": CONFIDENCE_UNPARSED,
+         "date": "2024-05-01", "date_confidence": CONFIDENCE_EXACT},
+    ]
+
+
+def test_range_conditions_are_inclusive_and_need_a_value():
+    conditions = entry_range_conditions(tach_min=1200.0, tach_max=1250.5, date_from=date(2024, 3, 1), include_uncertain=True)
+    assert conditions == {"tach_time": {"$gte": 1200.0, "$lte": 1250.5}, "date": {"$gte": "2024-03-01"}}
+
+    assert entry_in_range({"tach_time": 1250.5, "date": "2024-03-01"}, conditions)
+    assert not entry_in_range({"tach_time": 1250.6, "date": "2024-03-01"}, conditions)
+    assert not entry_in_range({"tach_time": 1250.0, "date": "2024-02-29"}, conditions)
+    assert not entry_in_range({"tach_time": None, "date": "2024-03-01"}, conditions)
+    assert entry_range_conditions() == {}
+
+
+def test_range_conditions_match_only_exact_values_by_default():
+    conditions = entry_range_conditions(tach_min=1200.0)
+    assert conditions == {"tach_time": {"$gte": 1200.0}, "tach_time_confidence": CONFIDENCE_EXACT}
+
+    assert entry_in_range({"tach_time": 1250.5, "tach_time_confidence": CONFIDENCE_EXACT}, conditions)
+    assert not entry_in_range({"tach_time": 1250.5, "tach_time_confidence": CONFIDENCE_INFERRED}, conditions)
+    assert not entry_in_range({"tach_time": 1250.5, "tach_time_confidence": CONFIDENCE_AMBIGUOUS}, conditions)
+
+
+def test_current_tach_ignores_readings_that_are_not_exact():
+    doc = {"_id": "log1", "structured_data": {"log_entries": [
+        {"tach_time": "1250.5", "hobbs_time": "1300", "date": "2024-01-15"},
+        # A date typed into the tach field, and a second reading that may belong to another meter
+        {"tach_time": "2024-01-20", "date": "2024-01-20"},
+        {"tach_time": "TT 1260.0 / 9999.0", "hobbs_time": "1.310,5", "date": "2024-01-25"},
+    ]}}
+    state = build_aircraft_state("N123AB", [log_source(doc)], timeline_items(doc))
+    assert (state["current_tach_time"], state["current_hobbs_time"]) == (1250.5, 1300.0)
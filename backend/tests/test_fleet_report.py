@@ -0,0 +1,123 @@
+"""
+Tests for the multi-log report PDF: spooled logs, one section per log, streamed and cleaned up
+"""
+
+import asyncio
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import routes
+from database import Database
+from fleet_report import REPORT_PROJECTION, REPORT_SORT, log_title, render_report, spool_logs
+from indexing import build_derived_fields
+from serialization import loads
+
+
+def log_document(registration, index, entries=2):
+    structured_data = {
+        "aircraft_registration": registration,
+        "aircraft_make_model": "Cessna 172",
+        "summary": f"Visit {index}",
+        "log_entries": [
+            {"description_of_work_performed": f"Item {entry} of visit {index}", "tach_time": f"{1000 + index}.0", "date": "2024-01-15"}
+            for entry in range(entries)
+        ],
+    }
+    return {
+        "_id": ObjectId(),
+        "timestamp": datetime(2024, 1, 1) + timedelta(days=index),
+        "structured_data": structured_data,
+        **build_derived_fields(structured_data),
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Database, "client", AsyncMongoMockClient())
+    monkeypatch.setattr(Database, "database_name", "test")
+    monkeypatch.setattr(Database, "collection_name", "logs")
+
+    async def run(fn, *args, background=False):
+        return fn(*args)
+    monkeypatch.setattr(routes.pdf_pool, "run", run)
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def page_count(pdf):
+    return len(re.findall(rb"/Type /Page\b", pdf))
+
+
+def test_log_title():
+    assert log_title(3, {"timestamp": "2024-01-16T10:30:00", "structured_data": {"aircraft_registration": "N123AB", "log_entries": [{}]}}) == \
+        "Log 3 · N123AB · Unknown model · uploaded 2024-01-16 · 1 entry"
+
+
+@pytest.mark.asyncio
+async def test_logs_are_spooled_oldest_first(tmp_path):
+    collection = AsyncMongoMockClient()["test"]["logs"]
+    await collection.insert_many([log_document("N123AB", index) for index in (3, 1, 2)])
+    path = str(tmp_path / "logs.jsonl")
+    assert await spool_logs(collection.find({}, REPORT_PROJECTION).sort(REPORT_SORT), path) == 3
+    with open(path, "rb") as handle:
+        logs = [loads(line) for line in handle]
+    assert [log["structured_data"]["summary"] for log in logs] == ["Visit 1", "Visit 2", "Visit 3"]
+    assert set(logs[0]) == {"structured_data", "timestamp"}
+
+
+@pytest.mark.asyncio
+async def test_every_log_starts_its_own_page_after_the_contents(tmp_path):
+    collection = AsyncMongoMockClient()["test"]["logs"]
+    await collection.insert_many([log_document("N123AB", index) for index in range(40)])
+    spool_path, pdf_path = str(tmp_path / "logs.jsonl"), str(tmp_path / "report.pdf")
+    await spool_logs(collection.find({}, REPORT_PROJECTION).sort(REPORT_SORT), spool_path)
+
+    pages = render_report(spool_path, pdf_path, "Aircraft N123AB Maintenance Report", 40)
+    with open(pdf_path, "rb") as handle:
+        pdf = handle.read()
+    assert pdf.startswith(b"%PDF")
+    # A contents page, then at least one page per log
+    assert pages >= 41
+    assert page_count(pdf) == pages
+    # Each log has an outline entry, and a contents row linking to it
+    assert b"/Outlines" in pdf and b"/Count 40" in pdf
+    assert len(re.findall(rb"/Dest \[", pdf)) == 80
+
+
+def test_report_route(client, monkeypatch):
+    directories = []
+    mkdtemp = tempfile.mkdtemp
+
+    def recording_mkdtemp(*args, **kwargs):
+        directories.append(mkdtemp(*args, **kwargs))
+        return directories[-1]
+    monkeypatch.setattr(tempfile, "mkdtemp", recording_mkdtemp)
+
+    for index in range(3):
+        asyncio.run(Database.get_collection().insert_one(log_document("N123AB", index)))
+    asyncio.run(Database.get_collection().insert_one(log_document("G-ABCD", 9)))
+
+    response = client.get("/api/v1/export/report", params={"registration": "n-123ab"})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/pdf"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="maintenance_report_N123AB.pdf"'
+    assert response.headers["Content-Length"] == str(len(response.content))
+    assert page_count(response.content) >= 4
+    # The spool and the PDF are removed once sent
+    assert directories and not any(os.path.exists(directory) for directory in directories)
+
+    fleet = client.get("/api/v1/export/report")
+    assert fleet.headers["Content-Disposition"] == 'attachment; filename="maintenance_report_fleet.pdf"'
+    assert page_count(fleet.content) >= 5
+
+    assert client.get("/api/v1/export/report", params={"registration": "N999ZZ"}).status_code == 404
+    assert not any(os.path.exists(directory) for directory in directories)
@@ -0,0 +1,99 @@
+"""
+Tests for resized image derivatives: generated once, cached next to the original
+"""
+
+import asyncio
+from io import BytesIO
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import blob_storage
+import image_derivatives
+import routes
+from blob_storage import LocalBlobStore, iter_bytes
+from image_derivatives import delete_derivatives, derivative_name, open_derivative, render_derivative
+
+PHOTO = "maintenance_log_20240116_0123456789abcdef.jpg"
+
+
+def photo(width=2000, height=1000, orientation=None, mode="RGB"):
+    image = Image.new(mode, (width, height), "white" if mode == "RGB" else (255, 255, 255, 0))
+    output = BytesIO()
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        image.save(output, "JPEG", exif=exif)
+    else:
+        image.save(output, "PNG" if mode == "RGBA" else "JPEG")
+    return output.getvalue()
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Derivatives rendered by the image workers, which run in-process here"""
+    rendered = []
+
+    async def run(fn, *args, background=False):
+        rendered.append(args[1])
+        return fn(*args)
+    monkeypatch.setattr(image_derivatives.image_pool, "run", run)
+    return rendered
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalBlobStore(tmp_path)
+    monkeypatch.setattr(blob_storage, "_blob_store", store)
+    asyncio.run(store.save(PHOTO, iter_bytes(photo())))
+    return store
+
+
+def size_of(data):
+    with Image.open(BytesIO(data)) as image:
+        return image.format, image.size
+
+
+def test_render_bounds_the_long_edge():
+    assert size_of(render_derivative(photo(), "thumbnail")) == ("JPEG", (320, 160))
+    assert size_of(render_derivative(photo(), "medium")) == ("JPEG", (1280, 640))
+    # Never enlarged
+    assert size_of(render_derivative(photo(200, 100), "full")) == ("JPEG", (200, 100))
+    # Sideways phone photos are turned upright, transparent screenshots flattened
+    assert size_of(render_derivative(photo(orientation=6), "thumbnail")) == ("JPEG", (160, 320))
+    assert size_of(render_derivative(photo(mode="RGBA"), "thumbnail")) == ("JPEG", (320, 160))
+
+
+@pytest.mark.asyncio
+async def test_derivative_is_generated_once(store, renders):
+    first, second = await asyncio.gather(open_derivative(store, PHOTO, "thumbnail"), open_derivative(store, PHOTO, "thumbnail"))
+    assert first.name == second.name == derivative_name(PHOTO, "thumbnail")
+    await open_derivative(store, PHOTO, "thumbnail")
+    assert renders == ["thumbnail"]
+
+    await delete_derivatives(store, PHOTO)
+    assert not await store.exists(derivative_name(PHOTO, "thumbnail"))
+    await open_derivative(store, PHOTO, "thumbnail")
+    assert renders == ["thumbnail", "thumbnail"]
+
+
+def test_image_route_serves_sizes(store, renders):
+    app = FastAPI()
+    app.include_router(routes.router)
+    client = TestClient(app)
+
+    response = client.get(f"/api/v1/images/{PHOTO}", params={"size": "medium"})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/jpeg"
+    assert size_of(response.content) == ("JPEG", (1280, 640))
+    # The derivative of a content-addressed original never changes either
+    assert "immutable" in response.headers["Cache-Control"]
+    assert client.get(f"/api/v1/images/{PHOTO}", params={"size": "medium"}).content == response.content
+    assert renders == ["medium"]
+
+    assert client.get(f"/api/v1/images/{PHOTO}", params={"size": "huge"}).status_code == 422
+    assert client.get("/api/v1/images/missing.jpg", params={"size": "thumbnail"}).status_code == 404
+    asyncio.run(store.save("notes.txt", iter_bytes(b"not an image")))
+    assert client.get("/api/v1/images/notes.txt", params={"size": "thumbnail"}).status_code == 422
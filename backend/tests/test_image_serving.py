@@ -0,0 +1,124 @@
+"""
+Tests for serving stored images: media types, validators, byte ranges and caching
+"""
+
+import asyncio
+from datetime import timedelta
+from email.utils import format_datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import blob_storage
+import routes
+from blob_storage import LocalBlobStore, iter_bytes
+from etags import parse_byte_range
+
+IMAGE = "maintenance_log_20240116_0123456789abcdef.png"
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalBlobStore(tmp_path)
+    monkeypatch.setattr(blob_storage, "_blob_store", store)
+    asyncio.run(store.save(IMAGE, iter_bytes(DATA)))
+    return store
+
+
+@pytest.fixture
+def client(store):
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("header, size, expected", [
+    (None, 100, None),
+    ("bytes=0-9", 100, (0, 10)),
+    ("bytes=90-", 100, (90, 100)),
+    ("bytes=-10", 100, (90, 100)),
+    ("bytes=-500", 100, (0, 100)),
+    ("bytes=50-500", 100, (50, 100)),
+    ("bytes=9-0", 100, None),
+    ("bytes=0-1,5-9", 100, None),
+    ("items=0-9", 100, None),
+])
+def test_parse_byte_range(header, size, expected):
+    assert parse_byte_range(header, size) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        parse_byte_range(header, 100)
+
+
+def test_full_image_with_its_media_type_and_validators(client):
+    response = client.get(f"/api/v1/images/{IMAGE}")
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["Content-Type"] == "image/png"
+    assert response.headers["Content-Length"] == str(len(DATA))
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["Content-Disposition"] == f'inline; filename="{IMAGE}"'
+    # Content-addressed names never change their bytes
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert response.headers["ETag"] and response.headers["Last-Modified"]
+
+
+def test_other_names_are_revalidated(client, store):
+    asyncio.run(store.save("legacy_scan.jpg", iter_bytes(b"jpeg")))
+    response = client.get("/api/v1/images/legacy_scan.jpg")
+    assert (response.headers["Content-Type"], response.headers["Cache-Control"]) == ("image/jpeg", "no-cache")
+
+
+def test_conditional_requests_get_304(client, store):
+    response = client.get(f"/api/v1/images/{IMAGE}")
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+
+    for headers in ({"If-None-Match": etag}, {"If-None-Match": f'"other", W/{etag}'}, {"If-Modified-Since": last_modified}):
+        response = client.get(f"/api/v1/images/{IMAGE}", headers=headers)
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    # If-None-Match wins over If-Modified-Since
+    response = client.get(f"/api/v1/images/{IMAGE}", headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified})
+    assert response.status_code == 200
+    blob = asyncio.run(store.open(IMAGE))
+    earlier = format_datetime(blob.updated_at - timedelta(days=1), usegmt=True)
+    assert client.get(f"/api/v1/images/{IMAGE}", headers={"If-Modified-Since": earlier}).status_code == 200
+
+
+def test_byte_ranges(client):
+    response = client.get(f"/api/v1/images/{IMAGE}", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == DATA[100:200]
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(DATA)}"
+    assert response.headers["Content-Length"] == "100"
+
+    response = client.get(f"/api/v1/images/{IMAGE}", headers={"Range": "bytes=-16"})
+    assert (response.status_code, response.content) == (206, DATA[-16:])
+
+    response = client.get(f"/api/v1/images/{IMAGE}", headers={"Range": f"bytes={len(DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(DATA)}"
+
+    # Several ranges are answered with the whole image
+    response = client.get(f"/api/v1/images/{IMAGE}", headers={"Range": "bytes=0-1,5-9"})
+    assert (response.status_code, response.content) == (200, DATA)
+
+
+def test_if_range_only_resumes_an_unchanged_image(client):
+    etag = client.get(f"/api/v1/images/{IMAGE}").headers["ETag"]
+    response = client.get(f"/api/v1/images/{IMAGE}", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert (response.status_code, response.content) == (206, DATA[:10])
+    response = client.get(f"/api/v1/images/{IMAGE}", headers={"Range": "bytes=0-9", "If-Range": '"changed"'})
+    assert (response.status_code, response.content) == (200, DATA)
+
+
+def test_missing_and_unsafe_names_are_404(client):
+    assert client.get("/api/v1/images/missing.png").status_code == 404
+    assert client.get("/api/v1/images/..%2F..%2Fetc%2Fpasswd").status_code == 404
@@ -0,0 +1,117 @@
+"""
+Tests for local risk/urgency scoring of log entries from keywords
+"""
+
+import json
+import random
+import re
+
+import pytest
+
+import keyword_scoring
+from keyword_scoring import (DEFAULT_KEYWORD_GROUPS, SCORE_RISK, SCORE_URGENCY, KeywordScorer, _trie_pattern,
+                             build_entry_scores, get_keyword_scorer)
+
+
+@pytest.fixture
+def scorer():
+    return KeywordScorer(DEFAULT_KEYWORD_GROUPS)
+
+
+def test_levels_follow_the_number_of_distinct_keywords(scorer):
+    assert scorer.score_entry({"description_of_work_performed": "Washed aircraft"})["risk_level"] == "Low"
+    assert scorer.score_entry({"description_of_work_performed": "Timed magneto"})["risk_level"] == "Medium"
+    assert scorer.score_entry({"description_of_work_performed": "Timed magneto, magneto checked"})["risk_level"] == "Medium"
+    assert scorer.score_entry({"description_of_work_performed": "Timed magneto, checked propeller"})["risk_level"] == "High"
+    assert scorer.score_entry({"description_of_work_performed": "Engine, propeller and brake work"})["risk_level"] == "High"
+
+
+def test_keywords_match_whole_words_case_and_line_breaks_aside(scorer):
+    scored = scorer.score_entry({"description_of_work_performed": "Checked LANDING\n  GEAR; sparkplugs and rudderless notes"})
+    assert scored["risk_level_factors"] == ["landing gear"]
+
+
+def test_longest_overlapping_keyword_wins(scorer):
+    scored = scorer.score_entry({"description_of_work_performed": "Replaced engine mount bolts"})
+    assert scored["risk_level_factors"] == ["engine mount"]
+
+
+def test_groups_read_only_their_own_fields(scorer):
+    # "overdue" is time-sensitive wording in the description, an AD problem in ad_compliance
+    in_description = scorer.score_entry({"description_of_work_performed": "Oil change overdue"})
+    assert (in_description["risk_level_factors"], in_description["urgency_factors"]) == ([], ["overdue"])
+
+    in_ad_compliance = scorer.score_entry({"ad_compliance": "AD 2020-01-02 overdue, not complied"})
+    assert (in_ad_compliance["risk_level_factors"], in_ad_compliance["urgency_factors"]) == (["overdue", "not complied"], [])
+
+
+def test_agreement_with_the_model_rating(scorer):
+    scored = scorer.score_entry({
+        "description_of_work_performed": "Engine grounded, emergency locator overdue",
+        "risk_level": " medium ",
+        "urgency": "CRITICAL",
+    })
+    assert (scored["risk_level"], scored["risk_level_agrees"]) == ("Medium", True)
+    assert (scored["urgency"], scored["urgency_agrees"]) == ("High", True)
+
+    scored = scorer.score_entry({"description_of_work_performed": "Washed aircraft", "risk_level": "High", "urgency": "routine"})
+    assert (scored["risk_level_agrees"], scored["urgency_agrees"]) == (False, True)
+
+
+@pytest.mark.parametrize("rating", [None, "", "bogus", 3])
+def test_ratings_the_scale_does_not_know_are_not_compared(scorer, rating):
+    assert scorer.score_entry({"description_of_work_performed": "Washed", "risk_level": rating})["risk_level_agrees"] is None
+
+
+def test_missing_and_non_text_fields_score_lowest(scorer):
+    for entry in ({}, {"description_of_work_performed": None}, {"description_of_work_performed": 12}):
+        scored = scorer.score_entry(entry)
+        assert (scored["risk_level"], scored["urgency"]) == ("Low", "Normal")
+
+
+def test_entry_scores_are_indexed_by_entry():
+    scores = build_entry_scores({"log_entries": [
+        {"description_of_work_performed": "Washed aircraft", "risk_level": "Low", "urgency": "Normal"},
+        {"description_of_work_performed": "Propeller overdue", "risk_level": "Low", "urgency": "Normal"},
+    ]})
+    assert [(score["entry_index"], score["risk_level"], score["urgency"]) for score in scores] == [
+        (0, "Low", "Normal"),
+        (1, "Medium", "Medium"),
+    ]
+    assert build_entry_scores({}) == []
+
+
+def test_custom_groups_from_a_file(tmp_path, monkeypatch):
+    groups = {"corrosion": {"score": SCORE_URGENCY, "fields": ["description_of_work_performed"], "keywords": ["corrosion", "rust"]}}
+    path = tmp_path / "keywords.json"
+    path.write_text(json.dumps(groups))
+    monkeypatch.setenv("SCORING_KEYWORDS_FILE", str(path))
+    get_keyword_scorer.cache_clear()
+    try:
+        scored = get_keyword_scorer().score_entry({"description_of_work_performed": "Engine: rust and corrosion found"})
+        assert (scored["risk_level_factors"], scored["urgency_factors"]) == ([], ["rust", "corrosion"])
+    finally:
+        get_keyword_scorer.cache_clear()
+
+
+@pytest.mark.parametrize("groups, message", [
+    ({"bad": {"score": "cost", "fields": ["ad_compliance"], "keywords": ["x"]}}, "unknown score"),
+    ({"bad": {"score": SCORE_RISK, "fields": ["ad_compliance"], "keywords": ["-dash"]}}, "letter or digit"),
+])
+def test_invalid_groups_are_rejected(groups, message):
+    with pytest.raises(ValueError, match=message):
+        KeywordScorer(groups)
+
+
+def test_trie_pattern_matches_like_a_longest_first_alternation():
+    rng = random.Random(49)
+    alphabet = "abcde"
+    for _ in range(200):
+        keywords = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))) for _ in range(rng.randint(1, 12))}
+        text = " ".join("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 6))) for _ in range(30))
+        alternation = "|".join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))
+        assert re.findall(rf"\b{_trie_pattern(keywords)}\b", text) == re.findall(rf"\b(?:{alternation})\b", text)
+
+
+def test_default_groups_feed_known_scores():
+    assert {group["score"] for group in DEFAULT_KEYWORD_GROUPS.values()} <= set(keyword_scoring.SCORE_LEVELS)
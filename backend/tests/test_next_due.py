@@ -0,0 +1,120 @@
+"""
+Tests for parsing next-due statements into due points
+"""
+
+from datetime import date
+
+import pytest
+
+from indexing import build_derived_fields
+from next_due import due_subject, parse_next_due
+
+
+@pytest.mark.parametrize("text, entry_tach, entry_date, expected", [
+    # Hour intervals count from the entry's own tach time
+    ("Next inspection due in 50 hours", 1250.5, None, ("inspection", 1300.5, None)),
+    ("Oil change within 25 more hrs", 1000.0, None, ("oil change", 1025.0, None)),
+    ("Next oil change at 1300 tach", None, None, ("oil change", 1300.0, None)),
+    ("Oil change due @ 1,300.0 hrs", 1250.5, None, ("oil change", 1300.0, None)),
+    ("Inspection due by 1350 hours", 1250.5, None, ("inspection", 1350.0, None)),
+    # Calendar limits
+    ("Annual due 2025-03-01", None, None, ("annual", None, "2025-03-01")),
+    ("Pitot static due 3/15/2025", None, None, ("pitot static", None, "2025-03-15")),
+    ("Annual due March 1, 2025", None, None, ("annual", None, "2025-03-01")),
+    # A month alone runs to its end
+    ("Annual due 01/2025", None, None, ("annual", None, "2025-01-31")),
+    ("ELT battery expires Mar 2026", None, None, ("elt battery", None, "2026-03-31")),
+    ("Transponder check due in 24 months", None, "2024-01-31", ("transponder check", None, "2026-01-31")),
+    ("Fire extinguisher due in 30 days", None, date(2024, 1, 15), ("fire extinguisher", None, "2024-02-14")),
+    ("Inspection due in 2 weeks", None, "01/15/24", ("inspection", None, "2024-01-29")),
+    # Month arithmetic clamps to the last day of shorter months
+    ("Inspection due in 1 year", None, "2024-02-29", ("inspection", None, "2025-02-28")),
+    ("Inspection due in 1 month", None, "2024-01-31", ("inspection", None, "2024-02-29")),
+    # Both limits, whichever comes first
+    ("Next inspection due in 50 hours or 12 months, whichever comes first", 1250.5, "01/15/24",
+     ("inspection", 1300.5, "2025-01-15")),
+])
+def test_due_points(text, entry_tach, entry_date, expected):
+    subject, due_tach, due_date = expected
+    assert parse_next_due(text, entry_tach, entry_date) == {"subject": subject, "due_tach": due_tach, "due_date": due_date}
+
+
+def test_interval_wins_over_a_count_naming_the_item():
+    due = parse_next_due("100 hr inspection due in 50 hours or 12 months, whichever comes first", 1250.5, "2024-01-15")
+    assert due == {"subject": "100 hr inspection", "due_tach": 1300.5, "due_date": "2025-01-15"}
+
+    due = parse_next_due("12 month transponder check due in 6 months", None, "2024-01-15")
+    assert due["due_date"] == "2024-07-15"
+
+    # With nothing else to go on, the count is the interval
+    assert parse_next_due("100 hr inspection", 1250.5)["due_tach"] == 1350.5
+
+
+@pytest.mark.parametrize("text, entry_tach, entry_date", [
+    ("No further action required", 1250.5, "2024-01-15"),
+    ("", 1250.5, None),
+    (None, None, None),
+    # A relative limit without its anchor says nothing usable
+    ("Next inspection due in 50 hours", None, None),
+    ("Transponder check due in 24 months", None, None),
+    # No 13th month
+    ("ELT due 13/2025", None, None),
+])
+def test_statements_without_a_due_point(text, entry_tach, entry_date):
+    assert parse_next_due(text, entry_tach, entry_date) is None
+
+
+def test_subject_ignores_filler_words():
+    assert due_subject("Next annual is due 2025-03-01") == "annual"
+    assert due_subject("The oil change @ 1300") == "oil change"
+    assert due_subject("due in 2 weeks") is None
+
+
+def test_ad_and_sb_numbers_are_not_dates():
+    due = parse_next_due("AD 2020-12-05 recurring every 100 hours", 1250.5, "2024-01-15")
+    assert due == {"subject": "ad 2020 12 05 recurring", "due_tach": 1350.5, "due_date": None}
+
+    assert parse_next_due("Comply with AD 2021-03-01 at next annual", None, "2024-01-15") is None
+    assert parse_next_due("SB 2023-01-15 due 2025-03-01")["due_date"] == "2025-03-01"
+    # Without the label a date is a date
+    assert parse_next_due("Recheck due 2020-12-05")["due_date"] == "2020-12-05"
+
+
+def test_bare_count_past_the_entry_tach_is_a_reading():
+    due = parse_next_due("Next due: 1/15/2025 or 1350 hours", 1250.0, "2024-01-15")
+    assert (due["due_tach"], due["due_date"]) == (1350.0, "2025-01-15")
+
+    # Led by "in"/"every" it is an interval however large
+    assert parse_next_due("Overhaul due in 2000 hours", 1250.0)["due_tach"] == 3250.0
+    # A count below the entry's tach can only be an interval
+    assert parse_next_due("100 hr inspection", 1250.5)["due_tach"] == 1350.5
+    # With no tach to compare against a bare count says nothing usable
+    assert parse_next_due("1350 hours", None) is None
+
+
+def test_subject_falls_back_to_the_work_description():
+    due = parse_next_due("due 2025 03 01 or 01/2026", None, None, "Annual inspection IAW 14 CFR 43")
+    assert due["subject"] == "annual inspection iaw 14 cfr 43"
+    # The item named by the statement wins over the description
+    assert parse_next_due("Annual due 01/2026", None, None, "Replaced tire")["subject"] == "annual"
+    assert parse_next_due("due 01/2026")["subject"] is None
+
+
+def test_statements_without_an_item_share_their_description_subject():
+    derived = build_derived_fields({"log_entries": [
+        {"description_of_work_performed": "Annual inspection", "next_due_compliance": "Due 01/2025"},
+        {"description_of_work_performed": "Annual inspection", "next_due_compliance": "Due 01/2026"},
+    ]})
+    assert [item["subject"] for item in derived["due_items"]] == ["annual inspection", "annual inspection"]
+
+
+def test_due_items_anchor_on_each_entry_s_parsed_values():
+    derived = build_derived_fields({"log_entries": [
+        {"tach_time": "1,250.5 hrs", "date": "01/15/24", "next_due_compliance": "Oil change due in 50 hours"},
+        {"tach_time": "900", "next_due_compliance": "None"},
+        {"tach_time": "1300", "date": "2024-02-01", "next_due_compliance": "Annual due in 12 months"},
+    ]})
+    assert derived["due_items"] == [
+        {"entry_index": 0, "subject": "oil change", "due_tach": 1300.5, "due_date": None},
+        {"entry_index": 2, "subject": "annual", "due_tach": None, "due_date": "2025-02-01"},
+    ]
@@ -0,0 +1,92 @@
+"""
+Tests for the part-number lookup: canonical keys, the derived index and the lookup route
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import routes
+from database import Database
+from indexing import build_derived_fields, build_part_index, part_number_key
+
+
+def log_document(registration, uploaded, entries):
+    structured_data = {"aircraft_registration": registration, "aircraft_make_model": "Cessna 172", "log_entries": entries}
+    return {
+        "_id": ObjectId(),
+        "uploaded_by": "anonymous",
+        "timestamp": uploaded,
+        "structured_data": structured_data,
+        **build_derived_fields(structured_data),
+    }
+
+
+def entry(parts, date="2024-01-15", tach="1250.5"):
+    return {"description_of_work_performed": "Replaced parts", "part_number_replaced": parts, "date": date, "tach_time": tach}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Database, "client", AsyncMongoMockClient())
+    monkeypatch.setattr(Database, "database_name", "test")
+    monkeypatch.setattr(Database, "collection_name", "logs")
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("text, key", [
+    ("12345-6", "123456"),
+    ("12345 6", "123456"),
+    ("p/n 123456", "123456"),
+    ("PN: ch48110-1", "CH481101"),
+    ("Part No. 5/8-24", "5824"),
+    (" - ", None),
+    (None, None),
+])
+def test_part_number_key(text, key):
+    assert part_number_key(text) == key
+
+
+def test_part_index_has_one_item_per_part_per_entry():
+    parts = build_part_index({"log_entries": [
+        entry(["CH48110-1", "ch48110 1", "P/N 5824"], date="2024-01-15"),
+        entry(["CH48110-1", ""], date="2024-02-01", tach="1300.0"),
+        entry(None),
+    ]})
+    assert [(part["key"], part["part_number"], part["entry_index"], part["date"]) for part in parts] == [
+        ("CH481101", "CH48110-1", 0, "2024-01-15"),
+        ("5824", "P/N 5824", 0, "2024-01-15"),
+        ("CH481101", "CH48110-1", 1, "2024-02-01"),
+    ]
+
+
+def test_lookup_finds_every_installation_newest_first(client):
+    older = log_document("N123AB", datetime(2023, 5, 1), [entry(["CH48110-1"], date="2023-04-30")])
+    newer = log_document("G-ABCD", datetime(2024, 1, 16), [entry(["Tire-123"]), entry(["ch48110 1", "CH48111"], tach="1300.0")])
+    other = log_document("N999ZZ", datetime(2024, 2, 1), [entry(["Tube-456"])])
+    for doc in (older, newer, other):
+        asyncio.run(Database.get_collection().insert_one(doc))
+
+    response = client.get("/api/v1/parts/p%2Fn%20CH48110-1")
+    assert response.status_code == 200
+    assert [(item["log_id"], item["entry_index"], item["aircraft_registration"], item["part_number"], item["tach_time"])
+            for item in response.json()] == [
+        (str(newer["_id"]), 1, "G-ABCD", "ch48110 1", "1300.0"),
+        (str(older["_id"]), 0, "N123AB", "CH48110-1", "1250.5"),
+    ]
+
+    prefix = client.get("/api/v1/parts/CH4811", params={"match": "prefix"}).json()
+    assert sorted(item["part_number"] for item in prefix) == ["CH48110-1", "CH48111", "ch48110 1"]
+    assert len(client.get("/api/v1/parts/CH4811", params={"match": "prefix", "limit": 1, "skip": 1}).json()) == 1
+    assert client.get("/api/v1/parts/CH4811").json() == []
+
+
+def test_lookup_rejects_a_part_number_without_characters(client):
+    assert client.get("/api/v1/parts/--").status_code == 400
@@ -0,0 +1,139 @@
+"""
+Tests for the rendered PDF cache: hits, invalidation on edits and eviction during a download
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import blob_storage
+import routes
+from blob_storage import LocalBlobStore
+from database import Database
+from indexing import build_derived_fields
+from pdf_cache import cache_blob_name, evict, invalidate_log, pdf_cache_key, read_cached_pdf, store_pdf
+
+
+def log_document(description="Oil change"):
+    structured_data = {
+        "aircraft_registration": "N123AB",
+        "aircraft_make_model": "Cessna 172",
+        "log_entries": [{"description_of_work_performed": description, "tach_time": "1250.5", "date": "2024-01-15"}],
+    }
+    return {
+        "_id": ObjectId(),
+        "uploaded_by": "anonymous",
+        "timestamp": datetime(2024, 1, 16),
+        "image_filename": "scan.jpg",
+        "structured_data": structured_data,
+        "revision": 0,
+        **build_derived_fields(structured_data),
+    }
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalBlobStore(tmp_path)
+    monkeypatch.setattr(blob_storage, "_blob_store", store)
+    return store
+
+
+@pytest.fixture
+def cache_collection():
+    return AsyncMongoMockClient()["test"]["logs_pdf_cache"]
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Logs rendered by the PDF workers, which run in-process here"""
+    rendered = []
+
+    async def run(fn, *args, background=False):
+        rendered.append(args[0]["structured_data"]["log_entries"][0]["description_of_work_performed"])
+        return fn(*args)
+    monkeypatch.setattr(routes.pdf_pool, "run", run)
+    return rendered
+
+
+@pytest.fixture
+def client(monkeypatch, store):
+    monkeypatch.setattr(Database, "client", AsyncMongoMockClient())
+    monkeypatch.setattr(Database, "database_name", "test")
+    monkeypatch.setattr(Database, "collection_name", "logs")
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def export_pdf(client, log_id):
+    response = client.post(f"/api/v1/logs/{log_id}/export", json={"format": "pdf", "log_id": log_id})
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+    assert int(response.headers["Content-Length"]) == len(response.content)
+    return response.content
+
+
+def test_unchanged_log_is_served_from_the_cache(client, store, renders):
+    doc = log_document()
+    asyncio.run(Database.get_collection().insert_one(doc))
+    log_id = str(doc["_id"])
+
+    first = export_pdf(client, log_id)
+    assert export_pdf(client, log_id) == first
+    assert renders == ["Oil change"]
+
+    # An edit renders afresh and drops the PDF of the old content
+    old_key = pdf_cache_key(doc["structured_data"])
+    structured_data = {**doc["structured_data"], "log_entries": [{"description_of_work_performed": "Tire change"}]}
+    assert client.put(f"/api/v1/logs/{log_id}", json=structured_data).status_code == 200
+    assert not asyncio.run(store.exists(cache_blob_name(old_key)))
+    export_pdf(client, log_id)
+    assert renders == ["Oil change", "Tire change"]
+
+
+@pytest.mark.asyncio
+async def test_invalidation_keeps_pdfs_other_logs_use(store, cache_collection):
+    key = pdf_cache_key({"log_entries": []})
+    await store_pdf(store, cache_collection, key, "a", b"%PDF-1 shared")
+    assert await read_cached_pdf(store, cache_collection, key, "b") == b"%PDF-1 shared"
+
+    await invalidate_log(store, cache_collection, "a")
+    assert await read_cached_pdf(store, cache_collection, key, "b") == b"%PDF-1 shared"
+    await invalidate_log(store, cache_collection, "b")
+    assert await read_cached_pdf(store, cache_collection, key, "b") is None
+    assert not await store.exists(cache_blob_name(key))
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_pdfs_are_evicted(store, cache_collection, monkeypatch):
+    monkeypatch.setenv("PDF_CACHE_MAX_BYTES", "250")
+    for key in ("a", "b"):
+        await store_pdf(store, cache_collection, key, key, b"%" * 100)
+    await cache_collection.update_one({"_id": "b"}, {"$set": {"last_used": datetime(2024, 1, 1)}})
+    await read_cached_pdf(store, cache_collection, "a", "a")
+    await store_pdf(store, cache_collection, "c", "c", b"%" * 100)
+
+    assert sorted(entry["_id"] for entry in await cache_collection.find().to_list(None)) == ["a", "c"]
+    assert not await store.exists(cache_blob_name("b"))
+
+
+@pytest.mark.asyncio
+async def test_eviction_during_a_download_does_not_cut_it_short(store, cache_collection):
+    await store_pdf(store, cache_collection, "a", "a", b"%PDF-1 " + b"x" * 200_000)
+    pdf_bytes = await read_cached_pdf(store, cache_collection, "a", "a")
+    # Another request evicts everything before this response is sent
+    assert await evict(store, cache_collection, limit=0) == 1
+    assert pdf_bytes == b"%PDF-1 " + b"x" * 200_000
+
+
+@pytest.mark.asyncio
+async def test_a_blob_lost_behind_the_index_s_back_is_a_miss(store, cache_collection):
+    await store_pdf(store, cache_collection, "a", "a", b"%PDF-1")
+    await store.delete(cache_blob_name("a"))
+    assert await read_cached_pdf(store, cache_collection, "a", "a") is None
+    assert await cache_collection.count_documents({}) == 0
@@ -0,0 +1,69 @@
+"""
+Tests for AD and SB identifiers and their compliance per reference
+"""
+
+import pytest
+
+from references import ad_key, ad_keys, build_references, mask_references, reference_key, sb_keys
+
+
+def references(ad_compliance, service_bulletin_reference=None):
+    structured_data = {"log_entries": [
+        {"ad_compliance": ad_compliance, "service_bulletin_reference": service_bulletin_reference},
+    ]}
+    return [(item["type"], item["id"], item["complied"]) for item in build_references(structured_data, [{"date": None}])]
+
+
+@pytest.mark.parametrize("text, keys", [
+    ("AD 2023-15-02 complied with", ["2023-15-02"]),
+    ("c/w AD 23-15-02 para (g)", ["2023-15-02"]),
+    ("AD No. 67-12-01 R2", ["1967-12-01"]),
+    ("EASA AD 2021-0123", ["2021-0123"]),
+    ("AD 2020-12-05 and AD 2020-12-05R1", ["2020-12-05"]),
+    # Unlabelled numbers are dates unless the user gave only that
+    ("Inspected 2024-01-15", []),
+])
+def test_ad_keys(text, keys):
+    assert ad_keys(text) == keys
+
+
+def test_bare_numbers():
+    assert ad_keys("2023-15-02", bare=True) == ["2023-15-02"]
+    assert ad_key("23-15-02") == "2023-15-02"
+    assert sb_keys("72-0123 Rev 2", bare=True) == ["72-0123"]
+    assert sb_keys("MSB M20-123 and S.B. 2023-01") == ["M20-123", "2023-01"]
+    assert reference_key("SB", "sb 72-0123") == "72-0123"
+
+
+def test_masking_blanks_only_labelled_numbers():
+    assert mask_references("AD 2020-12-05 due 2025-03-01").split() == ["due", "2025-03-01"]
+    assert mask_references("SB 72-0123 at 1300").split() == ["at", "1300"]
+    assert mask_references(None) == ""
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Each reference is judged by its own clause
+    ("AD 2020-12-05 complied; AD 2021-03-01 not applicable/deferred", [True, False]),
+    ("AD 2020-12-05 complied, AD 2021-03-01 deferred", [True, False]),
+    ("AD 2020-12-05 deferred. AD 2021-03-01 complied with", [False, True]),
+    ("AD 2020-12-05 complied\nAD 2021-03-01 pending parts", [True, False]),
+    # Words leading the clause, or closing it, cover every reference in it
+    ("Deferred: AD 2020-12-05, AD 2021-03-01", [False, False]),
+    ("AD 2020-12-05, AD 2021-03-01 deferred", [False, False]),
+    ("Complied with AD 2020-12-05 and AD 2021-03-01", [True, True]),
+    ("Complied with AD 2020-12-05, AD 2021-03-01 deferred", [True, False]),
+    # Saying neither counts as complied, as before
+    ("AD 2020-12-05, AD 2021-03-01", [True, True]),
+])
+def test_compliance_is_decided_per_reference(text, expected):
+    assert [complied for _, _, complied in references(text)] == expected
+
+
+def test_references_across_fields():
+    assert references("c/w AD 23-15-02 para (g); SB 72-0123 deferred", "SB 72-0456 Rev 2 complied") == [
+        ("AD", "2023-15-02", True),
+        ("SB", "72-0456", True),
+        ("SB", "72-0123", False),
+    ]
+    # An AD cited in the SB field keeps the SB field's own wording
+    assert references(None, "Per AD 2021-03-01 not complied") == [("AD", "2021-03-01", False)]
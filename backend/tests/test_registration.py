@@ -0,0 +1,111 @@
+"""
+Tests for aircraft registration canonicalization and nationality lookup
+"""
+
+import re
+
+import pytest
+
+from indexing import build_derived_fields
+from registration import (NATIONALITY_MARKS, parse_registration, registration_country, registration_format, registration_key,
+                          registration_prefix_pattern)
+
+
+@pytest.mark.parametrize("written, key, display, country", [
+    ("N123AB", "N123AB", "N123AB", "United States"),
+    ("n-123ab", "N123AB", "N123AB", "United States"),
+    (" N 123AB ", "N123AB", "N123AB", "United States"),
+    ("N12345", "N12345", "N12345", "United States"),
+    ("G-ABCD", "GABCD", "G-ABCD", "United Kingdom"),
+    ("g abcd", "GABCD", "G-ABCD", "United Kingdom"),
+    ("OY.ABC", "OYABC", "OY-ABC", "Denmark"),
+    ("D-EABC", "DEABC", "D-EABC", "Germany"),
+    ("D-1234", "D1234", "D-1234", "Germany"),
+    ("HB-123", "HB123", "HB-123", "Switzerland"),
+    ("VH-XYZ", "VHXYZ", "VH-XYZ", "Australia"),
+    ("9V-SKA", "9VSKA", "9V-SKA", "Singapore"),
+    ("JA801A", "JA801A", "JA801A", "Japan"),
+    ("HL7700", "HL7700", "HL7700", "South Korea"),
+    ("B-1234", "B1234", "B-1234", "China"),
+    ("RA-12345", "RA12345", "RA-12345", "Russia"),
+    ("2-ABCD", "2ABCD", "2-ABCD", "Guernsey"),
+])
+def test_registrations_across_nationality_marks(written, key, display, country):
+    parsed = parse_registration(written)
+    assert (parsed["key"], parsed["registration"], parsed["country"]) == (key, display, country)
+    assert registration_key(written) == key
+    assert registration_country(written) == country
+
+
+@pytest.mark.parametrize("written, mark, country", [
+    # One-letter marks are prefixes of two-letter ones; the format of the rest decides
+    ("C-GABC", "C", "Canada"),
+    ("CGABC", "C", "Canada"),
+    ("CC-ABC", "CC", "Chile"),
+    ("CS-TTA", "CS", "Portugal"),
+    ("CCABC", "CC", "Chile"),
+])
+def test_longest_fitting_mark_wins(written, mark, country):
+    parsed = parse_registration(written)
+    assert (parsed["nationality_mark"], parsed["country"]) == (mark, country)
+
+
+@pytest.mark.parametrize("written, key", [
+    # N-numbers have no I or O, so OCR'd letters are read as the digits
+    ("N12O4", "N1204"),
+    ("NI23", "N123"),
+])
+def test_n_number_lookalike_letters_are_corrected(written, key):
+    assert registration_key(written) == key
+    assert registration_format(key) == "US"
+
+
+@pytest.mark.parametrize("written", [
+    "N0123",     # no leading zero
+    "N123456",   # at most five characters
+    "N123ABC",   # at most two letters
+    "G-ABCDE",   # four letters after G
+    "GABC",
+    "C-ABCD",    # Canadian marks start with F, G or I
+    "XX-123",    # unknown mark
+    "N",
+])
+def test_registrations_that_fit_no_format(written):
+    assert parse_registration(written) is None
+    assert registration_country(written) is None
+    # The separator-free key is kept, so prefix searches on partial input still work
+    assert registration_key(written) == re.sub(r"[\s.\-]", "", written.upper())
+    assert registration_format(registration_key(written)) is None
+
+
+@pytest.mark.parametrize("written", [None, "", "   ", "-", "N!23", 123])
+def test_unusable_input_has_no_key(written):
+    assert registration_key(written) is None
+    assert parse_registration(written) is None
+
+
+def test_format_classifies_keys():
+    assert registration_format("N123AB") == "US"
+    assert registration_format("GABCD") == "ICAO"
+    assert registration_format(None) is None
+
+
+def test_no_mark_is_shadowed_by_another():
+    # Every mark must win for at least one registration in its own format
+    suffixes = ["ABC", "ABCD", "GABC", "FABC", "123", "1234", "12345", "123AB", "801A", "A123", "C123"]
+    for mark in NATIONALITY_MARKS:
+        marks = {(parse_registration(f"{mark}-{suffix}") or {}).get("nationality_mark") for suffix in suffixes}
+        assert mark in marks, mark
+
+
+def test_prefix_pattern_is_anchored_and_escaped():
+    assert registration_prefix_pattern("N12") == "^N12"
+    assert re.match(registration_prefix_pattern(registration_key("n-12")), "N123AB")
+
+
+def test_derived_fields_carry_key_and_country():
+    derived = build_derived_fields({"aircraft_registration": "cc-abc", "log_entries": []})
+    assert (derived["registration_key"], derived["registration_country"]) == ("CCABC", "Chile")
+
+    derived = build_derived_fields({"aircraft_registration": "XX-123", "log_entries": []})
+    assert (derived["registration_key"], derived["registration_country"]) == ("XX123", None)
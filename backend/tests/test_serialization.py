@@ -0,0 +1,107 @@
+"""
+Tests for serializing stored documents without validation against the validating path
+"""
+
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+from bson import Decimal128, ObjectId
+
+from indexing import build_derived_fields
+from models import LogEntry, MaintenanceLog
+from serialization import FastJSONResponse, StoredDocumentSerializer, default_filler, dumps, dumps_line, loads
+
+stored_logs = StoredDocumentSerializer(MaintenanceLog)
+
+
+def test_dumps_encodes_stored_types():
+    log_id = ObjectId()
+    content = {
+        "_id": log_id,
+        "naive": datetime(2024, 1, 16, 10, 30),
+        "aware": datetime(2024, 1, 16, 10, 30, tzinfo=timezone.utc),
+        "day": date(2024, 1, 15),
+        "hours": Decimal128(Decimal("1250.5")),
+        "tags": {"oil"},
+        "model": MaintenanceLog(_id="abc", structured_data={}, timestamp=datetime(2024, 1, 16)),
+        1: "non-string key",
+    }
+    assert loads(dumps(content)) == {
+        "_id": str(log_id),
+        "naive": "2024-01-16T10:30:00",
+        "aware": "2024-01-16T10:30:00Z",
+        "day": "2024-01-15",
+        "hours": "1250.5",
+        "tags": ["oil"],
+        # Models are dumped by alias
+        "model": {"_id": "abc", "uploaded_by": "anonymous", "timestamp": "2024-01-16T00:00:00", "image_filename": None,
+                  "structured_data": {"aircraft_registration": None, "aircraft_make_model": None, "summary": None,
+                                      "is_mult": False, "log_entries": []},
+                  "original_image_url": None},
+        "1": "non-string key",
+    }
+    assert dumps_line({"a": "é"}) == '{"a":"é"}\n'.encode()
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
+
+
+def test_fast_json_response_matches_json():
+    response = FastJSONResponse({"_id": ObjectId("65a5f0c2e4b0a1b2c3d4e5f6"), "values": [1.5, None, True]})
+    assert json.loads(response.body) == {"_id": "65a5f0c2e4b0a1b2c3d4e5f6", "values": [1.5, None, True]}
+    assert response.media_type == "application/json"
+
+
+def validated(doc):
+    """The JSON a route returned when it built the model from the document"""
+    return MaintenanceLog(**{**doc, "_id": str(doc["_id"])}).model_dump_json(by_alias=True)
+
+
+def test_current_document_matches_validation():
+    structured_data = {
+        "aircraft_registration": "N123AB",
+        "aircraft_make_model": "Cessna 172",
+        "summary": "Oil change",
+        "is_mult": False,
+        "log_entries": [LogEntry(description_of_work_performed="Oil change", tach_time="1250.5", date="2024-01-15").model_dump()],
+    }
+    doc = {
+        "_id": ObjectId(),
+        "uploaded_by": "anonymous",
+        "timestamp": datetime(2024, 1, 16, 10, 30),
+        "image_filename": "scan.jpg",
+        "structured_data": structured_data,
+        "original_image_url": None,
+        "revision": 2,
+        **build_derived_fields(structured_data),
+    }
+    assert stored_logs.dump(doc) == validated(doc).encode()
+    # Complete documents are serialized as stored
+    assert default_filler(MaintenanceLog)(doc) is doc
+
+
+def test_legacy_document_gets_the_model_defaults():
+    # Written before derived fields, revisions and most optional fields existed
+    doc = {
+        "_id": ObjectId(),
+        "timestamp": datetime(2023, 5, 2, 8, 0),
+        "structured_data": {
+            "aircraft_registration": "N123AB",
+            "log_entries": [
+                {"description_of_work_performed": "Oil change", "tach_time": "1250.5"},
+                {"date": "2023-05-01", "is_airworthy": False},
+            ],
+        },
+    }
+    original = json.loads(json.dumps(doc, default=str))
+    assert stored_logs.dump(doc) == validated(doc).encode()
+    assert stored_logs.dump_many([doc, doc]) == b"[" + b",".join([validated(doc).encode()] * 2) + b"]"
+
+    response = json.loads(stored_logs.dump(doc))
+    assert response["uploaded_by"] == "anonymous"
+    assert response["structured_data"]["is_mult"] is False
+    assert [entry["is_airworthy"] for entry in response["structured_data"]["log_entries"]] == [True, False]
+    assert response["structured_data"]["log_entries"][1]["part_number_replaced"] == []
+    # The stored document is left as it was
+    assert json.loads(json.dumps(doc, default=str)) == original
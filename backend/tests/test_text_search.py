@@ -0,0 +1,153 @@
+"""
+Tests for full-text search terms, highlighting and per-entry hits
+"""
+
+import pytest
+
+from text_search import InvertedIndex, entry_hits, highlight, query_terms
+
+
+def make_log(*descriptions, summary=None):
+    return {
+        "_id": "log1",
+        "structured_data": {
+            "summary": summary,
+            "log_entries": [{"description_of_work_performed": text} for text in descriptions],
+        },
+    }
+
+
+@pytest.mark.parametrize("query, text", [
+    ("inspections", "Inspected left magneto"),
+    ("inspected", "Annual inspection completed"),
+    ("replacement", "Replaced left main tire"),
+    ("replaced", "Tire replacement per manual"),
+    ("magnetos", "Timed magneto to engine"),
+    ("overhauls", "Engine overhauled at 2000 hrs"),
+])
+def test_inflections_find_each_other(query, text):
+    hits = entry_hits(make_log(text), query_terms(query))
+    assert [hit["entry_index"] for hit in hits] == [0]
+    assert "<mark>" in hits[0]["highlights"]["description_of_work_performed"]
+
+
+def test_query_terms_drop_stop_words_and_duplicates():
+    assert query_terms("The inspection and the inspections") == ["inspect"]
+
+
+def test_short_terms_match_whole_words_only():
+    assert highlight("Complied with AD 2020-01-02", query_terms("ad")) == "Complied with <mark>AD</mark> 2020-01-02"
+    assert highlight("Adjusted idle mixture", query_terms("ad")) is None
+
+
+def test_highlight_escapes_html_and_marks_every_match():
+    assert highlight("Replaced <tire>; replacing tube", query_terms("replaced")) == (
+        "<mark>Replaced</mark> &lt;tire&gt;; <mark>replacing</mark> tube"
+    )
+
+
+def test_highlight_ignores_diacritics():
+    assert highlight("Cleaned the Régulateur", query_terms("regulateur")) == "Cleaned the <mark>Régulateur</mark>"
+
+
+def test_entries_ranked_and_unmatched_entries_dropped():
+    hits = entry_hits(make_log("Washed aircraft", "Replaced magneto"), query_terms("magneto"))
+    assert [hit["entry_index"] for hit in hits] == [1]
+
+
+def test_summary_match_counts_for_every_entry_below_direct_matches():
+    log = make_log("Washed aircraft", "Replaced magneto", summary="Magneto work")
+    hits = entry_hits(log, query_terms("magneto"))
+    assert [hit["entry_index"] for hit in hits] == [1, 0]
+    assert hits[0]["score"] > hits[1]["score"]
+
+
+def test_document_matched_by_database_is_never_dropped():
+    # A stem the database derived differently still finds entries sharing its first letters
+    log = make_log("Washed aircraft", "Replacing tube")
+    hits = entry_hits(log, ["replacx"], matched=True)
+    assert [hit["entry_index"] for hit in hits] == [1]
+
+    # And with nothing to go on, every entry of the matched log is listed unhighlighted
+    hits = entry_hits(make_log("Washed aircraft", "Waxed"), ["replacx"], matched=True)
+    assert [hit["entry_index"] for hit in hits] == [0, 1]
+    assert all(hit["highlights"] == {} for hit in hits)
+
+    # Without a database match, nothing is invented
+    assert entry_hits(make_log("Washed aircraft"), ["replacx"]) == []
+
+
+def test_inverted_index_uses_the_same_stems():
+    index = InvertedIndex()
+    index.add({"_id": "a", "structured_data": {"log_entries": [{"description_of_work_performed": "Inspected magneto"}]}})
+    index.add({"_id": "b", "structured_data": {"log_entries": [{"description_of_work_performed": "Washed aircraft"}]}})
+    assert [log_id for log_id, _ in index.search(query_terms("inspections"))] == ["a"]
+
+    index.remove("a")
+    assert index.search(query_terms("inspections")) == []
+
+
+def log_doc(log_id, text):
+    return {"_id": log_id, "structured_data": {"log_entries": [{"description_of_work_performed": text}]}}
+
+
+@pytest.fixture
+def collections():
+    from mongomock_motor import AsyncMongoMockClient
+
+    database = AsyncMongoMockClient()["test"]
+    return database["logs"], database["logs_meta"]
+
+
+@pytest.mark.asyncio
+async def test_index_follows_own_writes_without_rebuilding(collections):
+    from etags import bump_collection_revision
+
+    collection, meta = collections
+    await collection.insert_one(log_doc("a", "Inspected magneto"))
+    index = InvertedIndex()
+    await index.build(collection, meta)
+
+    await collection.insert_one(log_doc("b", "Replaced magneto"))
+    index.on_write(log_doc("b", "Replaced magneto"), await bump_collection_revision(meta))
+    index.on_revision(await bump_collection_revision(meta))
+
+    assert await index.refresh(collection, meta) is False
+    assert {log_id for log_id, _ in index.search(query_terms("magneto"))} == {"a", "b"}
+
+
+@pytest.mark.asyncio
+async def test_index_rebuilds_after_another_process_writes(collections):
+    from etags import bump_collection_revision
+
+    collection, meta = collections
+    index = InvertedIndex()
+    await index.build(collection, meta)
+
+    # Written and counted by another worker; this index never saw it
+    await collection.insert_one(log_doc("c", "Inspected magneto"))
+    await bump_collection_revision(meta)
+
+    assert await index.refresh(collection, meta) is True
+    assert [log_id for log_id, _ in index.search(query_terms("magneto"))] == ["c"]
+    assert await index.refresh(collection, meta) is False
+
+
+@pytest.mark.asyncio
+async def test_writes_during_a_build_are_not_lost(collections):
+    collection, meta = collections
+    await collection.insert_one(log_doc("a", "Washed aircraft"))
+    index = InvertedIndex()
+
+    original_find = collection.find
+
+    def find_while_writing(*args, **kwargs):
+        # A write of this process lands while the build is scanning
+        index.on_write(log_doc("d", "Inspected magneto"), 1)
+        return original_find(*args, **kwargs)
+
+    collection.find = find_while_writing
+    await index.build(collection, meta)
+
+    assert [log_id for log_id, _ in index.search(query_terms("magneto"))] == ["d"]
+    assert index.revision == 1
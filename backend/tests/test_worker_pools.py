@@ -0,0 +1,111 @@
+"""
+Tests for the bounded worker pools and the 429 answered when the PDF pool is full
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import blob_storage
+import routes
+from blob_storage import LocalBlobStore
+from database import Database
+from indexing import build_derived_fields
+from pdf_render import pdf_pool
+from worker_pools import BoundedProcessPool, PoolSaturated
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setenv("TEST_WORKERS", "1")
+    monkeypatch.setenv("TEST_QUEUE", "1")
+    pool = BoundedProcessPool("test", "TEST_WORKERS", 4, "TEST_QUEUE")
+    # Threads stand in for worker processes, so a job can be held open
+    pool._executor = ThreadPoolExecutor(max_workers=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_limits_come_from_the_environment(monkeypatch):
+    pool = BoundedProcessPool("sizes", "SIZES_WORKERS", 3, "SIZES_QUEUE", 2)
+    assert (pool.workers, pool.limit) == (3, 5)
+    monkeypatch.setenv("SIZES_WORKERS", "1")
+    monkeypatch.setenv("SIZES_QUEUE", "0")
+    assert (pool.workers, pool.limit) == (1, 1)
+    assert BoundedProcessPool("open", "OPEN_WORKERS", 2).limit is None
+
+
+@pytest.mark.asyncio
+async def test_jobs_beyond_workers_and_queue_are_refused(pool):
+    release = threading.Event()
+    running = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert pool.in_flight == 2
+    with pytest.raises(PoolSaturated):
+        await pool.run(release.wait)
+
+    release.set()
+    assert await asyncio.gather(*running) == [True, True]
+    assert pool.in_flight == 0
+    assert await pool.run(pow, 2, 10) == 1024
+
+
+@pytest.mark.asyncio
+async def test_background_jobs_never_take_a_queue_slot(pool):
+    release = threading.Event()
+    running = asyncio.ensure_future(pool.run(release.wait))
+    await asyncio.sleep(0)
+    # The only worker is busy: a background job waits its turn elsewhere, an interactive one queues
+    with pytest.raises(PoolSaturated):
+        await pool.run(release.wait, background=True)
+    queued = asyncio.ensure_future(pool.run(release.wait))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(running, queued)
+
+
+@pytest.mark.asyncio
+async def test_failed_jobs_free_their_slot(pool):
+    with pytest.raises(ZeroDivisionError):
+        await pool.run(divmod, 1, 0)
+    assert pool.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_in_worker_processes(monkeypatch):
+    monkeypatch.setenv("SPAWN_WORKERS", "1")
+    pool = BoundedProcessPool("spawn", "SPAWN_WORKERS", 1)
+    try:
+        assert await pool.run(pow, 3, 4) == 81
+    finally:
+        pool.shutdown()
+
+
+def test_full_pdf_pool_answers_429(monkeypatch, tmp_path):
+    monkeypatch.setattr(Database, "client", AsyncMongoMockClient())
+    monkeypatch.setattr(Database, "database_name", "test")
+    monkeypatch.setattr(Database, "collection_name", "logs")
+    monkeypatch.setattr(blob_storage, "_blob_store", LocalBlobStore(tmp_path))
+    structured_data = {"aircraft_registration": "N123AB", "log_entries": [{"description_of_work_performed": "Oil change"}]}
+    doc = {"_id": ObjectId(), "timestamp": datetime(2024, 1, 16), "structured_data": structured_data, **build_derived_fields(structured_data)}
+    asyncio.run(Database.get_collection().insert_one(doc))
+    app = FastAPI()
+    app.include_router(routes.router)
+    client = TestClient(app)
+
+    monkeypatch.setattr(pdf_pool, "in_flight", pdf_pool.limit)
+    log_id = str(doc["_id"])
+    response = client.post(f"/api/v1/logs/{log_id}/export", json={"format": "pdf", "log_id": log_id})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    response = client.get("/api/v1/export/report", params={"registration": "N123AB"})
+    assert response.status_code == 429
+    # JSON exports need no PDF worker
+    assert client.post(f"/api/v1/logs/{log_id}/export", json={"format": "json", "log_id": log_id}).status_code == 200
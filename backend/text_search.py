@@ -0,0 +1,352 @@
+"""
+Full-text search over maintenance log entries.
+
+MongoDB answers the query from the text index created in `Database.create_indexes`.
+When the backend has no text index support, an in-process inverted index over the
+same fields is used instead. Either way matching documents are expanded into
+per-entry hits, ranked and highlighted here.
+
+The in-process index is built once at startup. It follows the collection-wide
+revision (see `etags.py`): writes made by this process are applied as they
+happen, and when the stored revision shows a write made by another worker or
+a maintenance command, the next search rebuilds it first. That rebuild scans
+the collection, so the fallback suits single-worker and development setups;
+production deployments should have the text index.
+
+Words are stemmed with the Snowball English stemmer, the one MongoDB's text
+index uses, so "inspections" finds "Inspected" whichever backend answers.
+"""
+
+import asyncio
+import html
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+
+import snowballstemmer
+
+from etags import get_collection_revision
+
+# Entry-level fields covered by the search, with their text index weights
+ENTRY_SEARCH_FIELDS = {
+    "description_of_work_performed": 10,
+    "reason_for_maintenance": 5,
+    "ad_compliance": 5,
+    "service_bulletin_reference": 5,
+}
+
+# Log-level fields covered by the search; a summary match counts for every entry
+LOG_SEARCH_FIELDS = {
+    "summary": 3,
+}
+
+TEXT_INDEX_NAME = "log_text_search"
+
+TEXT_INDEX_KEYS = (
+    [(f"structured_data.log_entries.{field}", "text") for field in ENTRY_SEARCH_FIELDS]
+    + [(f"structured_data.{field}", "text") for field in LOG_SEARCH_FIELDS]
+)
+
+TEXT_INDEX_WEIGHTS = {
+    **{f"structured_data.log_entries.{field}": weight for field, weight in ENTRY_SEARCH_FIELDS.items()},
+    **{f"structured_data.{field}": weight for field, weight in LOG_SEARCH_FIELDS.items()},
+}
+
+# Letters and digits; punctuation, hyphens and underscores separate words as in the text index
+_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+# Words too common to be useful on their own in maintenance text
+_STOP_WORDS = frozenset([
+    "a", "an", "and", "as", "at", "by", "for", "in", "is", "of", "on", "or", "the", "to", "with",
+])
+
+SNIPPET_CONTEXT = 60
+
+# Stems sharing this many leading letters count as a match when the database
+# matched a document that the stems alone cannot place in an entry
+LOOSE_PREFIX_LENGTH = 5
+
+_stemmer = snowballstemmer.stemmer("english")
+
+
+def _fold(token):
+    """Lowercase without diacritics, as the text index compares words"""
+    token = token.lower()
+    if token.isascii():
+        return token
+    return "".join(char for char in unicodedata.normalize("NFKD", token) if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """Lowercase word tokens of a text, without stop words"""
+    if not text:
+        return []
+    return [token for token in map(_fold, _TOKEN_PATTERN.findall(str(text))) if token not in _STOP_WORDS]
+
+
+@lru_cache(maxsize=50_000)
+def stem(token):
+    """Snowball English stem of a lowercase token: "inspections" and "inspected" both give "inspect" """
+    return _stemmer.stemWord(token)
+
+
+def _shares_prefix(word_stem, terms):
+    """Whether a stem starts like one of the terms; short terms ("ad", "sb") never match loosely"""
+    for term in terms:
+        size = min(len(term), LOOSE_PREFIX_LENGTH)
+        if size >= 4 and word_stem[:size] == term[:size]:
+            return True
+    return False
+
+
+def query_terms(query):
+    """Distinct stemmed search terms of a query, in the order they were typed"""
+    return list(dict.fromkeys(stem(token) for token in tokenize(query)))
+
+
+def highlight(text, terms, context=SNIPPET_CONTEXT, loose=False):
+    """
+    HTML-escaped snippet of `text` around the first word whose stem is a term,
+    with every such word wrapped in <mark>. With `loose`, words whose stem
+    shares its first letters with a term match too. Returns None when no word
+    of the text matches.
+    """
+    if not text or not terms:
+        return None
+
+    text = str(text)
+    terms = set(terms)
+    matches = []
+    for match in _TOKEN_PATTERN.finditer(text):
+        token = _fold(match.group(0))
+        if token in _STOP_WORDS:
+            continue
+        word_stem = stem(token)
+        if word_stem in terms or (loose and _shares_prefix(word_stem, terms)):
+            matches.append(match.span())
+    if not matches:
+        return None
+
+    first_start, first_end = matches[0]
+    start = max(0, first_start - context)
+    end = min(len(text), first_end + context)
+
+    pieces = []
+    position = start
+    for match_start, match_end in matches:
+        if match_start < start or match_end > end:
+            continue
+        pieces.append(html.escape(text[position:match_start]))
+        pieces.append(f"<mark>{html.escape(text[match_start:match_end])}</mark>")
+        position = match_end
+    pieces.append(html.escape(text[position:end]))
+
+    return ("…" if start > 0 else "") + "".join(pieces) + ("…" if end < len(text) else "")
+
+
+def _ranked_entry_hits(doc, terms, document_score, loose):
+    structured_data = doc.get("structured_data") or {}
+    log_highlights = {}
+    log_weight = 0
+    for field, weight in LOG_SEARCH_FIELDS.items():
+        snippet = highlight(structured_data.get(field), terms, loose=loose)
+        if snippet:
+            log_highlights[field] = snippet
+            log_weight += weight
+
+    hits = []
+    for entry_index, entry in enumerate(structured_data.get("log_entries") or []):
+        highlights = {}
+        weight = 0
+        for field, field_weight in ENTRY_SEARCH_FIELDS.items():
+            snippet = highlight(entry.get(field), terms, loose=loose)
+            if snippet:
+                highlights[field] = snippet
+                weight += field_weight
+        if not highlights and not log_highlights:
+            continue
+
+        hits.append({
+            "log_id": str(doc["_id"]),
+            "entry_index": entry_index,
+            "aircraft_registration": structured_data.get("aircraft_registration"),
+            "timestamp": doc.get("timestamp"),
+            "date": entry.get("date"),
+            "score": round(document_score * (weight + 0.1 * log_weight), 4),
+            "highlights": {**log_highlights, **highlights},
+        })
+    return hits
+
+
+def entry_hits(doc, terms, document_score=1.0, matched=False):
+    """
+    Expand one matching log document into ranked per-entry hits.
+
+    Each entry is scored by the weighted number of its fields containing a term,
+    scaled by the document-level score from the index. Entries that only match
+    through the log summary are still returned, ranked below direct matches.
+
+    `matched` marks a document the database's own text index matched. Should
+    its stems not be found here (the index tokenizes a few words differently),
+    entries sharing a stem's first letters are returned instead, and failing
+    that every entry of the log, unhighlighted, so matches are never dropped.
+    """
+    hits = _ranked_entry_hits(doc, terms, document_score, loose=False)
+    if not hits and matched:
+        hits = _ranked_entry_hits(doc, terms, document_score, loose=True)
+        if not hits:
+            structured_data = doc.get("structured_data") or {}
+            hits = [{
+                "log_id": str(doc["_id"]),
+                "entry_index": entry_index,
+                "aircraft_registration": structured_data.get("aircraft_registration"),
+                "timestamp": doc.get("timestamp"),
+                "date": entry.get("date"),
+                "score": round(0.1 * document_score, 4),
+                "highlights": {},
+            } for entry_index, entry in enumerate(structured_data.get("log_entries") or [])]
+
+    hits.sort(key=lambda hit: hit["score"], reverse=True)
+    return hits
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over the searchable fields, used when the
+    database has no text index. Postings map a term to the log documents that
+    contain it with a weighted term frequency, and documents are ranked by a
+    tf-idf score.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}
+        self.built = False
+        # Collection revision the index reflects, and later revisions of this
+        # process's writes applied while an earlier one is still outstanding
+        self.revision = None
+        self._ahead = set()
+        # Writes seen while a build is scanning the collection, applied after it
+        self._pending = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, doc):
+        """Index (or re-index) one log document"""
+        log_id = str(doc["_id"])
+        self.remove(log_id)
+
+        structured_data = doc.get("structured_data") or {}
+        frequencies = defaultdict(float)
+        for field, weight in LOG_SEARCH_FIELDS.items():
+            for token in tokenize(structured_data.get(field)):
+                frequencies[stem(token)] += weight
+        for entry in structured_data.get("log_entries") or []:
+            for field, weight in ENTRY_SEARCH_FIELDS.items():
+                for token in tokenize(entry.get(field)):
+                    frequencies[stem(token)] += weight
+
+        for term, frequency in frequencies.items():
+            self.postings[term][log_id] = frequency
+        self.doc_terms[log_id] = list(frequencies)
+
+    def remove(self, log_id):
+        """Drop a log document from the index"""
+        for term in self.doc_terms.pop(str(log_id), []):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(str(log_id), None)
+                if not postings:
+                    del self.postings[term]
+
+    def _advance(self, revision):
+        """Record a collection revision produced by this process's own write"""
+        if revision is None or self.revision is None or revision <= self.revision:
+            return
+        self._ahead.add(revision)
+        while self.revision + 1 in self._ahead:
+            self.revision += 1
+            self._ahead.discard(self.revision)
+
+    def _apply(self, doc, log_id, revision):
+        if doc is not None:
+            self.add(doc)
+        elif log_id is not None:
+            self.remove(log_id)
+        self._advance(revision)
+
+    def _record(self, doc=None, log_id=None, revision=None):
+        if self._pending is not None:
+            self._pending.append((doc, log_id, revision))
+        elif self.built:
+            self._apply(doc, log_id, revision)
+
+    def on_write(self, doc, revision=None):
+        """Keep the index in step with an inserted or updated document and the collection revision it produced"""
+        self._record(doc=doc, revision=revision)
+
+    def on_delete(self, log_id, revision=None):
+        """Keep the index in step with a deleted document and the collection revision it produced"""
+        self._record(log_id=log_id, revision=revision)
+
+    def on_revision(self, revision):
+        """Account for a collection revision produced by a write that changed no searchable field"""
+        self._record(revision=revision)
+
+    async def _build(self, collection, meta_collection):
+        self._pending = []
+        try:
+            # Read the revision first: a write that lands during the scan moves it on
+            revision = await get_collection_revision(meta_collection)
+            self.postings.clear()
+            self.doc_terms.clear()
+            async for doc in collection.find({}, {"structured_data": 1}):
+                self.add(doc)
+            self.revision = revision
+            self._ahead.clear()
+            pending, self._pending = self._pending, None
+            for doc, log_id, write_revision in pending:
+                self._apply(doc, log_id, write_revision)
+            self.built = True
+        finally:
+            self._pending = None
+
+    async def build(self, collection, meta_collection):
+        """Index every stored log document; one build at a time"""
+        async with self._lock:
+            await self._build(collection, meta_collection)
+
+    async def refresh(self, collection, meta_collection):
+        """
+        Build the index if it is not built yet or misses another process's
+        writes, going by the collection revision. Returns whether it (re)built.
+        """
+        if self.built and self.revision == await get_collection_revision(meta_collection):
+            return False
+        async with self._lock:
+            # A request that held the lock may have just rebuilt it
+            if self.built and self.revision == await get_collection_revision(meta_collection):
+                return False
+            await self._build(collection, meta_collection)
+            return True
+
+    def search(self, terms):
+        """Log ids matching any term with their scores, best first"""
+        scores = defaultdict(float)
+        total = max(len(self.doc_terms), 1)
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            for log_id, frequency in postings.items():
+                scores[log_id] += (1 + math.log(frequency)) * idf
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+# Fallback index shared by the routes of this process
+local_index = InvertedIndex()
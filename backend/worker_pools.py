@@ -0,0 +1,86 @@
+"""
+Process pools for CPU-bound work kept off the event loop.
+
+Image resizing, archival transcoding and PDF rendering are pure CPU work; run
+inside an `async def` route they block every other request on that worker.
+Each kind of work gets its own lazily started pool of spawned processes (not
+forked: the API process holds event loop and driver threads), sized by an
+environment variable. A pool with a queue limit admits at most `workers +
+queue` jobs at once and raises `PoolSaturated` beyond that, so a burst is
+answered with 429 instead of piling up behind the workers.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+_pools = []
+
+
+class PoolSaturated(Exception):
+    """Raised when a bounded pool already has as many jobs as it admits"""
+
+
+class BoundedProcessPool:
+    """A named process pool with an optional limit on jobs running or waiting"""
+
+    def __init__(self, name, workers_env, default_workers, queue_env=None, default_queue=None):
+        self.name = name
+        self.workers_env = workers_env
+        self.default_workers = default_workers
+        self.queue_env = queue_env
+        self.default_queue = default_queue
+        self.in_flight = 0
+        self._executor = None
+        _pools.append(self)
+
+    @property
+    def workers(self):
+        return int(os.getenv(self.workers_env, "0")) or self.default_workers
+
+    @property
+    def limit(self):
+        """Jobs admitted at once, or None for no limit"""
+        if self.queue_env is None:
+            return None
+        queue = int(os.getenv(self.queue_env, str(self.default_queue if self.default_queue is not None else self.workers)))
+        return self.workers + queue
+
+    def _get_executor(self):
+        if self._executor is None:
+            print(f"🔄 Starting {self.name} worker pool with {self.workers} processes...")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+        return self._executor
+
+    async def run(self, fn, *args, background=False):
+        """
+        Run `fn(*args)` in a worker process; raises PoolSaturated when the pool is full.
+        A `background` job is only admitted while a worker is idle and never takes
+        a queue slot, so it cannot turn interactive jobs away.
+        """
+        limit = self.workers if background else self.limit
+        if limit is not None and self.in_flight >= limit:
+            raise PoolSaturated(f"{self.name} pool is busy ({self.in_flight} jobs)")
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next job
+            self._executor = None
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+def shutdown_pools():
+    """Stop every started worker pool (on application shutdown)"""
+    for pool in _pools:
+        pool.shutdown()
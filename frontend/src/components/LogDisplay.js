@@ -23,7 +23,7 @@ import { useMaintenanceLog } from '../context/MaintenanceLogContext';
 import { format } from 'date-fns';
 
 const LogDisplay = ({ log }) => {
-  const { updateLog, exportLog, clearCurrentLog } = useMaintenanceLog();
+  const { updateLog, updateLogEntries, exportLog, clearCurrentLog } = useMaintenanceLog();
   const [isEditing, setIsEditing] = useState(false);
   const [editedData, setEditedData] = useState(log.structured_data);
   const [zoomLevel, setZoomLevel] = useState(1);
@@ -82,9 +82,37 @@ const LogDisplay = ({ log }) => {
     setEditedData(log.structured_data);
   };
 
+  // Fields of each entry that differ from the saved log, or null when a full
+  // update is needed (log-level fields changed or entries were added/removed)
+  const getEntryChanges = () => {
+    const original = log.structured_data;
+    const logFields = ['aircraft_registration', 'aircraft_make_model', 'summary', 'is_mult'];
+    if (logFields.some(field => original[field] !== editedData[field])) return null;
+    if (original.log_entries.length !== editedData.log_entries.length) return null;
+
+    const entryChanges = {};
+    editedData.log_entries.forEach((entry, index) => {
+      const changes = {};
+      Object.keys(entry).forEach(field => {
+        if (JSON.stringify(entry[field]) !== JSON.stringify(original.log_entries[index][field])) {
+          changes[field] = entry[field];
+        }
+      });
+      if (Object.keys(changes).length > 0) {
+        entryChanges[index] = changes;
+      }
+    });
+    return entryChanges;
+  };
+
   const handleSave = async () => {
     try {
-      await updateLog(log._id, editedData);
+      const entryChanges = getEntryChanges();
+      if (entryChanges === null) {
+        await updateLog(log._id, editedData);
+      } else if (Object.keys(entryChanges).length > 0) {
+        await updateLogEntries(log._id, entryChanges);
+      }
       setIsEditing(false);
     } catch (error) {
       console.error('Error updating log:', error);
@@ -638,7 +666,7 @@ const LogDisplay = ({ log }) => {
             <div className="bg-gray-50 rounded-lg p-4 border-2 border-dashed border-gray-200">
               <div className="text-center overflow-hidden">
                 <img 
-                  src={`http://localhost:8000/api/v1/images/${encodeURIComponent(log.image_filename)}`}
+                  src={`http://localhost:8000/api/v1/images/${encodeURIComponent(log.image_filename)}?size=${zoomLevel > 1 ? 'full' : 'medium'}`}
                   alt="Original maintenance log"
                   className="rounded-lg shadow-md transition-transform duration-200 max-w-full h-auto max-h-96 mx-auto"
                   style={{
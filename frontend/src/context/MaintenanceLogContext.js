@@ -1,4 +1,4 @@
-import React, { createContext, useContext, useReducer, useEffect } from 'react';
+import React, { createContext, useContext, useReducer, useEffect, useRef } from 'react';
 import { toast } from 'react-hot-toast';
 import axios from 'axios';
 
@@ -90,6 +90,27 @@ const MaintenanceLogContext = createContext();
 export function MaintenanceLogProvider({ children }) {
   const [state, dispatch] = useReducer(maintenanceLogReducer, initialState);
 
+  // Last ETag seen per log, sent back as If-Match so concurrent edits aren't lost.
+  // GET requests are revalidated by the browser cache through the same ETags.
+  const etagsRef = useRef({});
+
+  const rememberEtag = (logId, response) => {
+    if (response.headers?.etag) {
+      etagsRef.current[logId] = response.headers.etag;
+    }
+  };
+
+  const ifMatchHeaders = (logId) => (
+    etagsRef.current[logId] ? { headers: { 'If-Match': etagsRef.current[logId] } } : {}
+  );
+
+  const handleConflict = async (error, logId) => {
+    if (error.response?.status !== 412) return false;
+    toast.error('This log was changed elsewhere. Reloaded the latest version.');
+    await fetchLogById(logId);
+    return true;
+  };
+
   // Load logs on mount
   useEffect(() => {
     fetchLogs();
@@ -119,6 +140,7 @@ export function MaintenanceLogProvider({ children }) {
       
       const response = await axios.get(`${API_BASE_URL}/logs/${logId}`);
       console.log('✅ API response received:', response.data);
+      rememberEtag(logId, response);
       
       dispatch({ type: ACTIONS.SET_CURRENT_LOG, payload: response.data });
       console.log('✅ SET_CURRENT_LOG action dispatched');
@@ -153,6 +175,7 @@ export function MaintenanceLogProvider({ children }) {
       if (response.data.success) {
         // Fetch the complete log data
         const logResponse = await axios.get(`${API_BASE_URL}/logs/${response.data.log_id}`);
+        rememberEtag(response.data.log_id, logResponse);
         dispatch({ type: ACTIONS.ADD_LOG, payload: logResponse.data });
         
         // Refresh the logs list to ensure sidebar shows correct data
@@ -174,7 +197,8 @@ export function MaintenanceLogProvider({ children }) {
 
   const updateLog = async (logId, logData) => {
     try {
-      const response = await axios.put(`${API_BASE_URL}/logs/${logId}`, logData);
+      const response = await axios.put(`${API_BASE_URL}/logs/${logId}`, logData, ifMatchHeaders(logId));
+      rememberEtag(logId, response);
       dispatch({ type: ACTIONS.UPDATE_LOG, payload: response.data });
       
       // Refresh the logs list to ensure sidebar shows correct data
@@ -183,6 +207,7 @@ export function MaintenanceLogProvider({ children }) {
       toast.success('Maintenance log updated successfully!');
     } catch (error) {
       console.error('Error updating log:', error);
+      if (await handleConflict(error, logId)) return;
       dispatch({ 
         type: ACTIONS.SET_ERROR, 
         payload: 'Failed to update maintenance log' 
@@ -191,13 +216,38 @@ export function MaintenanceLogProvider({ children }) {
     }
   };
 
+  const updateLogEntries = async (logId, entryChanges) => {
+    // entryChanges maps an entry index to only the fields edited in that entry
+    try {
+      // One request for all edited entries, so a save applies completely or not at all
+      const response = await axios.patch(`${API_BASE_URL}/logs/${logId}/entries`, { entries: entryChanges }, ifMatchHeaders(logId));
+      rememberEtag(logId, response);
+      dispatch({ type: ACTIONS.UPDATE_LOG, payload: response.data });
+
+      // Refresh the logs list to ensure sidebar shows correct data
+      await fetchLogs();
+
+      toast.success('Maintenance log updated successfully!');
+    } catch (error) {
+      console.error('Error updating log entries:', error);
+      if (await handleConflict(error, logId)) return;
+      dispatch({
+        type: ACTIONS.SET_ERROR,
+        payload: 'Failed to update maintenance log'
+      });
+      toast.error('Failed to update maintenance log');
+    }
+  };
+
   const deleteLog = async (logId) => {
     try {
-      const response = await axios.delete(`${API_BASE_URL}/logs/${logId}`);
+      const response = await axios.delete(`${API_BASE_URL}/logs/${logId}`, ifMatchHeaders(logId));
+      delete etagsRef.current[logId];
       dispatch({ type: ACTIONS.DELETE_LOG, payload: logId });
       toast.success('Maintenance log deleted successfully!');
     } catch (error) {
       console.error('Error deleting log:', error);
+      if (await handleConflict(error, logId)) return;
       dispatch({ 
         type: ACTIONS.SET_ERROR, 
         payload: 'Failed to delete maintenance log' 
@@ -261,6 +311,7 @@ export function MaintenanceLogProvider({ children }) {
     fetchLogById,
     uploadLog,
     updateLog,
+    updateLogEntries,
     deleteLog,
     exportLog,
     searchLogs,